@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CabinCrewApi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendant',
+            name='attendant_type',
+            field=models.CharField(choices=[('CHIEF', 'Chief'), ('REGULAR', 'Regular'), ('CHEF', 'Chef')], db_index=True, max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CabinCrewApi', '0002_alter_attendant_attendant_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -15,11 +15,16 @@ class Attendant(models.Model):
     nationality = models.CharField(max_length=50)
     known_languages = models.CharField(max_length=200) # e.g. "English, French"
     
-    attendant_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    attendant_type = models.CharField(max_length=10, choices=TYPE_CHOICES, db_index=True)
     
     # Requirement: Multiple vehicle types allowed
     allowed_vehicles = models.ManyToManyField(PlaneType)
 
+    # Set on every save, for ?since= sync (skycrew.sync). skycrewApp.signals
+    # also bumps it when the attendant's recipes or plane types change, both
+    # part of its serialized form
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"{self.name} ({self.attendant_type})"
 
@@ -28,6 +33,9 @@ class Recipe(models.Model):
     # We link the recipe to the Attendant (Chef)
     chef = models.ForeignKey(Attendant, on_delete=models.CASCADE, related_name='recipes')
     dish_name = models.CharField(max_length=100)
+
+    # Set on every save, for ?since= sync (skycrew.sync)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.dish_name
\ No newline at end of file
@@ -13,4 +13,4 @@ class AttendantSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Attendant
-        fields = '__all__'
\ No newline at end of file
+        exclude = ['updated_at']
\ No newline at end of file
@@ -1,3 +1,172 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from FlightInfoApi.models import PlaneType
+from skycrew.sync import make_token
+from skycrewApp.models import Tombstone
+from skycrew.tests.support import FastReadAssertions, QueryBudgetTestCase, make_attendant, make_plane_type
+from .models import Attendant, Recipe
+from .views import AttendantViewSet
+
+URL = '/api/cabin-crew/attendants/'
+
+
+class AttendantFastReadTests(FastReadAssertions, QueryBudgetTestCase):
+    # The fast read path renders exactly what AttendantSerializer does,
+    # including the allowed_vehicles ids and the nested recipes
+
+    @classmethod
+    def setUpTestData(cls):
+        boeing = make_plane_type('Boeing 737')
+        airbus = make_plane_type('Airbus A320')
+        # Many-to-many added out of id order, recipes out of name order
+        make_attendant([airbus, boeing], 'Elif Demir', attendant_type='CHIEF')
+        make_attendant([boeing], 'Ali Can', recipes=['Moussaka', 'Baklava', 'Dolma'], attendant_type='CHEF')
+        make_attendant([], 'Deniz Tan')
+
+    def test_plan_matches_serializer(self):
+        self.assertRendersLikeSerializer(AttendantViewSet)
+
+    def test_list_and_retrieve_match_serializer(self):
+        self.assertListLikeSerializer(URL, AttendantViewSet)
+
+    def test_fields(self):
+        self.assertFieldsProjection(URL, AttendantViewSet, ['name', 'recipes', 'allowed_vehicles'])
+
+    def test_filtered_list_matches_serializer(self):
+        boeing = PlaneType.objects.get(name='Boeing 737')
+        self.assertListLikeSerializer(
+            URL, AttendantViewSet,
+            AttendantViewSet.queryset.filter(allowed_vehicles=boeing), allowed_vehicle=boeing.id,
+        )
+
+
+class AttendantApiTests(QueryBudgetTestCase):
+    # Every action within its query budget: the recipes and plane types of
+    # a whole page cost one query each, however many attendants it holds
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boeing = make_plane_type('Boeing 737')
+        cls.airbus = make_plane_type('Airbus A320')
+        for i in range(30):
+            attendant_type = ('CHIEF', 'REGULAR', 'CHEF')[i % 3]
+            make_attendant(
+                [cls.boeing, cls.airbus][:1 + i % 2], f'Attendant {i}', attendant_type=attendant_type,
+                recipes=[f'Dish {i}a', f'Dish {i}b'] if attendant_type == 'CHEF' else [],
+            )
+        cls.chef = Attendant.objects.filter(attendant_type='CHEF').order_by('id').first()
+
+    def payload(self, **fields):
+        return {
+            'name': 'Selin Ay', 'age': 28, 'gender': 'Female', 'nationality': 'Turkish',
+            'known_languages': 'Turkish, German', 'attendant_type': 'REGULAR',
+            'allowed_vehicles': [self.boeing.id, self.airbus.id], **fields,
+        }
+
+    def test_list(self):
+        response = self.client.get(URL, {'page_size': 25})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertIsNotNone(response.data['next'])
+        chefs = [item for item in response.data['results'] if item['attendant_type'] == 'CHEF']
+        self.assertTrue(all(len(item['recipes']) == 2 for item in chefs))
+
+    def test_list_filters(self):
+        cases = [
+            ({'allowed_vehicle': self.airbus.id}, Attendant.objects.filter(allowed_vehicles=self.airbus)),
+            ({'attendant_type': 'chef'}, Attendant.objects.filter(attendant_type='CHEF')),
+            ({'allowed_vehicle': self.airbus.id, 'attendant_type': 'CHIEF'},
+             Attendant.objects.filter(allowed_vehicles=self.airbus, attendant_type='CHIEF')),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.client.get(URL, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [item['id'] for item in response.data['results']],
+                    list(expected.order_by('id').values_list('id', flat=True)),
+                )
+        for allowed_vehicle in ('x', '99999999999999999999999', '\u00b2'):
+            with self.subTest(allowed_vehicle=allowed_vehicle):
+                self.assertEqual(self.client.get(URL, {'allowed_vehicle': allowed_vehicle}).status_code, 400)
+
+    def test_retrieve(self):
+        response = self.client.get(f'{URL}{self.chef.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['recipes'],
+            [{'dish_name': name} for name in self.chef.recipes.order_by('id').values_list('dish_name', flat=True)],
+        )
+        self.assertEqual(self.client.get(f'{URL}999999/').status_code, 404)
+
+    def test_create(self):
+        response = self.client.post(URL, self.payload(), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        attendant = Attendant.objects.get(id=response.data['id'])
+        self.assertEqual(set(attendant.allowed_vehicles.values_list('id', flat=True)), {self.boeing.id, self.airbus.id})
+
+        response = self.client.post(URL, self.payload(allowed_vehicles=[999999]), format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update(self):
+        response = self.client.put(
+            f'{URL}{self.chef.id}/', self.payload(attendant_type='CHEF', allowed_vehicles=[self.airbus.id]),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['allowed_vehicles'], [self.airbus.id])
+        # Recipes are read-only here and stay as they were
+        self.assertEqual(len(response.data['recipes']), 2)
+
+    def test_partial_update(self):
+        response = self.client.patch(f'{URL}{self.chef.id}/', {'known_languages': 'Turkish'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.chef.refresh_from_db()
+        self.assertEqual(self.chef.known_languages, 'Turkish')
+
+    def test_destroy(self):
+        # Not budgeted (the recipes cascade), so pinned here: 6 queries, one
+        # more to delete a chef's recipes
+        regular = Attendant.objects.filter(attendant_type='REGULAR').first()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertNumQueries(6):
+                response = self.client.delete(f'{URL}{regular.id}/')
+            self.assertEqual(response.status_code, 204)
+            with self.assertNumQueries(6 + 1):
+                response = self.client.delete(f'{URL}{self.chef.id}/')
+            self.assertEqual(response.status_code, 204)
+        self.assertFalse(Attendant.objects.filter(id=self.chef.id).exists())
+        self.assertFalse(Recipe.objects.filter(chef_id=self.chef.id).exists())
+
+        # Tombstones are written once the transaction commits, with one INSERT
+        # (the test's transaction holds both deletes)
+        with CaptureQueriesContext(connection) as queries:
+            for callback in callbacks:
+                callback()
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "skycrewApp_tombstone"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Tombstone.objects.count(), 1 + 1 + 2)
+
+    def test_changes(self):
+        response = self.client.get(URL + 'changes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(len(response.data['changed']), 30)
+
+        since = make_token(timezone.now() - timedelta(seconds=1))
+        Attendant.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        # A new recipe counts as a change to its chef
+        Recipe.objects.create(chef=self.chef, dish_name='Kunefe')
+        gone = Attendant.objects.exclude(id=self.chef.id).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'{URL}{gone.id}/')
+
+        response = self.client.get(URL + 'changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['changed']], [self.chef.id])
+        self.assertIn({'dish_name': 'Kunefe'}, response.data['changed'][0]['recipes'])
+        self.assertEqual(response.data['deleted'], [gone.id])
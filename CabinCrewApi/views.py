@@ -1,7 +1,42 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets
-from .models import Attendant
+from rest_framework.exceptions import ValidationError
+from skycrew.fastread import FastReadMixin
+from skycrew.pagination import StreamingListMixin
+from skycrew.params import parse_id
+from skycrew.querybudget import QueryBudgetMixin
+from skycrew.sync import ChangesMixin
+from FlightInfoApi.models import PlaneType
+from .models import Attendant, Recipe
 from .serializers import AttendantSerializer
 
-class AttendantViewSet(viewsets.ModelViewSet):
-    queryset= Attendant.objects.all()
-    serializer_class= AttendantSerializer
\ No newline at end of file
+class AttendantViewSet(QueryBudgetMixin, ChangesMixin, FastReadMixin, StreamingListMixin, viewsets.ModelViewSet):
+    # Nested recipes and the allowed_vehicles ids: one query each per page, not per attendant,
+    # in id order (the fast read path lists them the same way)
+    queryset= Attendant.objects.prefetch_related(
+        Prefetch('recipes', queryset=Recipe.objects.order_by('id')),
+        Prefetch('allowed_vehicles', queryset=PlaneType.objects.order_by('id')),
+    )
+    serializer_class= AttendantSerializer
+    fast_read = True
+    # Writes include the eligibility index refresh run on commit. No budget on
+    # destroy: a chef's recipes go with them, a tombstone each
+    query_budget = {'list': 3, 'retrieve': 3, 'create': 16, 'update': 14, 'partial_update': 14, 'changes': 6}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        # ?allowed_vehicle=3 -> exact match on the many-to-many, not a substring test
+        allowed_vehicle = params.get('allowed_vehicle')
+        if allowed_vehicle:
+            allowed_vehicle = parse_id(allowed_vehicle)
+            if allowed_vehicle is None:
+                raise ValidationError({"allowed_vehicle": "Must be a plane type id."})
+            queryset = queryset.filter(allowed_vehicles=allowed_vehicle)
+
+        attendant_type = params.get('attendant_type')
+        if attendant_type:
+            queryset = queryset.filter(attendant_type=attendant_type.upper())
+
+        return queryset
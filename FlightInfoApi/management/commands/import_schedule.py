@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skycrew.ingest import CSV, NDJSON, IngestError, iter_records
+from FlightInfoApi.schedule import BATCH_SIZE, import_schedule
+from skycrewApp.repair import repair_queue
+
+
+class Command(BaseCommand):
+    help = "Create or update flights (by flight_number) from a CSV or NDJSON schedule file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Schedule file, or - for stdin")
+        parser.add_argument('--format', choices=[CSV, NDJSON], help="Default: from the extension / first line")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows per bulk write")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with stream:
+            try:
+                result = import_schedule(
+                    iter_records(stream, fmt=options['format'], name=path),
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+            except IngestError as e:
+                raise CommandError(str(e))
+
+        if result['errors']:
+            for error in result['errors']:
+                details = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+                self.stderr.write(f"row {error['row']}: {details}")
+            raise CommandError(f"{len(result['errors'])} invalid row(s), nothing was imported")
+
+        # Repair the rosters the import touched before the process exits
+        repair_queue.flush()
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {result['created']} and updated {result['updated']} flights"))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FlightInfoApi', '0002_airport_updated_at_flight_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flight',
+            name='destination',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='arrivals', to='FlightInfoApi.airport'),
+        ),
+        migrations.AlterField(
+            model_name='flight',
+            name='plane_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='FlightInfoApi.planetype'),
+        ),
+        migrations.AlterField(
+            model_name='flight',
+            name='source',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='FlightInfoApi.airport'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_time', 'id'], name='FlightInfoA_departu_877608_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['source', 'departure_time', 'id'], name='FlightInfoA_source__46ddc1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['destination', 'departure_time', 'id'], name='FlightInfoA_destina_8379b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['source', 'destination', 'departure_time', 'id'], name='FlightInfoA_source__b71e40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['plane_type', 'departure_time', 'id'], name='FlightInfoA_plane_t_3ab48a_idx'),
+        ),
+    ]
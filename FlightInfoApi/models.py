@@ -12,6 +12,9 @@ class Airport(models.Model):
     city = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
 
+    # Set on every save, for ?since= sync (skycrew.sync)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"{self.code} - {self.name}"
 
@@ -24,6 +27,9 @@ class PlaneType(models.Model):
     seating_plan_layout = models.JSONField(help_text="JSON structure of seat coordinates")
     standard_menu = models.TextField(help_text="Standard menu served on this vehicle")
 
+    # Set on every save, for ?since= sync (skycrew.sync)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return self.name
 
@@ -38,10 +44,10 @@ class Flight(models.Model):
     duration = models.DurationField()
     distance = models.FloatField()
     
-    source = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='departures')
-    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='arrivals')
+    source = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='departures', db_index=False)
+    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name='arrivals', db_index=False)
     
-    plane_type = models.ForeignKey(PlaneType, on_delete=models.PROTECT)
+    plane_type = models.ForeignKey(PlaneType, on_delete=models.PROTECT, db_index=False)
     
     # Shared Flight Info
     is_shared = models.BooleanField(default=False)
@@ -51,5 +57,22 @@ class Flight(models.Model):
     # Requirement: Connecting flight info ONLY for shared flights
     connecting_flight_info = models.TextField(blank=True, null=True)
 
+    # Set on every save, for ?since= sync (skycrew.sync); the schedule import
+    # sets it on the rows it bulk updates (FlightInfoApi.schedule)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Flight search (FlightInfoApi.search): the route and plane type
+        # filters' equality columns, then the (departure_time, id) keyset
+        # order, so a page is one seek (is_shared is filtered, not indexed).
+        # They also cover the foreign keys, which therefore have no index of their own.
+        indexes = [
+            models.Index(fields=['departure_time', 'id']),
+            models.Index(fields=['source', 'departure_time', 'id']),
+            models.Index(fields=['destination', 'departure_time', 'id']),
+            models.Index(fields=['source', 'destination', 'departure_time', 'id']),
+            models.Index(fields=['plane_type', 'departure_time', 'id']),
+        ]
+
     def __str__(self):
         return self.flight_number
\ No newline at end of file
@@ -0,0 +1,187 @@
+import re
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_duration
+
+from skycrew.ingest import IngestError
+from skycrewApp.repair import repair_queue
+from .models import Airport, Flight, PlaneType
+
+# Rows validated before each upsert; also all that is held in memory
+BATCH_SIZE = 2000
+
+# Stop collecting errors past this many (the import is rejected anyway)
+MAX_ERRORS = 1000
+
+FLIGHT_NUMBER = re.compile(r'^[A-Z]{2}\d{4}$')
+TRUE = {'1', 'true', 'yes', 'y', 't'}
+FALSE = {'0', 'false', 'no', 'n', 'f', ''}
+
+# Columns rewritten when a flight_number already exists
+UPDATE_FIELDS = [
+    'departure_time', 'duration', 'distance', 'source', 'destination', 'plane_type',
+    'is_shared', 'partner_company_name', 'partner_flight_number', 'connecting_flight_info', 'updated_at',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+def import_schedule(records, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Upsert flights by flight_number from (row number, dict) records
+    (skycrew.ingest.iter_records), e.g. a 50k-line schedule file.
+
+    Airports (by code) and plane types (by id or name) are resolved from
+    dicts loaded once. Rows are validated and written BATCH_SIZE at a
+    time with bulk_create(update_conflicts=True), i.e. INSERT ... ON
+    CONFLICT DO UPDATE, so memory stays flat whatever the file size. The
+    whole import is one transaction: if any row is invalid nothing is
+    kept, and every bad row (up to MAX_ERRORS) is reported. A flight number repeated in the file ends up with its last
+    row. Returns {"created", "updated", "errors"}.
+    """
+    airports = dict(Airport.objects.values_list('code', 'id'))
+    plane_types = {}
+    for plane_id, name in PlaneType.objects.values_list('id', 'name'):
+        plane_types[str(plane_id)] = plane_id
+        plane_types.setdefault(name.strip().lower(), plane_id)
+
+    result = {"created": 0, "updated": 0, "errors": []}
+    try:
+        with transaction.atomic():
+            batch = {}
+            for row, record in records:
+                if isinstance(record, IngestError):
+                    _error(result, row, {"row": str(record)})
+                    continue
+                errors = {}
+                flight = _clean(record, airports, plane_types, errors)
+                if errors:
+                    _error(result, row, errors)
+                    continue
+                if result["errors"]:
+                    # Already failing: keep validating, stop writing
+                    continue
+                batch[flight.flight_number] = flight
+                if len(batch) >= batch_size:
+                    _upsert(batch, result)
+                    batch = {}
+            if batch and not result["errors"]:
+                _upsert(batch, result)
+            if result["errors"] or dry_run:
+                raise _Rollback
+    except _Rollback:
+        pass
+
+    if result["errors"]:
+        result["created"] = result["updated"] = 0
+    return result
+
+
+def _error(result, row, errors):
+    if len(result["errors"]) < MAX_ERRORS:
+        result["errors"].append({"row": row, "errors": errors})
+
+
+def _upsert(batch, result):
+    # One INSERT ... ON CONFLICT (flight_number) DO UPDATE per 500 rows; the
+    # lookup before it is only there to count creates vs updates
+    existing = Flight.objects.filter(flight_number__in=list(batch)).count()
+    Flight.objects.bulk_create(
+        batch.values(),
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['flight_number'],
+        update_fields=UPDATE_FIELDS,
+    )
+    result["created"] += len(batch) - existing
+    result["updated"] += existing
+    # bulk_create sends no post_save: queue the updated flights' rosters ourselves
+    numbers = list(batch)
+    transaction.on_commit(lambda: repair_queue.mark_flights(flight_numbers=numbers))
+
+
+def _clean(record, airports, plane_types, errors):
+    # One schedule row -> an unsaved Flight (or errors filled in)
+    number = str(record.get('flight_number', '')).strip().upper()
+    if not FLIGHT_NUMBER.match(number):
+        errors['flight_number'] = "Format must be AANNNN"
+
+    departure = record.get('departure_time')
+    try:
+        departure_time = parse_datetime(str(departure)) if departure else None
+    except ValueError:
+        # Well formed but not a date, e.g. month 13
+        departure_time = None
+    if departure_time is None:
+        errors['departure_time'] = "An ISO 8601 datetime is required."
+    elif timezone.is_naive(departure_time):
+        departure_time = timezone.make_aware(departure_time)
+
+    try:
+        duration = parse_duration(str(record.get('duration', '')))
+    except (ValueError, OverflowError):
+        duration = None
+    if duration is None or duration.total_seconds() <= 0:
+        errors['duration'] = "A positive duration (HH:MM:SS or ISO 8601) is required."
+
+    try:
+        distance = float(record['distance'])
+    except KeyError:
+        errors['distance'] = "This field is required."
+    except (TypeError, ValueError):
+        errors['distance'] = "A valid number is required."
+
+    ends = {}
+    for field in ('source', 'destination'):
+        code = str(record.get(field, '')).strip().upper()
+        ends[field] = airports.get(code)
+        if ends[field] is None:
+            errors[field] = f"Unknown airport '{code}'."
+
+    plane = str(record.get('plane_type', '')).strip().lower()
+    plane_type = plane_types.get(plane)
+    if plane_type is None:
+        errors['plane_type'] = f"Unknown plane type '{record.get('plane_type', '')}'."
+
+    # Partner and connecting flight info only exist for shared flights
+    shared = str(record.get('is_shared', '')).strip().lower()
+    if shared not in TRUE | FALSE:
+        errors['is_shared'] = "Must be true or false."
+    is_shared = shared in TRUE
+    partner_company_name = record.get('partner_company_name') or None
+    partner_flight_number = record.get('partner_flight_number') or None
+    connecting_flight_info = record.get('connecting_flight_info') or None
+    if is_shared:
+        if not partner_company_name:
+            errors['partner_company_name'] = "Required for shared flights."
+        elif len(str(partner_company_name)) > 100:
+            errors['partner_company_name'] = "Ensure this field has no more than 100 characters."
+        if not partner_flight_number:
+            errors['partner_flight_number'] = "Required for shared flights."
+        elif len(str(partner_flight_number)) > 6:
+            errors['partner_flight_number'] = "Ensure this field has no more than 6 characters."
+    else:
+        for field, value in (('partner_company_name', partner_company_name),
+                             ('partner_flight_number', partner_flight_number),
+                             ('connecting_flight_info', connecting_flight_info)):
+            if value:
+                errors[field] = "Only allowed on shared flights."
+
+    if errors:
+        return None
+    return Flight(
+        flight_number=number,
+        departure_time=departure_time,
+        duration=duration,
+        distance=distance,
+        source_id=ends['source'],
+        destination_id=ends['destination'],
+        plane_type_id=plane_type,
+        is_shared=is_shared,
+        partner_company_name=partner_company_name,
+        partner_flight_number=partner_flight_number,
+        connecting_flight_info=connecting_flight_info,
+    )
@@ -0,0 +1,77 @@
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from skycrew.pagination import CompositeKeysetPagination
+from skycrew.params import parse_id
+
+TRUE = {'1', 'true', 'yes'}
+FALSE = {'0', 'false', 'no'}
+
+
+class DeparturePagination(CompositeKeysetPagination):
+    # Matches the (..., departure_time, id) indexes on Flight
+    ordering = ('departure_time', 'id')
+
+
+def search_flights(queryset, params):
+    """
+    Narrow a Flight queryset by the search parameters; each one given
+    must hold:
+      source, destination   airport code (IST) or id
+      start, end            departure window, ISO 8601: start <= t < end
+      plane_type            plane type id
+      is_shared             true / false
+    No filter, a window, source, destination, source and destination, or
+    plane_type each have an index on Flight that starts with their
+    equality columns and goes on with departure_time, id, so a page costs
+    one index seek. Other combinations (is_shared, a route with a plane
+    type) seek on one of those and filter the rest as they go. Raises
+    ValidationError on malformed values.
+    """
+    errors = {}
+    for name in ('source', 'destination'):
+        value = params.get(name, '').strip()
+        if not value:
+            continue
+        # parse_id, not str.isdigit(): '²' is a digit that int() rejects
+        airport_id = parse_id(value)
+        if len(value) == 3 and value.isalpha():
+            queryset = queryset.filter(**{f'{name}__code': value.upper()})
+        elif airport_id is not None:
+            queryset = queryset.filter(**{f'{name}_id': airport_id})
+        else:
+            errors[name] = "Must be an airport code or id."
+
+    for name, lookup in (('start', 'departure_time__gte'), ('end', 'departure_time__lt')):
+        value = params.get(name)
+        if not value:
+            continue
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            # Well formed but not a date, e.g. month 13
+            moment = None
+        if moment is None:
+            errors[name] = "Must be an ISO 8601 datetime."
+        else:
+            queryset = queryset.filter(**{lookup: moment})
+
+    plane_type = params.get('plane_type')
+    if plane_type:
+        plane_type_id = parse_id(plane_type)
+        if plane_type_id is not None:
+            queryset = queryset.filter(plane_type_id=plane_type_id)
+        else:
+            errors['plane_type'] = "Must be a plane type id."
+
+    is_shared = params.get('is_shared', '').strip().lower()
+    if is_shared in TRUE:
+        queryset = queryset.filter(is_shared=True)
+    elif is_shared in FALSE:
+        queryset = queryset.filter(is_shared=False)
+    elif is_shared:
+        errors['is_shared'] = "Must be true or false."
+
+    if errors:
+        raise ValidationError(errors)
+    return queryset
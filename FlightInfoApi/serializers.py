@@ -4,14 +4,15 @@ from .models import Flight, Airport, PlaneType
 class AirportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Airport
-        fields = '__all__'
+        # updated_at is only for ?since= sync, not part of the resource
+        exclude = ['updated_at']
 
 class PlaneTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = PlaneType
-        fields = '__all__'
+        exclude = ['updated_at']
 
 class FlightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Flight
-        fields = '__all__'
\ No newline at end of file
+        exclude = ['updated_at']
\ No newline at end of file
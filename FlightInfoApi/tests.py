@@ -1,3 +1,295 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.utils import timezone
+
+from skycrew.sync import make_token
+from skycrew.tests.support import (
+    DEPARTURE, FastReadAssertions, QueryBudgetTestCase, as_json, make_airport, make_flight, make_passenger,
+    make_plane_type,
+)
+from PassengerApi.models import Passenger
+from .models import Airport, Flight, PlaneType
+from .serializers import FlightSerializer
+from .views import AirportViewSet, FlightViewSet, PlaneTypeViewSet
+
+URL = '/api/flight-info/'
+
+
+class FlightInfoFastReadTests(FastReadAssertions, QueryBudgetTestCase):
+    # The fast read path renders exactly what the serializers do
+
+    @classmethod
+    def setUpTestData(cls):
+        ist = make_airport('IST')
+        lhr = make_airport('LHR', country='United Kingdom')
+        boeing = make_plane_type('Boeing 737')
+        make_plane_type('Airbus A320', seating_plan_layout={"cabins": [
+            {"class": "BUSINESS", "rows": [1, 2], "cols": "AC DF"},
+            {"class": "ECONOMY", "rows": [3, 10], "cols": "ABC DEF"},
+        ]})
+        make_flight('SC1001', ist, lhr, boeing)
+        # Durations with days and microseconds, a codeshare with partner fields
+        make_flight('SC1002', lhr, ist, boeing, duration=timedelta(days=1, seconds=5, microseconds=250))
+        make_flight(
+            'SC1003', ist, lhr, boeing, is_shared=True, partner_company_name='Partner Air',
+            partner_flight_number='PA0042', connecting_flight_info='PA0043 to JFK',
+        )
+
+    def test_plans_match_serializers(self):
+        for viewset in (FlightViewSet, AirportViewSet, PlaneTypeViewSet):
+            with self.subTest(viewset.__name__):
+                self.assertRendersLikeSerializer(viewset)
+
+    def test_list_and_retrieve_match_serializer(self):
+        for path, viewset in (('flights/', FlightViewSet), ('airports/', AirportViewSet), ('planes/', PlaneTypeViewSet)):
+            with self.subTest(viewset.__name__):
+                self.assertListLikeSerializer(URL + path, viewset)
+
+    def test_fields(self):
+        self.assertFieldsProjection(URL + 'flights/', FlightViewSet, ['flight_number', 'duration', 'source'])
+        self.assertFieldsProjection(URL + 'planes/', PlaneTypeViewSet, ['name', 'seating_plan_layout'])
+
+    def test_search_matches_serializer(self):
+        flights = FlightViewSet.queryset.filter(source__code='IST').order_by('departure_time', 'id')
+        response = self.client.get(URL + 'flights/search/', {'source': 'IST'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(as_json(response.data['results']), as_json(FlightSerializer(flights, many=True).data))
+
+
+class FlightApiTests(QueryBudgetTestCase):
+    # Every action within its query budget, search included
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ist = make_airport('IST')
+        cls.lhr = make_airport('LHR', country='United Kingdom')
+        cls.cdg = make_airport('CDG', country='France')
+        cls.boeing = make_plane_type('Boeing 737')
+        cls.airbus = make_plane_type('Airbus A320')
+        routes = [(cls.ist, cls.lhr), (cls.lhr, cls.ist), (cls.ist, cls.cdg)]
+        for i in range(30):
+            source, destination = routes[i % 3]
+            # Pairs of flights leave at the same time: the keyset must break ties on id
+            make_flight(
+                f'SC{1000 + i}', source, destination, cls.boeing if i % 2 else cls.airbus,
+                departure_time=DEPARTURE + timedelta(hours=(29 - i) // 2), is_shared=i % 5 == 0,
+                partner_company_name='Partner Air' if i % 5 == 0 else None,
+                partner_flight_number=f'PA{i:04}' if i % 5 == 0 else None,
+            )
+        cls.flight = Flight.objects.order_by('id').first()
+
+    def payload(self, **fields):
+        return {
+            'flight_number': 'SC2000', 'departure_time': '2025-07-01T10:00:00Z', 'duration': '02:30:00',
+            'distance': 1800.0, 'source': self.ist.id, 'destination': self.cdg.id,
+            'plane_type': self.boeing.id, 'is_shared': False, **fields,
+        }
+
+    def test_list(self):
+        response = self.client.get(URL + 'flights/', {'flight_number': 'SC1007'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['flight_number'] for item in response.data['results']], ['SC1007'])
+
+    def test_retrieve(self):
+        response = self.client.get(f'{URL}flights/{self.flight.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['flight_number'], self.flight.flight_number)
+        self.assertEqual(self.client.get(f'{URL}flights/999999/').status_code, 404)
+
+    def test_create(self):
+        response = self.client.post(URL + 'flights/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Flight.objects.get(flight_number='SC2000').duration, timedelta(hours=2, minutes=30))
+
+        response = self.client.post(URL + 'flights/', self.payload(flight_number='2000SC'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('flight_number', response.data)
+
+    def test_update(self):
+        response = self.client.put(
+            f'{URL}flights/{self.flight.id}/', self.payload(flight_number=self.flight.flight_number), format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.destination_id, self.cdg.id)
+
+    def test_partial_update(self):
+        response = self.client.patch(f'{URL}flights/{self.flight.id}/', {'distance': 99.5}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['distance'], 99.5)
+
+    def test_destroy(self):
+        # Not budgeted: the passengers go with the flight
+        make_passenger(self.flight)
+        response = self.client.delete(f'{URL}flights/{self.flight.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Passenger.objects.filter(flight_id=self.flight.id).exists())
+
+    def test_changes(self):
+        since = make_token(timezone.now() - timedelta(seconds=1))
+        Flight.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.client.patch(f'{URL}flights/{self.flight.id}/', {'distance': 10.0}, format='json')
+
+        response = self.client.get(URL + 'flights/changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['changed']], [self.flight.id])
+        self.assertEqual(response.data['deleted'], [])
+
+    def test_search(self):
+        start, end = DEPARTURE + timedelta(hours=3), DEPARTURE + timedelta(hours=9)
+        everything = Flight.objects.all()
+        cases = [
+            ({}, everything),
+            ({'source': 'IST'}, everything.filter(source=self.ist)),
+            ({'source': 'ist'}, everything.filter(source=self.ist)),
+            ({'source': str(self.lhr.id)}, everything.filter(source=self.lhr)),
+            ({'destination': 'CDG'}, everything.filter(destination=self.cdg)),
+            ({'source': 'IST', 'destination': 'LHR'}, everything.filter(source=self.ist, destination=self.lhr)),
+            ({'start': start.isoformat(), 'end': end.isoformat()},
+             everything.filter(departure_time__gte=start, departure_time__lt=end)),
+            ({'source': 'IST', 'start': start.isoformat()}, everything.filter(source=self.ist, departure_time__gte=start)),
+            ({'plane_type': str(self.airbus.id)}, everything.filter(plane_type=self.airbus)),
+            ({'is_shared': 'true'}, everything.filter(is_shared=True)),
+            ({'is_shared': 'no', 'destination': 'IST'}, everything.filter(is_shared=False, destination=self.ist)),
+            ({'source': 'JFK'}, everything.none()),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.client.get(URL + 'flights/search/', params)
+                self.assertEqual(response.status_code, 200, response.data)
+                self.assertEqual(
+                    [item['id'] for item in response.data['results']],
+                    list(expected.order_by('departure_time', 'id').values_list('id', flat=True)),
+                )
+
+    def test_search_pages(self):
+        # Forward through every page, then back from the last one
+        pages = []
+        url = URL + 'flights/search/?page_size=4&fields=id'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data['next']
+        expected = list(Flight.objects.order_by('departure_time', 'id').values_list('id', flat=True))
+        self.assertEqual(sum(pages, []), expected)
+
+        url = response.data['previous']
+        for page in reversed(pages[:-1]):
+            response = self.client.get(url)
+            self.assertEqual([item['id'] for item in response.data['results']], page)
+            url = response.data['previous']
+        self.assertIsNone(url)
+
+    def test_search_rejects_bad_parameters(self):
+        cases = [
+            ({'source': 'Istanbul'}, 'source'),
+            ({'destination': 'I5T'}, 'destination'),
+            ({'start': 'yesterday'}, 'start'),
+            ({'end': '2025-13-01T00:00:00'}, 'end'),
+            ({'plane_type': 'Boeing'}, 'plane_type'),
+            # Digits to str.isdigit(), not to int(); past a 64-bit id
+            ({'source': '\u00b2'}, 'source'),
+            ({'plane_type': '99999999999999999999999'}, 'plane_type'),
+            ({'is_shared': 'maybe'}, 'is_shared'),
+            ({'fields': 'id,gate'}, 'fields'),
+        ]
+        for params, field in cases:
+            with self.subTest(params=params):
+                response = self.client.get(URL + 'flights/search/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.data)
+        # Like the list endpoints' cursors
+        self.assertEqual(self.client.get(URL + 'flights/search/', {'cursor': 'garbage'}).status_code, 404)
+
+    def test_import(self):
+        body = (
+            'flight_number,departure_time,duration,distance,source,destination,plane_type,is_shared\n'
+            'SC1000,2025-08-01T08:00:00Z,01:30:00,900,IST,CDG,Boeing 737,false\n'
+            'SC3000,2025-08-01T09:00:00Z,PT2H,1200,CDG,LHR,Airbus A320,false\n'
+        )
+        response = self.client.post(URL + 'flights/import/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual(Flight.objects.get(flight_number='SC1000').destination_id, self.cdg.id)
+
+        response = self.client.post(URL + 'flights/import/?dry_run=1', body.replace('CDG,LHR', 'CDG,XXX'),
+                                    content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        # Data rows count from 1
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+
+class ReferenceDataApiTests(QueryBudgetTestCase):
+    # Airports and plane types: CRUD within budget, GETs from the reference cache
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ist = make_airport('IST')
+        cls.lhr = make_airport('LHR', country='United Kingdom')
+        cls.boeing = make_plane_type('Boeing 737')
+        cls.spare = make_plane_type('Embraer 190', seat_capacity=96)
+        make_flight('SC1001', cls.ist, cls.lhr, cls.boeing)
+
+    def test_airports(self):
+        response = self.client.post(
+            URL + 'airports/', {'code': 'CDG', 'name': 'Charles de Gaulle', 'city': 'Paris', 'country': 'France'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        cdg = response.data['id']
+        self.assertEqual(self.client.post(URL + 'airports/', {'code': 'cdg'}, format='json').status_code, 400)
+
+        response = self.client.put(
+            f'{URL}airports/{cdg}/', {'code': 'ORY', 'name': 'Orly', 'city': 'Paris', 'country': 'France'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.patch(f'{URL}airports/{cdg}/', {'name': 'Paris Orly'}, format='json')
+        self.assertEqual(response.data['name'], 'Paris Orly')
+
+        response = self.client.get(f'{URL}airports/{cdg}/')
+        self.assertEqual((response.status_code, response.data['code']), (200, 'ORY'))
+        # The cached copy goes once the delete commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'{URL}airports/{cdg}/').status_code, 204)
+        self.assertEqual(self.client.get(f'{URL}airports/{cdg}/').status_code, 404)
+
+    def test_plane_types(self):
+        payload = {
+            'name': 'Airbus A330', 'seat_capacity': 250, 'crew_limit': 10,
+            'seating_plan_layout': {"rows": 42, "cols": "AB DEFG JK"}, 'standard_menu': 'Three courses',
+        }
+        response = self.client.post(URL + 'planes/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        plane = response.data['id']
+        response = self.client.put(f'{URL}planes/{plane}/', {**payload, 'crew_limit': 11}, format='json')
+        self.assertEqual(response.data['crew_limit'], 11)
+        response = self.client.patch(f'{URL}planes/{plane}/', {'seat_capacity': 260}, format='json')
+        self.assertEqual(response.data['seat_capacity'], 260)
+        self.assertEqual(self.client.delete(f'{URL}planes/{self.spare.id}/').status_code, 204)
+
+    def test_cached_reads(self):
+        for path in ('airports/', f'airports/{self.ist.id}/', 'planes/', f'planes/{self.boeing.id}/'):
+            with self.subTest(path=path):
+                first = self.client.get(URL + path)
+                self.assertEqual(first.status_code, 200)
+                with self.assertNumQueries(0):
+                    again = self.client.get(URL + path)
+                self.assertEqual(again.data, first.data)
+                with self.assertNumQueries(0):
+                    response = self.client.get(URL + path, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_cache(self):
+        self.client.get(f'{URL}planes/{self.boeing.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'{URL}planes/{self.boeing.id}/', {'name': 'Boeing 737 MAX'}, format='json')
+        self.assertEqual(self.client.get(f'{URL}planes/{self.boeing.id}/').data['name'], 'Boeing 737 MAX')
+
+    def test_changes(self):
+        for path, count in (('airports/', 2), ('planes/', 2)):
+            with self.subTest(path=path):
+                response = self.client.get(URL + path + 'changes/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['changed']), count)
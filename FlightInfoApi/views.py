@@ -1,15 +1,89 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from skycrew.ingest import IngestError, request_records
+from skycrew.fastread import FastReadMixin
+from skycrew.pagination import StreamingListMixin
+from skycrew.querybudget import QueryBudgetMixin
+from skycrew.refcache import ReferenceCacheMixin
+from skycrew.sync import ChangesMixin
 from .models import Flight, Airport, PlaneType
+from .schedule import import_schedule
+from .search import DeparturePagination, search_flights
 from .serializers import FlightSerializer, AirportSerializer, PlaneTypeSerializer
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(QueryBudgetMixin, ChangesMixin, FastReadMixin, StreamingListMixin, viewsets.ModelViewSet):
+    # Airports and the plane type are serialized as ids, nothing to join
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
+    fast_read = True
+    # No budget on destroy: the passengers cascade is deleted 100 rows per query
+    query_budget = {'list': 1, 'retrieve': 1, 'create': 5, 'update': 6, 'partial_update': 6, 'changes': 5, 'search': 1}
 
-class AirportViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?flight_number=SC1001 -> uses the unique index, no full table download
+        flight_number = self.request.query_params.get('flight_number')
+        if flight_number:
+            queryset = queryset.filter(flight_number=flight_number)
+        return queryset
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        GET flights by route, departure window, plane type and codeshare,
+        ordered by departure time, e.g.
+          ?source=IST&start=2025-06-01T06:00:00Z&end=2025-06-01T12:00:00Z
+          ?source=IST&destination=LHR&start=...&end=...
+          ?plane_type=2&is_shared=false
+        See FlightInfoApi.search.search_flights. Pages are keyed on
+        (departure_time, id); ?page_size= and ?fields= work as on the list.
+        """
+        queryset = search_flights(self.get_queryset(), request.query_params)
+        paginator = DeparturePagination()
+        serializer_class = self.get_serializer_class()
+        plan = self._read_plan()
+        if plan is None:
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            return paginator.get_paginated_response(
+                serializer_class(page, many=True, context=self.get_serializer_context()).data
+            )
+        names = plan.project(request.query_params.get('fields'))
+        page = paginator.paginate_queryset(plan.values(queryset, names, paginator.ordering), request, view=self)
+        return paginator.get_paginated_response(plan.render(page, names))
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        """
+        POST a schedule as CSV or NDJSON (raw body, or a multipart "file"),
+        one flight per row, upserted by flight_number; see
+        FlightInfoApi.schedule.import_schedule. ?dry_run=1 validates only.
+        """
+        try:
+            result = import_schedule(
+                request_records(request),
+                dry_run=request.query_params.get('dry_run') in ('1', 'true'),
+            )
+        except IngestError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(result, status=400 if result['errors'] else 200)
+
+# Airports and plane types barely change: GETs come from the reference cache
+# (0 queries on a hit; a miss also reads the model's last change time)
+
+class AirportViewSet(
+    QueryBudgetMixin, ReferenceCacheMixin, ChangesMixin, FastReadMixin, StreamingListMixin, viewsets.ModelViewSet,
+):
     queryset = Airport.objects.all()
     serializer_class = AirportSerializer
+    fast_read = True
+    # destroy cascades to the airport's flights, see FlightViewSet
+    query_budget = {'list': 3, 'retrieve': 3, 'create': 2, 'update': 3, 'partial_update': 3, 'changes': 5}
 
-class PlaneTypeViewSet(viewsets.ModelViewSet):
+class PlaneTypeViewSet(
+    QueryBudgetMixin, ReferenceCacheMixin, ChangesMixin, FastReadMixin, StreamingListMixin, viewsets.ModelViewSet,
+):
     queryset = PlaneType.objects.all()
-    serializer_class = PlaneTypeSerializer
\ No newline at end of file
+    serializer_class = PlaneTypeSerializer
+    fast_read = True
+    query_budget = {'list': 3, 'retrieve': 3, 'create': 1, 'update': 2, 'partial_update': 2, 'destroy': 8, 'changes': 5}
@@ -0,0 +1,258 @@
+from django.db import transaction
+from django.utils import timezone
+
+from FlightInfoApi.models import Flight
+from skycrew.ingest import IngestError, split_list
+from skycrewApp.repair import repair_queue
+from skycrewApp.seating import get_seat_map
+from .models import Passenger
+
+# Passenger columns an upload may set directly
+FIELDS = {
+    'name': 100,
+    'gender': 20,
+    'nationality': 50,
+}
+SEAT_TYPES = {choice for choice, _ in Passenger.SEAT_TYPE_CHOICES}
+INFANT_AGE = 2
+
+
+def ingest_passengers(records):
+    """
+    Validate and create a whole manifest, all or nothing.
+
+    records yields (row number, dict) (see skycrew.ingest.iter_records).
+    Each row has the Passenger fields, the flight as `flight` (db id) or
+    `flight_number`, and may refer to other passengers two ways:
+      parent / affiliated_passengers            ids of existing passengers
+      ref + parent_ref / affiliated_refs        labels of rows in this upload
+
+    Checks run over the whole set with a handful of queries (flights, plane
+    types, referenced passengers, seats already taken), never one per row.
+    Returns {"created": n, "refs": {ref: id}} or {"created": 0, "errors":
+    [{"row": n, "errors": {field: message}}]}; nothing is written unless
+    every row is valid.
+    """
+    rows = []
+    errors = {}
+    for row, record in records:
+        if isinstance(record, IngestError):
+            errors.setdefault(row, {})['row'] = str(record)
+            continue
+        rows.append((row, _clean(record, errors.setdefault(row, {}))))
+
+    _check_references(rows, errors)
+
+    errors = [{"row": row, "errors": found} for row, found in sorted(errors.items()) if found]
+    if errors:
+        return {"created": 0, "errors": errors}
+    return _write(rows)
+
+
+def _clean(record, errors):
+    # Per-row field checks; returns the normalised row
+    data = {}
+    for field, max_length in FIELDS.items():
+        value = record.get(field)
+        if value in (None, ''):
+            errors[field] = "This field is required."
+        elif len(str(value)) > max_length:
+            errors[field] = f"Ensure this field has no more than {max_length} characters."
+        else:
+            data[field] = str(value)
+
+    try:
+        data['age'] = int(record['age'])
+        if data['age'] < 0:
+            errors['age'] = "Must be 0 or more."
+    except KeyError:
+        errors['age'] = "This field is required."
+    except (TypeError, ValueError):
+        errors['age'] = "A valid integer is required."
+
+    seat_type = str(record.get('seat_type', '')).upper()
+    if seat_type not in SEAT_TYPES:
+        errors['seat_type'] = f"Must be one of {', '.join(sorted(SEAT_TYPES))}."
+    data['seat_type'] = seat_type
+
+    seat_number = record.get('seat_number') or None
+    if seat_number is not None and len(str(seat_number)) > 5:
+        errors['seat_number'] = "Ensure this field has no more than 5 characters."
+    data['seat_number'] = str(seat_number).upper() if seat_number else None
+
+    data['flight'] = record.get('flight')
+    data['flight_number'] = record.get('flight_number')
+    if data['flight'] in (None, '') and not data['flight_number']:
+        errors['flight'] = "Give flight (id) or flight_number."
+
+    data['ref'] = str(record['ref']) if record.get('ref') not in (None, '') else None
+    data['parent'] = record.get('parent') or None
+    data['parent_ref'] = str(record['parent_ref']) if record.get('parent_ref') not in (None, '') else None
+    data['affiliated'] = split_list(record.get('affiliated_passengers'))
+    data['affiliated_refs'] = [str(ref) for ref in split_list(record.get('affiliated_refs'))]
+    return data
+
+
+def _as_ids(values, errors, field):
+    ids = []
+    for value in values:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            errors[field] = f"'{value}' is not a passenger id."
+    return ids
+
+
+def _check_references(rows, errors):
+    # Everything that needs other rows or the database, for the whole batch at once
+    flight_ids = set()
+    flight_numbers = set()
+    passenger_ids = set()
+    refs = {}
+    for row, data in rows:
+        found = errors[row]
+        if data['flight'] not in (None, ''):
+            try:
+                data['flight'] = int(data['flight'])
+                flight_ids.add(data['flight'])
+            except (TypeError, ValueError):
+                found['flight'] = "A valid flight id is required."
+        elif data['flight_number']:
+            flight_numbers.add(data['flight_number'])
+        if data['parent'] is not None:
+            parent = _as_ids([data['parent']], found, 'parent')
+            data['parent'] = parent[0] if parent else None
+            passenger_ids.update(parent)
+        data['affiliated'] = _as_ids(data['affiliated'], found, 'affiliated_passengers')
+        passenger_ids.update(data['affiliated'])
+        if data['ref'] is not None:
+            if data['ref'] in refs:
+                found['ref'] = f"Duplicate ref, also used on row {refs[data['ref']][0]}."
+            else:
+                refs[data['ref']] = (row, data)
+
+    # 1. Flights and their plane types (query 1)
+    flights = {}
+    by_number = {}
+    for flight in (
+        Flight.objects.filter(id__in=flight_ids) | Flight.objects.filter(flight_number__in=flight_numbers)
+    ).select_related('plane_type'):
+        flights[flight.id] = flight
+        by_number[flight.flight_number] = flight
+    for row, data in rows:
+        flight = flights.get(data['flight']) if data['flight'] not in (None, '') else by_number.get(data['flight_number'])
+        if flight is None and 'flight' not in errors[row]:
+            errors[row]['flight'] = "Flight not found."
+        data['flight'] = flight
+
+    # 2. Existing passengers referred to as parent/affiliate (query 2)
+    existing = {
+        p['id']: p for p in Passenger.objects.filter(id__in=passenger_ids).values('id', 'name', 'age', 'flight_id')
+    }
+
+    # 3. Seats already taken on these flights (query 3)
+    taken = set(
+        Passenger.objects.filter(flight__in=list(flights.values()), seat_number__isnull=False)
+        .exclude(seat_number='')
+        .values_list('flight_id', 'seat_number')
+    )
+
+    seat_maps = {}
+    for row, data in rows:
+        found = errors[row]
+
+        # Parent: an existing passenger or a row of this upload, and never an infant
+        parent = None
+        if data['parent_ref'] is not None:
+            parent = refs.get(data['parent_ref'], (None, None))[1]
+            if parent is None:
+                found['parent_ref'] = f"No row with ref '{data['parent_ref']}'."
+        elif data['parent'] is not None:
+            parent = existing.get(data['parent'])
+            if parent is None and 'parent' not in found:
+                found['parent'] = f"Passenger {data['parent']} not found."
+        if parent is not None and isinstance(parent.get('age'), int) and parent['age'] <= INFANT_AGE:
+            found['parent'] = f"Passenger '{parent['name']}' is an infant (Age {parent['age']}). Infants cannot be parents."
+        if data.get('age') is not None and data['age'] <= INFANT_AGE and parent is None and 'parent' not in found \
+                and 'parent_ref' not in found:
+            found['parent'] = "Infant passengers (age 0-2) must have a parent assigned."
+
+        missing = [i for i in data['affiliated'] if i not in existing]
+        if missing:
+            found['affiliated_passengers'] = f"Passengers not found: {', '.join(map(str, missing))}."
+        unknown = [ref for ref in data['affiliated_refs'] if ref not in refs]
+        if unknown:
+            found['affiliated_refs'] = f"No rows with refs: {', '.join(unknown)}."
+
+        # Seat: on the plane, in the passenger's cabin, and not taken
+        flight = data['flight']
+        if data['seat_number'] and flight is not None:
+            if flight.plane_type_id not in seat_maps:
+                plane = flight.plane_type
+                seat_maps[flight.plane_type_id] = get_seat_map({
+                    'seating_plan_layout': plane.seating_plan_layout, 'seat_capacity': plane.seat_capacity,
+                })
+            seat_map = seat_maps[flight.plane_type_id]
+            i = seat_map.index.get(data['seat_number'])
+            key = (flight.id, data['seat_number'])
+            if i is None:
+                found['seat_number'] = f"Seat {data['seat_number']} doesn't exist on this plane."
+            elif i not in seat_map.seats_for(data['seat_type']):
+                found['seat_number'] = f"Seat {data['seat_number']} isn't in the {data['seat_type'].lower()} cabin."
+            elif key in taken:
+                found['seat_number'] = f"Seat {data['seat_number']} is already taken on this flight."
+            else:
+                taken.add(key)
+
+
+def _write(rows):
+    # Everything validated: one transaction, bulk inserts only
+    with transaction.atomic():
+        passengers = [
+            Passenger(
+                flight=data['flight'],
+                name=data['name'],
+                age=data['age'],
+                gender=data['gender'],
+                nationality=data['nationality'],
+                seat_type=data['seat_type'],
+                seat_number=data['seat_number'],
+                parent_id=data['parent'] if data['parent_ref'] is None else None,
+            )
+            for _, data in rows
+        ]
+        Passenger.objects.bulk_create(passengers, batch_size=500)
+
+        ids = {data['ref']: p.id for (_, data), p in zip(rows, passengers) if data['ref'] is not None}
+
+        # Parents inside the upload only have ids now
+        with_parent = []
+        for (_, data), p in zip(rows, passengers):
+            if data['parent_ref'] is not None:
+                p.parent_id = ids[data['parent_ref']]
+                with_parent.append(p)
+        Passenger.objects.bulk_update(with_parent, ['parent'], batch_size=500)
+
+        # affiliated_passengers is symmetrical: a link is stored in both directions
+        Through = Passenger.affiliated_passengers.through
+        links = set()
+        for (_, data), p in zip(rows, passengers):
+            for other in data['affiliated'] + [ids[ref] for ref in data['affiliated_refs']]:
+                if other != p.id:
+                    links.add((p.id, other))
+                    links.add((other, p.id))
+        Through.objects.bulk_create(
+            [Through(from_passenger_id=a, to_passenger_id=b) for a, b in links],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        # Passengers already in the table now list the newcomers: bump them for ?since= sync
+        existing = {other for _, data in rows for other in data['affiliated']}
+        if existing:
+            Passenger.objects.filter(id__in=existing).update(updated_at=timezone.now())
+
+        # No post_save from bulk_create: seat the newcomers on any stored rosters
+        flight_ids = {p.flight_id for p in passengers}
+        transaction.on_commit(lambda: repair_queue.mark_flights(flight_ids=flight_ids))
+
+    return {"created": len(passengers), "refs": ids}
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skycrew.ingest import CSV, NDJSON, IngestError, iter_records
+from PassengerApi.bulk import ingest_passengers
+from skycrewApp.repair import repair_queue
+
+
+class Command(BaseCommand):
+    help = "Create a passenger manifest from a CSV or NDJSON file, all rows or none."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Manifest file, or - for stdin")
+        parser.add_argument('--format', choices=[CSV, NDJSON], help="Default: from the extension / first line")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with stream:
+            try:
+                result = ingest_passengers(iter_records(stream, fmt=options['format'], name=path))
+            except IngestError as e:
+                raise CommandError(str(e))
+
+        if result.get('errors'):
+            for error in result['errors']:
+                details = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+                self.stderr.write(f"row {error['row']}: {details}")
+            raise CommandError(f"{len(result['errors'])} invalid row(s), nothing was imported")
+
+        # Repair the rosters the import touched before the process exits
+        repair_queue.flush()
+        self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} passengers"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PassengerApi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passenger',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
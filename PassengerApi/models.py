@@ -27,5 +27,10 @@ class Passenger(models.Model):
     # Requirement: List of affiliated passenger ids (neighbors)
     affiliated_passengers = models.ManyToManyField('self', blank=True)
 
+    # Set on every save, for ?since= sync (skycrew.sync). skycrewApp.signals
+    # also bumps it when affiliations change or a parent is deleted, and
+    # PassengerApi.bulk when an import links newcomers to existing passengers
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"{self.name} - {self.flight.flight_number}"
\ No newline at end of file
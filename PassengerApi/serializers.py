@@ -6,7 +6,7 @@ class PassengerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Passenger
-        fields = '__all__'
+        exclude = ['updated_at']
 
     def validate(self, data):
         """
@@ -1,3 +1,166 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.utils import timezone
+
+from skycrew.sync import make_token
+from skycrew.tests.support import FastReadAssertions, QueryBudgetTestCase, make_flight, make_passenger
+from .models import Passenger
+from .views import PassengerViewSet
+
+URL = '/api/passengers/passengers/'
+
+
+class PassengerFastReadTests(FastReadAssertions, QueryBudgetTestCase):
+    # The fast read path renders exactly what PassengerSerializer does,
+    # including the (symmetrical) affiliated_passengers ids
+
+    @classmethod
+    def setUpTestData(cls):
+        flight = make_flight()
+        parent = make_passenger(flight, 'Can Yilmaz', seat_number='1A', seat_type='BUSINESS')
+        friend = make_passenger(flight, 'Ece Yilmaz')
+        make_passenger(flight, 'Bebek Yilmaz', age=1, parent=parent, affiliated=[friend, parent])
+        make_passenger(flight, 'Oya Sen', nationality='German')
+
+    def test_plan_matches_serializer(self):
+        self.assertRendersLikeSerializer(PassengerViewSet)
+
+    def test_list_and_retrieve_match_serializer(self):
+        self.assertListLikeSerializer(URL, PassengerViewSet)
+
+    def test_fields(self):
+        self.assertFieldsProjection(URL, PassengerViewSet, ['name', 'seat_number', 'parent', 'affiliated_passengers'])
+
+
+class PassengerApiTests(QueryBudgetTestCase):
+    # Every action within its query budget, however many affiliations a page holds
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.flight = make_flight('SC1001')
+        cls.other_flight = make_flight(
+            'SC1002', cls.flight.destination, cls.flight.source, cls.flight.plane_type,
+        )
+        previous = None
+        for i in range(30):
+            flight = cls.flight if i < 20 else cls.other_flight
+            previous = make_passenger(flight, f'Passenger {i}', affiliated=[previous] if previous and i % 3 else [])
+        cls.parent = Passenger.objects.filter(flight=cls.flight).order_by('id').first()
+
+    def payload(self, **fields):
+        return {
+            'flight': self.flight.id, 'name': 'Mert Kaya', 'age': 31, 'gender': 'Male',
+            'nationality': 'Turkish', 'seat_type': 'ECONOMY', **fields,
+        }
+
+    def test_list(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 30)
+        response = self.client.get(URL, {'flight': self.other_flight.id})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            list(Passenger.objects.filter(flight=self.other_flight).order_by('id').values_list('id', flat=True)),
+        )
+        for flight in ('SC1001', '99999999999999999999999'):
+            with self.subTest(flight=flight):
+                self.assertEqual(self.client.get(URL, {'flight': flight}).status_code, 400)
+
+    def test_retrieve(self):
+        passenger = Passenger.objects.get(name='Passenger 1')
+        response = self.client.get(f'{URL}{passenger.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['affiliated_passengers'],
+            sorted(passenger.affiliated_passengers.values_list('id', flat=True)),
+        )
+        self.assertEqual(self.client.get(f'{URL}999999/').status_code, 404)
+
+    def test_create(self):
+        response = self.client.post(URL, self.payload(), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        response = self.client.post(URL, self.payload(age=1, parent=self.parent.id), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        infant = Passenger.objects.get(id=response.data['id'])
+
+        # Infants need a parent, and can't be one
+        cases = [self.payload(age=1), self.payload(name='Baby 2', parent=infant.id)]
+        for payload in cases:
+            with self.subTest(payload=payload):
+                response = self.client.post(URL, payload, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('parent', response.data)
+
+    def test_update(self):
+        response = self.client.put(
+            f'{URL}{self.parent.id}/', self.payload(flight=self.other_flight.id, seat_number='2C'), format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.parent.refresh_from_db()
+        self.assertEqual((self.parent.flight_id, self.parent.seat_number), (self.other_flight.id, '2C'))
+
+        infant = make_passenger(self.flight, 'Bebek', age=1, parent=self.parent)
+        other = Passenger.objects.exclude(id__in=[self.parent.id, infant.id]).first()
+        response = self.client.put(f'{URL}{infant.id}/', self.payload(age=1, parent=other.id), format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['parent'], other.id)
+
+    def test_partial_update(self):
+        response = self.client.patch(f'{URL}{self.parent.id}/', {'seat_type': 'BUSINESS'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['seat_type'], 'BUSINESS')
+
+    def test_destroy(self):
+        infant = make_passenger(self.flight, 'Bebek', age=1, parent=self.parent)
+        response = self.client.delete(f'{URL}{self.parent.id}/')
+        self.assertEqual(response.status_code, 204)
+        infant.refresh_from_db()
+        self.assertIsNone(infant.parent_id)
+
+    def test_bulk(self):
+        body = (
+            'ref,flight_number,name,age,gender,nationality,seat_type,parent_ref,affiliated_refs\n'
+            'a,SC1001,Anne,34,Female,Turkish,ECONOMY,,b\n'
+            'b,SC1001,Baba,36,Male,Turkish,ECONOMY,,a\n'
+            'c,SC1001,Bebek,1,Female,Turkish,ECONOMY,a,\n'
+        )
+        response = self.client.post(URL + 'bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 3)
+        refs = response.data['refs']
+        self.assertEqual(Passenger.objects.get(id=refs['c']).parent_id, refs['a'])
+
+        # One bad row and nothing is written
+        response = self.client.post(URL + 'bulk/', body.replace('Baba,36', 'Baba,old'), content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertEqual(Passenger.objects.filter(name='Anne').count(), 1)
+
+    def test_changes(self):
+        response = self.client.get(URL + 'changes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['changed']), 30)
+        self.assertIsNone(response.data['next'])
+
+        # A snapshot comes in pages, each continuing in id order
+        response = self.client.get(URL + 'changes/', {'page_size': 20})
+        ids = [item['id'] for item in response.data['changed']]
+        response = self.client.get(response.data['next'])
+        self.assertTrue(response.data['reset'])
+        self.assertIsNone(response.data['next'])
+        ids += [item['id'] for item in response.data['changed']]
+        self.assertEqual(ids, sorted(Passenger.objects.values_list('id', flat=True)))
+
+        since = make_token(timezone.now() - timedelta(seconds=1))
+        Passenger.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+        # Losing an affiliate changes a passenger's serialized form without a save
+        friend = Passenger.objects.get(name='Passenger 1')
+        affiliates = sorted(friend.affiliated_passengers.values_list('id', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'{URL}{friend.id}/')
+
+        response = self.client.get(URL + 'changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['changed']], affiliates)
+        self.assertEqual(response.data['deleted'], [friend.id])
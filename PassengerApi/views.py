@@ -1,7 +1,50 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from skycrew.ingest import IngestError, request_records
+from skycrew.fastread import FastReadMixin
+from skycrew.pagination import StreamingListMixin
+from skycrew.params import parse_id
+from skycrew.querybudget import QueryBudgetMixin
+from skycrew.sync import ChangesMixin
+from .bulk import ingest_passengers
 from .models import Passenger
 from .serializers import PassengerSerializer
 
-class PassengerViewSet(viewsets.ModelViewSet):
-    queryset=Passenger.objects.all()
-    serializer_class=PassengerSerializer
\ No newline at end of file
+class PassengerViewSet(QueryBudgetMixin, ChangesMixin, FastReadMixin, StreamingListMixin, viewsets.ModelViewSet):
+    # affiliated_passengers ids in one query per page, not one per passenger, in id order
+    queryset=Passenger.objects.prefetch_related(
+        Prefetch('affiliated_passengers', queryset=Passenger.objects.order_by('id')),
+    )
+    serializer_class=PassengerSerializer
+    fast_read = True
+    # Writes look up the flight and, for an infant, the parent
+    query_budget = {'list': 2, 'retrieve': 2, 'create': 4, 'update': 6, 'partial_update': 6, 'destroy': 8, 'changes': 5}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?flight=<flight db id> -> only that flight's passengers (FK index)
+        flight = self.request.query_params.get('flight')
+        if flight:
+            flight = parse_id(flight)
+            if flight is None:
+                raise ValidationError({"flight": "Must be a flight id."})
+            queryset = queryset.filter(flight_id=flight)
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        POST a manifest as CSV or NDJSON (raw body, or a multipart "file"),
+        see PassengerApi.bulk.ingest_passengers for the columns. ?input=csv
+        or ?input=ndjson overrides the Content-Type. All rows are created or
+        none are: 201 with the new ids, or 400 with the errors per row.
+        """
+        try:
+            records = request_records(request)
+            result = ingest_passengers(records)
+        except IngestError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(result, status=400 if result.get('errors') else 201)
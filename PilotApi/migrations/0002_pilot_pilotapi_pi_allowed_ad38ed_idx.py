@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FlightInfoApi', '0001_initial'),
+        ('PilotApi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pilot',
+            index=models.Index(fields=['allowed_vehicle', 'seniority', 'allowed_range'], name='PilotApi_pi_allowed_ad38ed_idx'),
+        ),
+    ]
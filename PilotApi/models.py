@@ -26,5 +26,14 @@ class Pilot(models.Model):
     # Requirement: Seniority Level
     seniority = models.CharField(max_length=10, choices=SENIORITY_CHOICES)
 
+    # Set on every save, for ?since= sync (skycrew.sync)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Roster lookups: "seniors allowed on this plane for at least this distance"
+            models.Index(fields=['allowed_vehicle', 'seniority', 'allowed_range']),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.seniority})"
\ No newline at end of file
@@ -4,4 +4,4 @@ from .models import Pilot
 class PilotSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pilot
-        fields = '__all__'
\ No newline at end of file
+        exclude = ['updated_at']
\ No newline at end of file
@@ -1,3 +1,171 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from skycrewApp.models import Tombstone
+from skycrew.sync import make_token
+from skycrew.tests.support import FastReadAssertions, QueryBudgetTestCase, make_pilot, make_plane_type
+from .models import Pilot
+from .views import PilotViewSet
+
+URL = '/api/pilots/pilots/'
+
+
+class PilotFastReadTests(FastReadAssertions, QueryBudgetTestCase):
+    # The fast read path renders exactly what PilotSerializer does
+
+    @classmethod
+    def setUpTestData(cls):
+        boeing = make_plane_type('Boeing 737')
+        airbus = make_plane_type('Airbus A320')
+        make_pilot(boeing, 'Ayse Kaya')
+        make_pilot(airbus, 'Mehmet Oz', seniority='JUNIOR', allowed_range=1200.25, known_languages='')
+        make_pilot(boeing, 'Zeynep Ak', seniority='TRAINEE', age=23)
+
+    def test_plan_matches_serializer(self):
+        self.assertRendersLikeSerializer(PilotViewSet)
+
+    def test_list_and_retrieve_match_serializer(self):
+        self.assertListLikeSerializer(URL, PilotViewSet)
+
+    def test_fields(self):
+        # allowed_vehicle is a foreign key: the id, as the serializer gives it
+        self.assertFieldsProjection(URL, PilotViewSet, ['name', 'allowed_vehicle', 'allowed_range'])
+
+    def test_opt_in(self):
+        # Without fast_read the view serializes as usual and never builds a plan
+        with mock.patch.object(PilotViewSet, 'fast_read', False), \
+                mock.patch('skycrew.fastread.read_plan') as read_plan:
+            self.assertListLikeSerializer(URL, PilotViewSet)
+        read_plan.assert_not_called()
+
+
+class PilotApiTests(QueryBudgetTestCase):
+    # Every action within its query budget, with more rows than a page holds
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boeing = make_plane_type('Boeing 737')
+        cls.airbus = make_plane_type('Airbus A320')
+        for i in range(30):
+            make_pilot(
+                cls.boeing if i % 2 else cls.airbus, f'Pilot {i}',
+                seniority=('SENIOR', 'JUNIOR', 'TRAINEE')[i % 3], allowed_range=1000.0 + 100 * i,
+            )
+        cls.pilot = Pilot.objects.order_by('id').first()
+
+    def payload(self, **fields):
+        return {
+            'name': 'Deniz Ak', 'age': 40, 'gender': 'Male', 'nationality': 'Turkish',
+            'known_languages': 'Turkish', 'allowed_vehicle': self.boeing.id, 'allowed_range': 3000.0,
+            'seniority': 'SENIOR', **fields,
+        }
+
+    def test_list_pages(self):
+        seen = []
+        url = URL + '?page_size=7'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, list(Pilot.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_list_filters(self):
+        cases = [
+            ({'allowed_vehicle': self.boeing.id}, Pilot.objects.filter(allowed_vehicle=self.boeing)),
+            ({'seniority': 'junior'}, Pilot.objects.filter(seniority='JUNIOR')),
+            ({'min_range': '3000'}, Pilot.objects.filter(allowed_range__gte=3000)),
+            ({'allowed_vehicle': self.airbus.id, 'seniority': 'SENIOR', 'min_range': 1500},
+             Pilot.objects.filter(allowed_vehicle=self.airbus, seniority='SENIOR', allowed_range__gte=1500)),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                response = self.client.get(URL, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [item['id'] for item in response.data['results']],
+                    list(expected.order_by('id').values_list('id', flat=True)),
+                )
+
+    def test_bad_filters(self):
+        # A huge id or a superscript digit would reach SQLite; nan matches nothing
+        bad = (
+            {'allowed_vehicle': 'x'}, {'allowed_vehicle': '99999999999999999999999'}, {'allowed_vehicle': '\u00b2'},
+            {'min_range': 'far'}, {'min_range': 'nan'}, {'min_range': 'inf'},
+        )
+        for params in bad:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(URL, params).status_code, 400)
+
+    def test_retrieve(self):
+        response = self.client.get(f'{URL}{self.pilot.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], self.pilot.name)
+        self.assertEqual(self.client.get(f'{URL}999999/').status_code, 404)
+
+    def test_create(self):
+        response = self.client.post(URL, self.payload(), format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Pilot.objects.get(id=response.data['id']).name, 'Deniz Ak')
+
+        response = self.client.post(URL, self.payload(seniority='CAPTAIN'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('seniority', response.data)
+
+    def test_update(self):
+        response = self.client.put(
+            f'{URL}{self.pilot.id}/', self.payload(allowed_vehicle=self.airbus.id), format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.pilot.refresh_from_db()
+        self.assertEqual((self.pilot.name, self.pilot.allowed_vehicle_id), ('Deniz Ak', self.airbus.id))
+
+    def test_partial_update(self):
+        response = self.client.patch(f'{URL}{self.pilot.id}/', {'allowed_range': 9000.5}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.pilot.refresh_from_db()
+        self.assertEqual(self.pilot.allowed_range, 9000.5)
+
+    def test_destroy(self):
+        response = self.client.delete(f'{URL}{self.pilot.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Pilot.objects.filter(id=self.pilot.id).exists())
+
+    def test_changes(self):
+        response = self.client.get(URL + 'changes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(len(response.data['changed']), 30)
+
+        since = make_token(timezone.now() - timedelta(seconds=1))
+        Pilot.objects.filter(updated_at__gt=timezone.now() - timedelta(seconds=1)).update(
+            updated_at=timezone.now() - timedelta(minutes=5),
+        )
+        other = Pilot.objects.exclude(id=self.pilot.id).first()
+        self.client.patch(f'{URL}{other.id}/', {'age': 50}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'{URL}{self.pilot.id}/')
+
+        response = self.client.get(URL + 'changes/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['reset'])
+        self.assertEqual([item['id'] for item in response.data['changed']], [other.id])
+        self.assertEqual(response.data['changed'][0]['age'], 50)
+        self.assertEqual(response.data['deleted'], [self.pilot.id])
+
+        self.assertEqual(self.client.get(URL + 'changes/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_rolled_back_deletes_leave_no_tombstone(self):
+        first, kept, last = Pilot.objects.exclude(id=self.pilot.id)[:3]
+        gone = sorted([first.id, last.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                kept.delete()
+                raise DatabaseError('rolled back')
+            last.delete()
+        self.assertTrue(Pilot.objects.filter(name=kept.name).exists())
+        self.assertEqual(sorted(Tombstone.objects.values_list('object_id', flat=True)), gone)
@@ -1,7 +1,42 @@
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from skycrew.fastread import FastReadMixin
+from skycrew.pagination import StreamingListMixin
+from skycrew.params import parse_id, parse_number
+from skycrew.querybudget import QueryBudgetMixin
+from skycrew.sync import ChangesMixin
 from .models import Pilot
 from .serializers import PilotSerializer
 
-class PilotViewSet(viewsets.ModelViewSet):
+class PilotViewSet(QueryBudgetMixin, ChangesMixin, FastReadMixin, StreamingListMixin, viewsets.ModelViewSet):
+    # allowed_vehicle is serialized as its id, nothing to join
     queryset = Pilot.objects.all()
-    serializer_class = PilotSerializer
\ No newline at end of file
+    serializer_class = PilotSerializer
+    fast_read = True
+    query_budget = {'list': 1, 'retrieve': 1, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 4, 'changes': 5}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        # All of these hit the (allowed_vehicle, seniority, allowed_range) index
+        allowed_vehicle = params.get('allowed_vehicle')
+        if allowed_vehicle:
+            allowed_vehicle = parse_id(allowed_vehicle)
+            if allowed_vehicle is None:
+                raise ValidationError({"allowed_vehicle": "Must be a plane type id."})
+            queryset = queryset.filter(allowed_vehicle_id=allowed_vehicle)
+
+        seniority = params.get('seniority')
+        if seniority:
+            queryset = queryset.filter(seniority=seniority.upper())
+
+        # ?min_range=1200 -> pilots allowed to fly at least that far
+        min_range = params.get('min_range')
+        if min_range:
+            min_range = parse_number(min_range)
+            if min_range is None:
+                raise ValidationError({"min_range": "Must be a number."})
+            queryset = queryset.filter(allowed_range__gte=min_range)
+
+        return queryset
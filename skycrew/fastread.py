@@ -0,0 +1,249 @@
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# DRF fields whose to_representation() returns what .values() already gives
+PASSTHROUGH = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.JSONField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class Unsupported(Exception):
+    # The serializer has a field the fast path can't reproduce exactly
+    pass
+
+
+class ReadPlan:
+    """
+    How to build a ModelSerializer's output from .values() rows.
+
+    Worked out once per serializer class from the serializer's own fields,
+    so keys come out in the same order and values go through the same
+    to_representation() (skipped where it would return the value as is).
+    Many-to-many ids and nested reverse-FK lists cost one query per field
+    for a whole page, ordered by id like the ViewSets' prefetches.
+    """
+
+    def __init__(self, serializer_class):
+        self.model = serializer_class.Meta.model
+        self.pk = self.model._meta.pk.attname
+        # field name -> ('column', column, converter) | ('many', field) | ('nested', field, plan)
+        self.fields = {}
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self.fields[name] = self._plan_field(field)
+
+    def _plan_field(self, field):
+        if not field.source or '.' in field.source or field.source == '*':
+            raise Unsupported(field.field_name)
+        if isinstance(field, serializers.ManyRelatedField):
+            model_field = self.model._meta.get_field(field.source)
+            if not model_field.many_to_many or not isinstance(field.child_relation, serializers.PrimaryKeyRelatedField):
+                raise Unsupported(field.field_name)
+            return ('many', model_field)
+        if isinstance(field, serializers.ListSerializer):
+            model_field = self.model._meta.get_field(field.source)
+            if not model_field.one_to_many or not isinstance(field.child, serializers.ModelSerializer):
+                raise Unsupported(field.field_name)
+            plan = ReadPlan(type(field.child))
+            if any(kind != 'column' for kind, *_ in plan.fields.values()):
+                raise Unsupported(field.field_name)
+            return ('nested', model_field, plan)
+        if isinstance(field, (serializers.Serializer, serializers.SerializerMethodField)):
+            raise Unsupported(field.field_name)
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise Unsupported(field.field_name)
+        if model_field.many_to_many or model_field.one_to_many:
+            raise Unsupported(field.field_name)
+        converter = None if isinstance(field, PASSTHROUGH) else field.to_representation
+        # An FK comes back from .values('plane_type') as its id
+        return ('column', field.source, converter)
+
+    def project(self, fields):
+        # ?fields=a,b -> the names to output, in serializer order
+        if not fields:
+            return list(self.fields)
+        wanted = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in wanted if name not in self.fields]
+        if unknown:
+            raise ValidationError({"fields": f"Unknown field(s): {', '.join(unknown)}."})
+        return [name for name in self.fields if name in wanted]
+
+    def columns(self, names, extra=()):
+        # The SELECT list: only what the output (plus pk / ordering) needs
+        columns = [self.pk]
+        for name in names:
+            spec = self.fields[name]
+            if spec[0] == 'column' and spec[1] not in columns:
+                columns.append(spec[1])
+        columns.extend(column for column in extra if column not in columns)
+        return columns
+
+    def values(self, queryset, names, extra=()):
+        # prefetch_related() doesn't apply to dict rows
+        return queryset.prefetch_related(None).values(*self.columns(names, extra))
+
+    def render(self, rows, names):
+        # rows: dicts from values(); returns the serializer's output for each
+        rows = list(rows)
+        ids = [row[self.pk] for row in rows]
+        related = {}
+        for name in names:
+            spec = self.fields[name]
+            if spec[0] == 'many':
+                related[name] = _many_ids(spec[1], ids)
+            elif spec[0] == 'nested':
+                related[name] = _nested(spec[1], spec[2], ids)
+
+        result = []
+        for row in rows:
+            item = {}
+            for name in names:
+                spec = self.fields[name]
+                if spec[0] == 'column':
+                    value = row[spec[1]]
+                    converter = spec[2]
+                    item[name] = value if value is None or converter is None else converter(value)
+                else:
+                    item[name] = related[name].get(row[self.pk], [])
+            result.append(item)
+        return result
+
+
+def _many_ids(model_field, ids):
+    # Many-to-many ids per object, from the through table alone
+    through = model_field.remote_field.through
+    source = model_field.m2m_field_name()
+    target = model_field.m2m_reverse_field_name()
+    found = {}
+    rows = through.objects.filter(**{f'{source}__in': ids}).order_by(f'{target}_id').values_list(
+        f'{source}_id', f'{target}_id',
+    )
+    for owner, other in rows:
+        found.setdefault(owner, []).append(other)
+    return found
+
+
+def _nested(relation, plan, ids):
+    # Reverse-FK children (e.g. an attendant's recipes) rendered per parent
+    parent = relation.field.attname
+    names = list(plan.fields)
+    rows = list(
+        relation.related_model.objects.filter(**{f'{parent}__in': ids}).order_by(plan.pk)
+        .values(*plan.columns(names, [parent]))
+    )
+    found = {}
+    for row, item in zip(rows, plan.render(rows, names)):
+        found.setdefault(row[parent], []).append(item)
+    return found
+
+
+_plans = {}
+
+
+def read_plan(serializer_class):
+    # The cached ReadPlan of a serializer class, or None if it has unsupported fields
+    if serializer_class not in _plans:
+        try:
+            _plans[serializer_class] = ReadPlan(serializer_class)
+        except Unsupported:
+            _plans[serializer_class] = None
+    return _plans[serializer_class]
+
+
+class FastReadMixin:
+    """
+    GET list/retrieve answered from .values() rows instead of model
+    instances run through the serializer, with the same JSON byte for byte.
+
+    ?fields=id,name limits the output to those fields and the SELECT to
+    their columns. Works with the keyset pagination and ?stream= (it has to
+    come before StreamingListMixin). Serializers with fields the plan can't
+    reproduce (method fields, dotted sources, nested objects) quietly use
+    the regular path, as does anything but GET.
+
+    Off unless the view sets fast_read = True: a view opts in once its
+    serializer is checked byte for byte against the plan
+    (skycrew.tests.support.FastReadAssertions), since a serializer change
+    the plan reproduces differently would otherwise go unnoticed.
+    """
+    fast_read = False
+    stream_chunk_size = 500
+
+    def _read_plan(self):
+        if not self.fast_read:
+            return None
+        return read_plan(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        plan = self._read_plan()
+        if plan is None or request.query_params.get('stream') in ('ndjson', 'json'):
+            return super().list(request, *args, **kwargs)
+
+        names = plan.project(request.query_params.get('fields'))
+        ordering = [field.lstrip('-') for field in _ordering(self)]
+        queryset = plan.values(self.filter_queryset(self.get_queryset()), names, ordering)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.render(page, names))
+        return Response(plan.render(queryset, names))
+
+    def retrieve(self, request, *args, **kwargs):
+        plan = self._read_plan()
+        if plan is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        names = plan.project(request.query_params.get('fields'))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        # The same 404s as generics.get_object_or_404
+        try:
+            rows = list(plan.values(queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}), names)[:1])
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        if not rows:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        return Response(plan.render(rows, names)[0])
+
+    def _stream_rows(self, queryset):
+        # StreamingListMixin's row source: values() in chunks, related ids per chunk
+        plan = self._read_plan()
+        if plan is None:
+            yield from super()._stream_rows(queryset)
+            return
+        names = plan.project(self.request.query_params.get('fields'))
+        chunk = []
+        for row in plan.values(queryset, names).iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(row)
+            if len(chunk) == self.stream_chunk_size:
+                yield from _dump(plan.render(chunk, names))
+                chunk = []
+        if chunk:
+            yield from _dump(plan.render(chunk, names))
+
+
+def _ordering(view):
+    paginator = view.paginator
+    ordering = getattr(paginator, 'ordering', None) if paginator is not None else None
+    if not ordering:
+        return []
+    return [ordering] if isinstance(ordering, str) else list(ordering)
+
+
+def _dump(items):
+    for item in items:
+        yield json.dumps(item, cls=JSONEncoder, separators=(',', ':'))
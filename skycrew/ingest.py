@@ -0,0 +1,102 @@
+import codecs
+import csv
+import json
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+CONTENT_TYPES = {
+    'text/csv': CSV,
+    'application/csv': CSV,
+    'application/x-ndjson': NDJSON,
+    'application/ndjson': NDJSON,
+    'application/jsonl': NDJSON,
+    'application/json': NDJSON,
+}
+
+
+class IngestError(Exception):
+    # The upload as a whole can't be read (not a per-row problem)
+    pass
+
+
+def detect_format(content_type=None, name=None, first_line=''):
+    # Explicit content type, then file extension, then a look at the first line
+    if content_type:
+        fmt = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+        if fmt:
+            return fmt
+    if name:
+        lowered = name.lower()
+        if lowered.endswith('.csv'):
+            return CSV
+        if lowered.endswith(('.ndjson', '.jsonl')):
+            return NDJSON
+    return NDJSON if first_line.lstrip().startswith('{') else CSV
+
+
+def iter_records(stream, fmt=None, content_type=None, name=None):
+    """
+    Yield (row number, dict) from a CSV (header row) or NDJSON upload,
+    one line at a time, so nothing but the current row is held in memory.
+    stream is a binary file-like object (request stream, uploaded file,
+    open(path, 'rb')). Blank lines are skipped; row numbers are 1-based
+    and count data rows only. A line that isn't valid JSON yields
+    (row, IngestError) so callers can report it with the other row errors.
+    """
+    lines = codecs.getreader('utf-8-sig')(stream)
+    first = lines.readline()
+    fmt = fmt or detect_format(content_type, name, first)
+    if fmt not in (CSV, NDJSON):
+        raise IngestError(f"Unknown format '{fmt}', use csv or ndjson")
+
+    if fmt == CSV:
+        reader = csv.DictReader(_chain(first, lines))
+        if not reader.fieldnames:
+            return
+        for row, record in enumerate(reader, start=1):
+            # Empty cells mean "not given"
+            yield row, {key.strip(): value.strip() for key, value in record.items() if key and value not in (None, '')}
+        return
+
+    row = 0
+    for line in _chain(first, lines):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, IngestError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield row, IngestError("Each line must be a JSON object")
+            continue
+        yield row, record
+
+
+def _chain(first, rest):
+    if first:
+        yield first
+    yield from rest
+
+
+def split_list(value):
+    # A list cell: NDJSON gives a real list, CSV "3;7;9" or "3 7 9"
+    if value in (None, ''):
+        return []
+    if isinstance(value, list):
+        return value
+    return [part for part in str(value).replace(';', ' ').replace(',', ' ').split() if part]
+
+
+def request_records(request):
+    # iter_records() over a DRF request: a multipart "file" or the raw body.
+    # Only multipart goes through DRF's parsers; ?input=csv|ndjson overrides the format.
+    fmt = request.query_params.get('input')
+    if request.content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise IngestError("No file was submitted.")
+        return iter_records(upload, fmt=fmt, content_type=upload.content_type, name=upload.name)
+    return iter_records(request._request, fmt=fmt, content_type=request.content_type)
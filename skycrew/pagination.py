@@ -0,0 +1,170 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    # Cursor paging on the primary key: stable, indexed, and the cost of a
+    # page doesn't grow with how deep into the table you are (unlike OFFSET).
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class CompositeKeysetPagination(BasePagination):
+    """
+    Keyset paging on a unique composite ordering, e.g. (departure_time, id).
+
+    The cursor holds the key of the last row sent, and the next page is
+    WHERE departure_time >= t AND (departure_time > t OR id > i), which an
+    index ending in the same columns answers by seeking straight to it.
+    CursorPagination keys on the first column only and counts ties with an
+    OFFSET, which grows when many rows share a value (every 08:00
+    departure). Rows may be model instances or values() dicts holding the
+    ordering columns. Same response shape as KeysetPagination.
+    """
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        reverse, key = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*[('-' if reverse else '') + field for field in self.ordering])
+        if key is not None:
+            try:
+                queryset = queryset.filter(self._beyond(key, reverse))
+            except (DjangoValidationError, TypeError, ValueError):
+                # Well-formed, but not values of these columns
+                raise NotFound(self.invalid_cursor_message)
+        rows = list(queryset[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_key = self.previous_key = None
+        if rows:
+            first, last = self._key(rows[0]), self._key(rows[-1])
+            if reverse:
+                # Paging back: the rows we came from follow, `more` precede
+                self.next_key, self.previous_key = last, first if more else None
+            else:
+                self.next_key = last if more else None
+                self.previous_key = first if key is not None else None
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self._link(True, self.previous_key),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        return self._link(False, self.next_key)
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.ordering]
+        return [getattr(row, field) for field in self.ordering]
+
+    def _beyond(self, key, reverse):
+        # Rows after key in the ordering (before it when paging back): the
+        # first column's range is what the index seeks on, the rest breaks ties
+        op = 'lt' if reverse else 'gt'
+        ties = Q()
+        for i, field in enumerate(self.ordering):
+            ties |= Q(**{field: value for field, value in zip(self.ordering[:i], key)}, **{f'{field}__{op}': key[i]})
+        return Q(**{f'{self.ordering[0]}__{op}e': key[0]}) & ties
+
+    def _link(self, reverse, key):
+        if key is None:
+            return None
+        payload = json.dumps({'r': reverse, 'k': key}, default=_key_value, separators=(',', ':'))
+        return replace_query_param(self.base_url, self.cursor_query_param, b64encode(payload.encode()).decode())
+
+    def decode_cursor(self, request):
+        # -> (reverse, key); key None on the first page
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            cursor = json.loads(b64decode(encoded.encode(), validate=True))
+            reverse, key = bool(cursor['r']), cursor['k']
+            if not isinstance(key, list) or len(key) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, key
+
+
+def _key_value(value):
+    # Cursor keys keep full precision: the filter has to match the row exactly
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Can't put {type(value).__name__} in a cursor")
+
+
+class StreamingListMixin:
+    """
+    Opt-in streaming for list endpoints.
+
+    ?stream=ndjson -> one JSON object per line (application/x-ndjson)
+    ?stream=json   -> a plain JSON array, sent in chunks
+
+    Rows come from queryset.iterator(), so the full result is never held
+    in memory and pagination is skipped.
+    """
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        stream = request.query_params.get('stream')
+        if stream not in ('ndjson', 'json'):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        rows = self._stream_rows(queryset)
+        if stream == 'ndjson':
+            return StreamingHttpResponse((row + '\n' for row in rows), content_type='application/x-ndjson')
+        return StreamingHttpResponse(self._stream_array(rows), content_type='application/json')
+
+    def _stream_rows(self, queryset):
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            data = serializer_class(obj, context=context).data
+            yield json.dumps(data, cls=JSONEncoder, separators=(',', ':'))
+
+    def _stream_array(self, rows):
+        yield '['
+        first = True
+        for row in rows:
+            yield row if first else ',' + row
+            first = False
+        yield ']'
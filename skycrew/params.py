@@ -0,0 +1,24 @@
+import math
+
+# Ids are SQLite integers, signed 64-bit: a larger one makes the query
+# itself fail (OverflowError) instead of matching nothing
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_id(value):
+    # A row id given as a query parameter, or None if it can't be one.
+    # int() rather than str.isdigit(): isdigit() accepts '²', which int() doesn't
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if 0 < number <= MAX_ID else None
+
+
+def parse_number(value):
+    # A finite float, or None: 'nan' and 'inf' parse but compare with nothing
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
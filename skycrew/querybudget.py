@@ -0,0 +1,64 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# 'log', 'raise' (the tests, see skycrew.tests.support.QueryBudgetTestCase) or 'off'
+MODE = getattr(settings, 'SKYCREW_QUERY_BUDGET', 'log')
+
+
+class QueryBudgetExceeded(AssertionError):
+    # An AssertionError so a test that hits the endpoint fails, not errors out
+    pass
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """
+    A declared maximum number of SQL queries per endpoint.
+
+    query_budget maps a ViewSet action (list, retrieve, create, ...) or an
+    HTTP method (get, post, ... on a plain APIView) to the most queries one
+    request may run, whatever the table sizes; an int covers every action.
+    Actions without a budget (imports, roster generation) aren't checked.
+    Going over is logged, or raises QueryBudgetExceeded when
+    SKYCREW_QUERY_BUDGET is 'raise', as QueryBudgetTestCase makes it in the
+    tests, so an N+1 fails every test that touches the endpoint. Streamed
+    lists run their queries after the view returns and aren't counted; they
+    prefetch per chunk instead.
+    """
+    query_budget = None
+
+    def get_query_budget(self):
+        budget = self.query_budget
+        if budget is None or isinstance(budget, int):
+            return budget
+        key = getattr(self, 'action', None) or self.request.method.lower()
+        return budget.get(key)
+
+    def dispatch(self, request, *args, **kwargs):
+        if MODE == 'off':
+            return super().dispatch(request, *args, **kwargs)
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = super().dispatch(request, *args, **kwargs)
+        budget = self.get_query_budget()
+        if budget is not None and not response.streaming and counter.count > budget:
+            message = (
+                f"{type(self).__name__} {request.method} {request.path} ran {counter.count} queries, "
+                f"budget is {budget}"
+            )
+            if MODE == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
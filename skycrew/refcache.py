@@ -0,0 +1,154 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from skycrewApp.models import Tombstone
+
+# Payloads (objects and list pages together) kept per process
+SIZE = getattr(settings, 'SKYCREW_REFCACHE_SIZE', 256)
+
+# A save or delete drops the model's entries in the process that made it;
+# other worker processes pick the change up after at most this many seconds
+TTL = getattr(settings, 'SKYCREW_REFCACHE_TTL', 60)
+
+
+class Entry:
+    __slots__ = ('data', 'etag', 'last_modified', 'cached_at')
+
+    def __init__(self, data, last_modified=None):
+        self.data = data
+        body = json.dumps(data, cls=JSONEncoder, separators=(',', ':'), sort_keys=True)
+        # Weak: the same data renders as JSON or the browsable API
+        self.etag = 'W/"%s"' % hashlib.sha1(body.encode()).hexdigest()
+        self.last_modified = last_modified
+        self.cached_at = time.monotonic()
+
+
+class ReferenceCache:
+    """
+    A bounded LRU of serialized reference data (airports, plane types),
+    which changes a few times a year but is read by every roster.
+
+    Entries are keyed by (model label, key) and hold the serialized data
+    with its ETag. Everything cached for a model is dropped when one of its
+    rows is saved or deleted (skycrewApp.signals), so a list page never
+    outlives a change to a row on it. Callers must not mutate the data.
+    """
+
+    def __init__(self, size=SIZE, ttl=TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        # Bumped per invalidation, so a fill that raced one isn't stored
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.counts = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, model, key):
+        cache_key = (model._meta.label_lower, key)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None and time.monotonic() - entry.cached_at < self.ttl:
+                self.entries.move_to_end(cache_key)
+                self.counts["hits"] += 1
+                return entry
+            self.counts["misses"] += 1
+            return None
+
+    def generation(self, model):
+        with self.lock:
+            return self.generations.get(model._meta.label_lower, 0)
+
+    def put(self, model, key, data, last_modified=None, generation=None):
+        # generation: self.generation(model) from before the data was read
+        entry = Entry(data, last_modified)
+        label = model._meta.label_lower
+        with self.lock:
+            if generation is None or self.generations.get(label, 0) == generation:
+                self.entries[(label, key)] = entry
+                self.entries.move_to_end((label, key))
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        return entry
+
+    def load(self, model, key, fill):
+        # The cached data, or fill()'s result (None isn't cached)
+        entry = self.get(model, key)
+        if entry is not None:
+            return entry.data
+        generation = self.generation(model)
+        data = fill()
+        if data is not None:
+            self.put(model, key, data, generation=generation)
+        return data
+
+    def invalidate(self, model):
+        label = model._meta.label_lower
+        with self.lock:
+            self.generations[label] = self.generations.get(label, 0) + 1
+            for cache_key in [cache_key for cache_key in self.entries if cache_key[0] == label]:
+                del self.entries[cache_key]
+            self.counts["invalidations"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, "entries": len(self.entries)}
+
+
+reference_cache = ReferenceCache()
+
+
+def last_change(model):
+    # Epoch second of the model's newest save or delete (updated_at, tombstones):
+    # the same in every process, and it moves on every change to any row
+    changed = model.objects.aggregate(at=Max('updated_at'))['at']
+    deleted = Tombstone.objects.filter(resource=model._meta.label_lower).aggregate(at=Max('deleted_at'))['at']
+    moments = [moment for moment in (changed, deleted) if moment is not None]
+    return int(max(moments).timestamp()) if moments else None
+
+
+class ReferenceCacheMixin:
+    """
+    GET list/retrieve served from reference_cache, with conditional GET.
+
+    Responses carry an ETag (a hash of the data) and a Last-Modified (the
+    model's last change), and If-None-Match / If-Modified-Since get a 304.
+    A miss renders through the ViewSet as before, so ?fields= and the
+    cursor pages are cached under their own URLs. ?stream= isn't cached.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') in ('ndjson', 'json'):
+            return super().list(request, *args, **kwargs)
+        return self._cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(request, super().retrieve, *args, **kwargs)
+
+    def _cached(self, request, render, *args, **kwargs):
+        model = self.queryset.model
+        # The full URL: the cursor links in a page are absolute
+        key = request.build_absolute_uri()
+        entry = reference_cache.get(model, key)
+        if entry is None:
+            generation = reference_cache.generation(model)
+            response = render(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = reference_cache.put(model, key, response.data, last_change(model), generation)
+
+        headers = {'ETag': entry.etag}
+        if entry.last_modified is not None:
+            headers['Last-Modified'] = http_date(entry.last_modified)
+        response = Response(entry.data, headers=headers)
+        # The response itself, or a 304 carrying its ETag / Last-Modified
+        return get_conditional_response(request, etag=entry.etag, last_modified=entry.last_modified, response=response)
@@ -82,6 +82,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Roster workers write concurrently: take the write lock when a transaction
+        # starts (a read lock upgraded mid-transaction fails at once with
+        # "database is locked") and wait for it rather than failing after 5s
+        'OPTIONS': {'timeout': 20, 'transaction_mode': 'IMMEDIATE'},
     }
 }
 
@@ -126,3 +130,88 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Django REST framework
+# Every list endpoint is cursor-paginated on its primary key;
+# add ?stream=ndjson (or ?stream=json) to stream the whole list instead.
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'skycrew.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+}
+
+
+# SkyCrew roster generation
+# 'orm' reads the models directly (monolith), 'http' calls the APIs below (split services)
+
+SKYCREW_DATA_PROVIDER = 'orm'
+
+SKYCREW_API_BASE_URL = "http://127.0.0.1:8000/api"
+
+# True -> the HTTP backend streams list endpoints as NDJSON instead of following cursor pages
+SKYCREW_HTTP_STREAM = False
+
+# Pooled HTTP client for the 'http' provider: keep-alive connections per upstream host
+SKYCREW_HTTP_POOL_SIZE = 10
+SKYCREW_HTTP_POOL_HOSTS = 4
+
+# Upstream resilience for the 'http' provider
+# (connect, read) timeouts per endpoint, e.g. 'passengers/passengers': (3.05, 30)
+SKYCREW_HTTP_TIMEOUTS = {'default': (3.05, 10)}
+SKYCREW_HTTP_RETRIES = 2
+SKYCREW_HTTP_RETRY_BACKOFF = 0.2
+SKYCREW_HTTP_BREAKER_FAILURES = 5
+SKYCREW_HTTP_BREAKER_RESET = 30
+# Serve the last good response for up to this many seconds while an upstream is failing
+SKYCREW_HTTP_STALE_FOR = 300
+
+# In-memory eligibility indexes are patched by signals in the worker that made a change;
+# other workers rebuild theirs once it is older than this many seconds
+SKYCREW_INDEX_MAX_AGE = 300
+
+# Minimum turnaround/rest between two flights of the same crew member
+SKYCREW_MIN_REST_MINUTES = 60
+
+# Wall-clock budget of the joint crew optimizer (generate_rosters --optimize), seconds;
+# whatever isn't solved by then is assigned greedily
+SKYCREW_OPTIMIZER_TIME_LIMIT = 30
+
+# Roster job queue (POST /main/generate/<flight_id>/ + manage.py roster_worker):
+# jobs running at once across all workers, and how long a job may stay RUNNING
+# before it is assumed its worker died and it is queued again (seconds)
+SKYCREW_JOB_CONCURRENCY = 4
+SKYCREW_JOB_TIMEOUT = 600
+
+# GET /main/generate/<flight_id>/: rosters generated at once across all workers
+# (more get a 503 with Retry-After), and how long a request waits for another
+# request's generation of the same roster (seconds)
+SKYCREW_ROSTER_CONCURRENCY = 8
+SKYCREW_ROSTER_WAIT = 30
+
+# Rosters touched by a data change (crew edited, passenger added, flight moved) are
+# repaired slot by slot once no further change has come in for this many seconds;
+# 0 repairs right after each commit
+SKYCREW_REPAIR_DELAY = 2
+
+# Per-endpoint SQL query budgets (skycrew.querybudget.QueryBudgetMixin): going over is
+# logged ('log'), fails the request ('raise') or isn't checked ('off'). The tests
+# switch to 'raise' themselves (skycrew.tests.support.QueryBudgetTestCase), whatever the runner
+SKYCREW_QUERY_BUDGET = 'log'
+
+# ?since= delta sync (GET <resource>/changes/): tokens trail "now" by SKYCREW_SYNC_LAG
+# seconds so late commits aren't missed, and delete tombstones are kept for
+# SKYCREW_SYNC_RETENTION seconds (older tokens get a full snapshot)
+SKYCREW_SYNC_LAG = 30
+SKYCREW_SYNC_RETENTION = 30 * 24 * 3600
+
+# 'http' provider: keep local replicas of the resources in sync through /changes/
+# instead of refetching whole lists, re-syncing at most every N seconds
+SKYCREW_HTTP_REPLICA = False
+SKYCREW_HTTP_REPLICA_INTERVAL = 2
+
+# Airports / plane types cached per process (skycrew.refcache): at most
+# SKYCREW_REFCACHE_SIZE payloads, re-read after SKYCREW_REFCACHE_TTL seconds
+# so changes made by other worker processes show up
+SKYCREW_REFCACHE_SIZE = 256
+SKYCREW_REFCACHE_TTL = 60
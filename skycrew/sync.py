@@ -0,0 +1,104 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from skycrew.fastread import read_plan
+from skycrew.pagination import CompositeKeysetPagination
+from skycrewApp.models import Tombstone
+
+# The next token is this far behind "now" (seconds), so a row saved by a
+# transaction that commits after we read is still picked up next time.
+# Clients see changes from that window twice, which upserts absorb.
+LAG = getattr(settings, 'SKYCREW_SYNC_LAG', 30)
+
+# Tombstones are kept this long (seconds); an older token gets a full snapshot
+RETENTION = getattr(settings, 'SKYCREW_SYNC_RETENTION', 30 * 24 * 3600)
+
+# Expired tombstones are cleared at most this often per resource (seconds), so
+# polling /changes/ stays read-only
+PRUNE_EVERY = 3600
+
+_pruned_at = {}
+
+
+class ChangesPagination(CompositeKeysetPagination):
+    # A snapshot is the whole table, so changed comes in pages of rows in id order
+    ordering = ('id',)
+    page_size = 1000
+    max_page_size = 5000
+
+
+def make_token(moment):
+    # Opaque to clients: epoch microseconds
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_token(token):
+    try:
+        return datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValidationError({"since": "Not a token from a previous /changes/ response."})
+
+
+class ChangesMixin:
+    """
+    GET <resource>/changes/?since=<token> -> what changed since that token:
+
+      {"token": "...", "reset": false, "changed": [rows], "deleted": [ids], "next": url}
+
+    changed holds full rows, the same as the list endpoint, whose updated_at
+    is after the token. deleted holds the ids tombstoned since then. Without
+    a token, or with one older than SKYCREW_SYNC_RETENTION, "reset" is true
+    and changed is a full snapshot, which replaces whatever the client held.
+    changed is paged in id order (ChangesPagination, ?page_size=): follow
+    next until it is null, then pass the first page's token next time
+    (deleted comes with the first page only). List filters don't apply: a
+    replica holds the whole resource and filters locally.
+    """
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        now = timezone.now()
+        since = request.query_params.get('since')
+        since = parse_token(since) if since else None
+        reset = since is None or since < now - timedelta(seconds=RETENTION)
+
+        model = self.queryset.model
+        resource = model._meta.label_lower
+        if time.monotonic() - _pruned_at.get(resource, float('-inf')) > PRUNE_EVERY:
+            _pruned_at[resource] = time.monotonic()
+            Tombstone.objects.filter(resource=resource, deleted_at__lt=now - timedelta(seconds=RETENTION)).delete()
+
+        paginator = ChangesPagination()
+        first_page = not request.query_params.get(paginator.cursor_query_param)
+        queryset = self.queryset.all()
+        deleted = []
+        if not reset:
+            queryset = queryset.filter(updated_at__gt=since)
+            if first_page:
+                deleted = sorted(set(
+                    Tombstone.objects.filter(resource=resource, deleted_at__gt=since).values_list('object_id', flat=True)
+                ))
+
+        serializer_class = self.get_serializer_class()
+        # The fast read path only where the view opted in (FastReadMixin.fast_read)
+        plan = read_plan(serializer_class) if getattr(self, 'fast_read', False) else None
+        if plan is not None:
+            names = list(plan.fields)
+            changed = plan.render(paginator.paginate_queryset(plan.values(queryset, names), request, self), names)
+        else:
+            page = paginator.paginate_queryset(queryset, request, self)
+            changed = serializer_class(page, many=True, context=self.get_serializer_context()).data
+
+        return Response({
+            "token": make_token(now - timedelta(seconds=LAG)),
+            "reset": reset,
+            "changed": changed,
+            "deleted": deleted,
+            "next": paginator.get_next_link(),
+        })
@@ -0,0 +1,150 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework.utils.encoders import JSONEncoder
+
+from skycrew import querybudget
+from skycrew.fastread import read_plan
+from skycrew.refcache import reference_cache
+from FlightInfoApi.models import Airport, Flight, PlaneType
+from PilotApi.models import Pilot
+from CabinCrewApi.models import Attendant, Recipe
+from PassengerApi.models import Passenger
+
+# Fixtures shared by the apps' tests.py: small rows with every field set,
+# so the serializers and the fast read path have something to disagree on
+
+DEPARTURE = datetime(2025, 6, 1, 9, 30, tzinfo=timezone.utc)
+
+
+def as_json(data):
+    # Byte for byte: the same keys in the same order, values formatted alike
+    return json.dumps(data, cls=JSONEncoder)
+
+
+def make_airport(code='IST', **fields):
+    defaults = {'name': f'{code} Airport', 'city': code.title(), 'country': 'Turkey'}
+    return Airport.objects.create(code=code, **{**defaults, **fields})
+
+
+def make_plane_type(name='Boeing 737', **fields):
+    defaults = {
+        'seat_capacity': 24,
+        'crew_limit': 6,
+        'seating_plan_layout': {"rows": 4, "cols": "ABC DEF", "business_rows": 1},
+        'standard_menu': 'Chicken or pasta',
+    }
+    return PlaneType.objects.create(name=name, **{**defaults, **fields})
+
+
+def make_flight(flight_number='SC1001', source=None, destination=None, plane_type=None, **fields):
+    defaults = {
+        'departure_time': DEPARTURE,
+        'duration': timedelta(hours=3, minutes=45),
+        'distance': 2500.5,
+    }
+    return Flight.objects.create(
+        flight_number=flight_number,
+        source=source or make_airport('IST'),
+        destination=destination or make_airport('LHR', country='United Kingdom'),
+        plane_type=plane_type or make_plane_type(),
+        **{**defaults, **fields},
+    )
+
+
+def make_pilot(allowed_vehicle, name='Ayse Kaya', **fields):
+    defaults = {
+        'age': 45, 'gender': 'Female', 'nationality': 'Turkish', 'known_languages': 'Turkish, English',
+        'allowed_range': 5000.0, 'seniority': 'SENIOR',
+    }
+    return Pilot.objects.create(name=name, allowed_vehicle=allowed_vehicle, **{**defaults, **fields})
+
+
+def make_attendant(allowed_vehicles=(), name='Elif Demir', recipes=(), **fields):
+    defaults = {
+        'age': 30, 'gender': 'Female', 'nationality': 'Turkish', 'known_languages': 'Turkish, French',
+        'attendant_type': 'REGULAR',
+    }
+    attendant = Attendant.objects.create(name=name, **{**defaults, **fields})
+    attendant.allowed_vehicles.set(allowed_vehicles)
+    for dish_name in recipes:
+        Recipe.objects.create(chef=attendant, dish_name=dish_name)
+    return attendant
+
+
+def make_passenger(flight, name='Can Yilmaz', affiliated=(), **fields):
+    defaults = {'age': 35, 'gender': 'Male', 'nationality': 'Turkish', 'seat_type': 'ECONOMY'}
+    passenger = Passenger.objects.create(flight=flight, name=name, **{**defaults, **fields})
+    passenger.affiliated_passengers.set(affiliated)
+    return passenger
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    An APITestCase in which every QueryBudgetMixin view enforces its
+    budget: a request over it raises QueryBudgetExceeded and fails the
+    test, under manage.py test and pytest alike. Also empties the
+    per-process caches that the rollback between tests doesn't reach.
+
+    Work deferred with on_commit (index refreshes, roster repairs) doesn't
+    run inside a TestCase, so write budgets are checked without it.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(querybudget, 'MODE', 'raise')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reference_cache.invalidate(Airport)
+        reference_cache.invalidate(PlaneType)
+        cache.clear()
+
+
+class FastReadAssertions:
+    # For TestCases of ViewSets with FastReadMixin (skycrew.fastread)
+
+    def assertRendersLikeSerializer(self, viewset, queryset=None):
+        # The ReadPlan's output for every row is the serializer's, byte for byte
+        serializer_class = viewset.serializer_class
+        plan = read_plan(serializer_class)
+        self.assertIsNotNone(plan, f"{serializer_class.__name__} falls back to the serializer")
+        if queryset is None:
+            queryset = viewset.queryset
+        queryset = queryset.order_by('id')
+        names = plan.project(None)
+        self.assertEqual(
+            as_json(plan.render(plan.values(queryset, names), names)),
+            as_json(serializer_class(queryset, many=True).data),
+        )
+
+    def assertListLikeSerializer(self, url, viewset, queryset=None, **params):
+        # GET list (first page) and GET retrieve of every row, against the serializer
+        serializer_class = viewset.serializer_class
+        if queryset is None:
+            queryset = viewset.queryset
+        queryset = queryset.order_by('id')
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(as_json(response.data['results']), as_json(serializer_class(queryset, many=True).data))
+        for instance in queryset:
+            response = self.client.get(f'{url}{instance.pk}/', params)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(as_json(response.data), as_json(serializer_class(instance).data))
+
+    def assertFieldsProjection(self, url, viewset, fields):
+        # ?fields= keeps those keys, in serializer order, with the serializer's values
+        serializer_class = viewset.serializer_class
+        expected = [
+            {name: value for name, value in item.items() if name in fields}
+            for item in serializer_class(viewset.queryset.order_by('id'), many=True).data
+        ]
+        response = self.client.get(url, {'fields': ','.join(reversed(fields))})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(as_json(response.data['results']), as_json(expected))
+
+        response = self.client.get(url, {'fields': f'{fields[0]},no_such_field'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no_such_field', str(response.data['fields']))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SkycrewappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'skycrewApp'
+
+    def ready(self):
+        # Hook the index maintenance signals
+        from . import signals  # noqa: F401
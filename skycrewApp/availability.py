@@ -0,0 +1,249 @@
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import DateTimeField, ExpressionWrapper, F, Q
+from django.utils.dateparse import parse_datetime, parse_duration
+
+from FlightInfoApi.models import Flight
+from .models import RosterAssignment
+
+# Minimum gap between two duties of the same person (turnaround / rest), minutes
+MIN_REST = getattr(settings, 'SKYCREW_MIN_REST_MINUTES', 60) * 60
+
+# Like the eligibility indexes: bookings made in other workers show up on rebuild
+MAX_AGE = getattr(settings, 'SKYCREW_INDEX_MAX_AGE', 300)
+
+PILOT = RosterAssignment.PILOT
+ATTENDANT = RosterAssignment.ATTENDANT
+
+
+class DoubleBooked(Exception):
+    # Raised by the roster saves: some of the crew were stored on an
+    # overlapping flight by another worker since this process last looked
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"{len(conflicts)} crew member(s) already rostered on an overlapping flight")
+
+
+def flight_window(flight_info):
+    # (start, end) of a flight dict in epoch seconds
+    start = parse_datetime(flight_info['departure_time']).timestamp()
+    duration = parse_duration(flight_info['duration'])
+    return start, start + duration.total_seconds()
+
+
+class Bookings:
+    """
+    One person's duties as (start, end, ...) tuples sorted by start, with
+    the running maximum of their ends. Duties can overlap each other (the
+    backfilled baseline rosters, a flight moved onto another), so the
+    neighbours of a bisect alone aren't enough: is_clear() bisects to the
+    last duty starting before the new one ends and walks back only while
+    the running max end still reaches the new start. Without overlaps
+    that is one or two steps, O(log n) per person.
+    """
+    __slots__ = ('items', 'reach')
+
+    def __init__(self, items=()):
+        self.items = sorted(items)
+        self.reach = []
+        self._reach_from(0)
+
+    def _reach_from(self, i):
+        del self.reach[i:]
+        latest = self.reach[-1] if self.reach else float('-inf')
+        for item in self.items[i:]:
+            latest = max(latest, item[1])
+            self.reach.append(latest)
+
+    def add(self, item):
+        i = bisect_left(self.items, item)
+        self.items.insert(i, item)
+        self._reach_from(i)
+
+    def remove_flight(self, flight_id):
+        self.items = [item for item in self.items if item[2] != flight_id]
+        self._reach_from(0)
+
+    def is_clear(self, start, end, min_rest, skip=None):
+        # Nothing within min_rest of [start, end), ignoring the duty on flight skip
+        i = bisect_left(self.items, (end + min_rest,)) - 1
+        while i >= 0 and self.reach[i] + min_rest > start:
+            item = self.items[i]
+            if item[1] + min_rest > start and (skip is None or item[2] != skip):
+                return False
+            i -= 1
+        return True
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class AvailabilityIndex:
+    """
+    Per crew member, the flights they are rostered on as Bookings, so "is
+    this person free from start to end" is a bisect, not a scan.
+
+    It is a per-process view: a roster is only booked here once it is
+    stored (the saves record it on commit), and bookings stored by other
+    workers show up on rebuild. What keeps two workers from rostering one
+    person on overlapping flights is stored_conflicts(), which the saves
+    run against the assignment table under the database write lock.
+    """
+
+    def __init__(self, min_rest=MIN_REST, max_age=MAX_AGE):
+        self.min_rest = min_rest
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.built_at = None
+        # (kind, person id) -> Bookings of (start, end, flight_id)
+        self.intervals = {}
+        # flight_id -> [(kind, person id), ...] booked on it, for release()
+        self.flights = {}
+        self.rebuilds = 0
+
+    def rebuild(self):
+        crew = RosterAssignment.objects.filter(kind__in=[PILOT, ATTENDANT]).values_list(
+            'roster__flight_id', 'kind', 'person_id',
+        )
+        windows = {
+            flight_number: (departure, duration)
+            for flight_number, departure, duration in
+            Flight.objects.values_list('flight_number', 'departure_time', 'duration')
+        }
+        intervals = {}
+        flights = {}
+        for flight_id, kind, person_id in crew.iterator():
+            if flight_id not in windows:
+                continue
+            departure, duration = windows[flight_id]
+            start = departure.timestamp()
+            end = start + duration.total_seconds()
+            person = (kind, person_id)
+            intervals.setdefault(person, []).append((start, end, flight_id))
+            flights.setdefault(flight_id, []).append(person)
+        intervals = {person: Bookings(booked) for person, booked in intervals.items()}
+        with self.lock:
+            self.intervals = intervals
+            self.flights = flights
+            self.built_at = time.monotonic()
+            self.rebuilds += 1
+
+    def _ensure_built(self):
+        if self.built_at is None or time.monotonic() - self.built_at > self.max_age:
+            self.rebuild()
+
+    def is_free(self, kind, person_id, start, end, flight_id=None):
+        # Bookings on flight_id itself don't count (we're rebuilding that roster)
+        self._ensure_built()
+        with self.lock:
+            booked = self.intervals.get((kind, person_id))
+            if not booked:
+                return True
+            return booked.is_clear(start, end, self.min_rest, skip=flight_id)
+
+    def record(self, flight_id, start, end, roster):
+        # Replace whatever was booked for this flight with the roster's crew
+        self._ensure_built()
+        with self.lock:
+            self.release(flight_id)
+            for person in _crew(roster):
+                self.intervals.setdefault(person, Bookings()).add((start, end, flight_id))
+                self.flights.setdefault(flight_id, []).append(person)
+
+    def release(self, flight_id):
+        with self.lock:
+            for person in self.flights.pop(flight_id, []):
+                booked = self.intervals.get(person)
+                if booked is not None:
+                    booked.remove_flight(flight_id)
+
+    def busy(self, exclude=()):
+        # (kind, person id) -> [(start, end), ...] of every booking not on the
+        # flights in exclude, e.g. the ones about to be re-rostered together
+        self._ensure_built()
+        exclude = set(exclude)
+        with self.lock:
+            return {
+                person: [(start, end) for start, end, flight_id in booked if flight_id not in exclude]
+                for person, booked in self.intervals.items()
+            }
+
+    def stats(self):
+        with self.lock:
+            return {
+                "crew": len(self.intervals),
+                "flights": len(self.flights),
+                "rebuilds": self.rebuilds,
+            }
+
+
+class TentativeBookings:
+    """
+    Bookings not stored yet, layered over an AvailabilityIndex: a batch
+    books each flight's crew here as it goes, so later flights of the batch
+    see them, while the index itself only learns them once they are saved.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.intervals = {}
+
+    def is_free(self, kind, person_id, start, end, flight_id=None):
+        booked = self.intervals.get((kind, person_id))
+        if booked and not booked.is_clear(start, end, self.index.min_rest, skip=flight_id):
+            return False
+        return self.index.is_free(kind, person_id, start, end, flight_id=flight_id)
+
+    def record(self, flight_id, start, end, roster):
+        for person in _crew(roster):
+            self.intervals.setdefault(person, Bookings()).add((start, end, flight_id))
+
+
+def stored_conflicts(flight_id, start, end, roster, exclude=(), min_rest=MIN_REST):
+    """
+    (kind, person id, flight_id) for each of the roster's crew already
+    stored on another flight within min_rest of [start, end) (epoch
+    seconds), one query. The saves run it in the transaction that stores
+    the roster, which under our SQLite settings (BEGIN IMMEDIATE) holds the
+    write lock, so no other worker can store a clashing roster between the
+    check and the save. exclude: flights replaced in the same transaction.
+    """
+    people = Q()
+    for kind, person_id in _crew(roster):
+        people |= Q(kind=kind, person_id=person_id)
+    if not people:
+        return []
+    rest = timedelta(seconds=min_rest)
+    overlapping = (
+        Flight.objects.alias(
+            arrival=ExpressionWrapper(F('departure_time') + F('duration'), output_field=DateTimeField()),
+        )
+        .filter(departure_time__lt=_moment(end) + rest, arrival__gt=_moment(start) - rest)
+        .exclude(flight_number__in=[flight_id, *exclude])
+        .values('flight_number')
+    )
+    return list(
+        RosterAssignment.objects.filter(people, roster__flight_id__in=overlapping)
+        .values_list('kind', 'person_id', 'roster__flight_id')
+    )
+
+
+def _moment(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def _crew(roster):
+    for pilot in roster.get('pilots', []):
+        yield PILOT, pilot['id']
+    for attendant in roster.get('cabin_crew', []):
+        yield ATTENDANT, attendant['id']
+
+
+availability_index = AvailabilityIndex()
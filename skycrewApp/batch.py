@@ -0,0 +1,205 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from FlightInfoApi.models import Flight
+from .availability import TentativeBookings, availability_index
+from .coalesce import hold_rosters
+from .logic import RosterGenerator, seat_passengers
+from .models import FlightRoster
+from .optimizer import optimize_crew
+from .providers import PreloadedDataProvider
+from .rosters import save_rosters
+
+# Below this many flights a process pool costs more than it saves
+MIN_FLIGHTS_FOR_POOL = 50
+
+# The longest departure window given in hours: ten years, far inside
+# what a datetime can hold
+MAX_WINDOW_HOURS = 10 * 366 * 24
+
+
+def select_flights(flight_ids=None, start=None, end=None):
+    # Either an explicit list of flight numbers or a departure window
+    flights = Flight.objects.all()
+    if flight_ids:
+        flights = flights.filter(flight_number__in=flight_ids)
+    if start is not None:
+        flights = flights.filter(departure_time__gte=start)
+    if end is not None:
+        flights = flights.filter(departure_time__lt=end)
+    return flights.order_by('departure_time', 'id')
+
+
+class InvalidWindow(ValueError):
+    # parse_window got something that isn't a datetime; field is 'start' or 'end'
+    def __init__(self, field):
+        self.field = field
+        super().__init__(f"{field} must be an ISO 8601 datetime")
+
+
+def parse_window(start=None, end=None):
+    # ISO 8601 start/end as given by a client (either may be empty) -> (start, end)
+    window = []
+    for field, value in (('start', start), ('end', end)):
+        if not value:
+            window.append(None)
+            continue
+        try:
+            moment = parse_datetime(str(value))
+        except ValueError:
+            # Well formed but not a date, e.g. month 13
+            moment = None
+        if moment is None:
+            raise InvalidWindow(field)
+        window.append(moment)
+    return tuple(window)
+
+
+def departure_window(hours):
+    # e.g. hours=72 -> everything departing in the next three days. Raises
+    # ValueError unless 0 <= hours <= MAX_WINDOW_HOURS (so not for nan or inf)
+    hours = float(hours)
+    if not 0 <= hours <= MAX_WINDOW_HOURS:
+        raise ValueError(f"hours must be between 0 and {MAX_WINDOW_HOURS}")
+    now = timezone.now()
+    return now, now + timedelta(hours=hours)
+
+
+def _seat(job):
+    # Runs in a worker process: pure data in, pure data out
+    flight_info, passengers, plane_type = job
+    return seat_passengers(flight_info, passengers, plane_type)[0]
+
+
+def _crew_one(flight_id, previous_fingerprint, provider, bookings, crew=None):
+    previous = FlightRoster(fingerprint=previous_fingerprint) if previous_fingerprint else None
+    generator = RosterGenerator(flight_id, provider, bookings)
+    try:
+        roster = generator.generate(previous=previous, seat_passengers=False, crew=crew)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}, generator
+    return roster, generator
+
+
+def generate_batch(flight_ids=None, start=None, end=None, workers=None, optimize=False, time_limit=None):
+    """
+    Generate rosters for many flights in one go.
+
+    The candidate pools are loaded once. Crew is assigned flight by flight
+    in departure order in this process, each flight's crew booked
+    tentatively over the availability index, so nobody is double-booked
+    inside the batch. Passenger seating, the heavy part, is spread over a
+    process pool. The rosters are written with one bulk upsert, leaving
+    out any whose crew another worker stored on an overlapping flight
+    meanwhile, and the result is a report with a success/failure entry
+    per flight.
+
+    optimize=True assigns the crew of all the flights jointly instead
+    (optimizer.optimize_crew, at most time_limit seconds) and rebuilds
+    every roster, unchanged inputs or not; the report gains an
+    "optimizer" entry with the solve time and objective value.
+
+    Raises coalesce.Saturated when MAX_ACTIVE generations are running.
+    """
+    if workers is None:
+        workers = getattr(settings, 'SKYCREW_BATCH_WORKERS', None) or os.cpu_count() or 1
+
+    flights = list(select_flights(flight_ids, start, end))
+    # Each flight's roster lock (coalesce) is held from reading the inputs to
+    # the save, so no request regenerates it meanwhile; flights being
+    # generated elsewhere right now are left out
+    with hold_rosters([f.flight_number for f in flights]) as held:
+        elsewhere = [f.flight_number for f in flights if f.flight_number not in held]
+        flights = [f for f in flights if f.flight_number in held]
+        flight_numbers = [f.flight_number for f in flights]
+        provider = PreloadedDataProvider.load(flights)
+
+        assignment = {}
+        optimizer_report = None
+        if optimize:
+            assignment, optimizer_report = optimize_crew(
+                list(provider.flights.values()),
+                list(provider.plane_types.values()),
+                provider.pilots,
+                provider.attendants,
+                busy=availability_index.busy(exclude=flight_numbers),
+                time_limit=time_limit,
+                workers=workers,
+            )
+
+        # Stored fingerprints, so flights whose inputs haven't changed are skipped
+        fingerprints = dict(
+            FlightRoster.objects.filter(flight_id__in=flight_numbers).values_list('flight_id', 'fingerprint')
+        )
+
+        results = [
+            {"flight_id": flight_id, "status": "failed", "error": "Being generated by another request, try again"}
+            for flight_id in elsewhere
+        ]
+        rosters = []
+        to_seat = []
+        unchanged = 0
+        bookings = TentativeBookings(availability_index)
+        for flight_id in flight_numbers:
+            roster, generator = _crew_one(
+                flight_id, fingerprints.get(flight_id), provider, bookings, assignment.get(flight_id),
+            )
+            if generator.reused:
+                unchanged += 1
+                results.append({"flight_id": flight_id, "status": "ok", "unchanged": True})
+            elif "error" in roster:
+                results.append({"flight_id": flight_id, "status": "failed", "error": roster["error"]})
+            else:
+                bookings.record(flight_id, *generator.window, roster)
+                rosters.append((flight_id, roster, generator.fingerprint, generator.window))
+                to_seat.append(generator.seating_inputs)
+                results.append({"flight_id": flight_id, "status": "ok"})
+
+        if workers > 1 and len(to_seat) >= MIN_FLIGHTS_FOR_POOL:
+            chunksize = max(1, len(to_seat) // (workers * 4))
+            # Spawned, not forked: a fork would copy this process mid-request, with
+            # the upstream pool's and the repair worker's threads holding locks
+            # the child could never release. A fresh child sets Django up itself.
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+            with pool:
+                seated = list(pool.map(_seat, to_seat, chunksize=chunksize))
+        else:
+            seated = [_seat(job) for job in to_seat]
+
+        for (_, roster, _, _), passengers in zip(rosters, seated):
+            roster['passengers'] = passengers
+
+        # Anything asked for by number that doesn't exist is a failure too
+        if flight_ids:
+            found = set(flight_numbers) | set(elsewhere)
+            for flight_id in dict.fromkeys(flight_ids):
+                if flight_id not in found:
+                    results.append({"flight_id": flight_id, "status": "failed", "error": "Flight not found"})
+
+        rejected = save_rosters(rosters)
+        if rejected:
+            # Our index missed those bookings: catch up for the next run
+            availability_index.rebuild()
+            for result in results:
+                if result["flight_id"] in rejected:
+                    result.update(status="failed", error="Crew rostered on an overlapping flight meanwhile, try again")
+
+        report = {
+            "requested": len(results),
+            "generated": len(rosters) - len(rejected),
+            "unchanged": unchanged,
+            "failed": len(results) - len(rosters) + len(rejected) - unchanged,
+            "results": results,
+        }
+        if optimizer_report is not None:
+            report["optimizer"] = optimizer_report
+        return report
@@ -0,0 +1,214 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from .logic import current_roster, generate_and_store
+from .models import RosterLock
+from .rosters import load_roster
+
+logger = logging.getLogger(__name__)
+
+# Generations running at once across every worker (a batch counts as one);
+# past this callers get 503
+MAX_ACTIVE = getattr(settings, 'SKYCREW_ROSTER_CONCURRENCY', 8)
+
+# How long a request waits for someone else's generation of the same roster (seconds)
+WAIT = getattr(settings, 'SKYCREW_ROSTER_WAIT', 30)
+
+# A lock row older than this is from a worker that died mid-generation (seconds).
+# A live worker pushes its row's expiry forward every LOCK_TTL / 3 (_Held).
+LOCK_TTL = 60
+
+# Suggested Retry-After when saturated (seconds)
+RETRY_AFTER = 1
+
+# How often a request waiting on another worker checks the lock row (seconds)
+POLL = 0.05
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner():
+    # Lock rows are taken per holder (a request, a repair pass, a batch), so
+    # threads of one process never renew or release each other's rows
+    return f"{OWNER}:{uuid.uuid4().hex[:12]}"
+
+
+class Saturated(Exception):
+    # Too many rosters are being generated, or the one we waited on took too long
+    def __init__(self, retry_after=RETRY_AFTER):
+        super().__init__(f"Roster generation saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def coalesced_generate(flight_id):
+    """
+    generate_and_store() with concurrent requests for one flight merged.
+
+    A stored roster whose inputs are known to be unchanged
+    (logic.current_roster) is served straight away, without any lock.
+    Otherwise, inside a process the first request for a flight does the
+    work and the others wait for its result. Across processes a RosterLock
+    row marks the flight as in progress: other workers wait for it to go
+    away and then pick up the stored roster (the fingerprint check makes
+    that a reuse, not a second generation). Returns (roster_data,
+    fingerprint); raises Saturated when MAX_ACTIVE generations are running.
+    """
+    with _inflight_lock:
+        call = _inflight.get(flight_id)
+        leader = call is None
+        if leader:
+            call = _inflight[flight_id] = _Call()
+
+    if not leader:
+        if not call.done.wait(WAIT):
+            raise Saturated()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _generate_once(flight_id)
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[flight_id]
+        call.done.set()
+    return call.result
+
+
+def _generate_once(flight_id):
+    # The cross-worker half: only the holder of the flight's lock row generates.
+    # Everyone else waits for the row to go and then takes the lock in turn,
+    # so the stored roster is reused (or, if the holder failed, one worker at
+    # a time retries) rather than regenerated by every waiter at once.
+    deadline = time.monotonic() + WAIT
+    while True:
+        stored = current_roster(flight_id)
+        if stored is not None:
+            return load_roster(stored), stored.fingerprint
+        owner = _owner()
+        if _acquire([flight_id], owner):
+            with _Held(owner):
+                roster_data, generator = generate_and_store(flight_id)
+            return roster_data, generator.fingerprint
+        _wait(flight_id, deadline)
+
+
+@contextmanager
+def roster_lock(flight_id):
+    """
+    Hold a flight's roster lock around a read-modify-save of its roster
+    (repair), waiting up to WAIT for whoever holds it now. Raises Saturated
+    on timeout or when MAX_ACTIVE generations are running.
+    """
+    deadline = time.monotonic() + WAIT
+    owner = _owner()
+    while not _acquire([flight_id], owner):
+        _wait(flight_id, deadline)
+    with _Held(owner):
+        yield
+
+
+@contextmanager
+def hold_rosters(flight_ids):
+    """
+    Lock the rosters of many flights at once for a batch, without waiting:
+    yields the set of those now held; the others are being generated
+    elsewhere right now. The batch counts as one generation towards
+    MAX_ACTIVE (Saturated past it).
+    """
+    owner = _owner()
+    held = _acquire(flight_ids, owner)
+    with _Held(owner):
+        yield held
+
+
+def _wait(flight_id, deadline):
+    # Until nobody holds the flight's lock (or it expired); Saturated past the deadline
+    while RosterLock.objects.filter(flight_id=flight_id, expires_at__gt=timezone.now()).exists():
+        if time.monotonic() > deadline:
+            raise Saturated()
+        time.sleep(POLL)
+
+
+def _acquire(flight_ids, owner):
+    # Lock rows for those of flight_ids nobody holds; returns the set now ours.
+    # One transaction (BEGIN IMMEDIATE under our SQLite settings), so holders
+    # can't all pass the MAX_ACTIVE count before any of them inserts.
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            RosterLock.objects.filter(expires_at__lte=now).delete()
+            held = set(RosterLock.objects.filter(flight_id__in=flight_ids).values_list('flight_id', flat=True))
+            free = [flight_id for flight_id in dict.fromkeys(flight_ids) if flight_id not in held]
+            if not free:
+                return set()
+            if RosterLock.objects.values('owner').distinct().count() >= MAX_ACTIVE:
+                raise Saturated()
+            expires_at = now + timedelta(seconds=LOCK_TTL)
+            RosterLock.objects.bulk_create(
+                [RosterLock(flight_id=flight_id, owner=owner, expires_at=expires_at) for flight_id in free],
+            )
+    except IntegrityError:
+        return set()
+    return set(free)
+
+
+class _Held:
+    # While the block runs, keep pushing the owner's lock rows' expiry forward
+    # so a slow generation isn't taken for a dead worker; delete them after
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._renew, name=f'roster-lock-{owner}', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop.set()
+        self.thread.join()
+        RosterLock.objects.filter(owner=self.owner).delete()
+
+    def _renew(self):
+        try:
+            while not self.stop.wait(LOCK_TTL / 3):
+                try:
+                    RosterLock.objects.filter(owner=self.owner).update(
+                        expires_at=timezone.now() + timedelta(seconds=LOCK_TTL),
+                    )
+                except OperationalError as e:
+                    # Locked database: the next beat tries again, well within LOCK_TTL
+                    logger.warning("Couldn't renew the roster locks of %s: %s", self.owner, e)
+        finally:
+            connection.close()
+
+
+def active_generations():
+    # Lock rows still held, i.e. rosters being generated right now (all workers)
+    return RosterLock.objects.filter(expires_at__gt=timezone.now()).count()
@@ -0,0 +1,240 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from PilotApi.models import Pilot
+from PilotApi.serializers import PilotSerializer
+from CabinCrewApi.models import Attendant
+from CabinCrewApi.serializers import AttendantSerializer
+
+# Signals only reach the process that made the change, so other workers
+# fall back to a full rebuild once their copy is this old (seconds).
+MAX_AGE = getattr(settings, 'SKYCREW_INDEX_MAX_AGE', 300)
+
+
+class PilotIndex:
+    """
+    In-memory pilot eligibility index.
+
+    Pilots are bucketed by (plane type id, seniority) and each bucket is
+    kept sorted by allowed_range, so "who can fly this plane this far" is a
+    bisect plus a slice instead of a scan over every pilot. The index is
+    built lazily, then patched from Pilot save/delete signals.
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.built_at = None
+        # (plane_type, seniority) -> ([(allowed_range, id), ...], [pilot dict, ...]) in the same order
+        self.buckets = {}
+        # pilot id -> (bucket key, allowed_range) so updates can find the old entry
+        self.locations = {}
+        self.hits = 0
+        self.rebuilds = 0
+        self.updates = 0
+
+    def rebuild(self):
+        pilots = PilotSerializer(Pilot.objects.order_by('id'), many=True).data
+        buckets = {}
+        locations = {}
+        for pilot in sorted(pilots, key=lambda p: (p['allowed_range'], p['id'])):
+            key = (pilot['allowed_vehicle'], pilot['seniority'])
+            keys, rows = buckets.setdefault(key, ([], []))
+            keys.append((pilot['allowed_range'], pilot['id']))
+            rows.append(pilot)
+            locations[pilot['id']] = (key, pilot['allowed_range'])
+        with self.lock:
+            self.buckets = buckets
+            self.locations = locations
+            self.built_at = time.monotonic()
+            self.rebuilds += 1
+
+    def _ensure_built(self):
+        if self.built_at is None or time.monotonic() - self.built_at > self.max_age:
+            self.rebuild()
+
+    def eligible(self, plane_type, seniority, min_range):
+        # Pilots of this seniority on this plane type with allowed_range >= min_range,
+        # shortest range first so long-haul pilots are kept for long flights.
+        # Copies: rosters embed them, and the index's own rows must not change
+        self._ensure_built()
+        with self.lock:
+            self.hits += 1
+            bucket = self.buckets.get((plane_type, seniority))
+            if bucket is None:
+                return []
+            keys, rows = bucket
+            return [dict(row) for row in rows[bisect_left(keys, (min_range, float('-inf'))):]]
+
+    def candidates(self, plane_type, min_range):
+        # {seniority: eligible pilots} for every seniority, the shape
+        # OrmDataProvider.get_pilots returns
+        return {seniority: self.eligible(plane_type, seniority, min_range) for seniority, _ in Pilot.SENIORITY_CHOICES}
+
+    def upsert(self, pilot):
+        # pilot is the serialized dict of a saved Pilot
+        with self.lock:
+            if self.built_at is None:
+                return
+            self._discard(pilot['id'])
+            key = (pilot['allowed_vehicle'], pilot['seniority'])
+            keys, rows = self.buckets.setdefault(key, ([], []))
+            entry = (pilot['allowed_range'], pilot['id'])
+            position = bisect_left(keys, entry)
+            keys.insert(position, entry)
+            rows.insert(position, pilot)
+            self.locations[pilot['id']] = (key, pilot['allowed_range'])
+            self.updates += 1
+
+    def remove(self, pilot_id):
+        with self.lock:
+            if self.built_at is None:
+                return
+            self._discard(pilot_id)
+            self.updates += 1
+
+    def _discard(self, pilot_id):
+        location = self.locations.pop(pilot_id, None)
+        if location is None:
+            return
+        key, allowed_range = location
+        keys, rows = self.buckets[key]
+        position = bisect_left(keys, (allowed_range, pilot_id))
+        del keys[position]
+        del rows[position]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "pilots": len(self.locations),
+                "buckets": len(self.buckets),
+                "hits": self.hits,
+                "rebuilds": self.rebuilds,
+                "updates": self.updates,
+            }
+
+
+class AttendantIndex:
+    """
+    Inverted index from plane type to the attendants allowed on it,
+    grouped by attendant_type and ordered by id.
+
+    Built from Attendant + the allowed_vehicles through table in one
+    prefetching query, then kept current by refreshing just the attendants
+    touched by save/delete/m2m_changed signals. Membership is exact, so
+    plane type 1 never matches attendants only allowed on 11 or 21.
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.built_at = None
+        # plane_type -> attendant_type -> ([ids], [attendant dicts]) in the same order
+        self.by_plane = {}
+        # attendant id -> serialized dict (its allowed_vehicles says where it is indexed)
+        self.attendants = {}
+        self.hits = 0
+        self.rebuilds = 0
+        self.updates = 0
+
+    @staticmethod
+    def _load(ids=None):
+        crew = Attendant.objects.prefetch_related('recipes', 'allowed_vehicles').order_by('id')
+        if ids is not None:
+            crew = crew.filter(id__in=ids)
+        return AttendantSerializer(crew, many=True).data
+
+    def rebuild(self):
+        by_plane = {}
+        attendants = {}
+        # Rows come ordered by id, so appending keeps every bucket sorted
+        for attendant in self._load():
+            attendants[attendant['id']] = attendant
+            for plane_type in attendant['allowed_vehicles']:
+                ids, rows = by_plane.setdefault(plane_type, {}).setdefault(attendant['attendant_type'], ([], []))
+                ids.append(attendant['id'])
+                rows.append(attendant)
+        with self.lock:
+            self.by_plane = by_plane
+            self.attendants = attendants
+            self.built_at = time.monotonic()
+            self.rebuilds += 1
+
+    def _ensure_built(self):
+        if self.built_at is None or time.monotonic() - self.built_at > self.max_age:
+            self.rebuild()
+
+    def crew(self, plane_type, attendant_type):
+        # Copies, down to the recipes a menu is picked from, like PilotIndex.eligible
+        self._ensure_built()
+        with self.lock:
+            self.hits += 1
+            bucket = self.by_plane.get(plane_type, {}).get(attendant_type)
+            if not bucket:
+                return []
+            return [
+                {**row, 'recipes': [dict(recipe) for recipe in row['recipes']],
+                 'allowed_vehicles': list(row['allowed_vehicles'])}
+                for row in bucket[1]
+            ]
+
+    def candidates(self, plane_type):
+        # Everyone allowed on this plane type, the shape OrmDataProvider.get_attendants returns
+        result = []
+        for attendant_type, _ in Attendant.TYPE_CHOICES:
+            result.extend(self.crew(plane_type, attendant_type))
+        return result
+
+    def refresh(self, attendant_ids):
+        # Re-read just these attendants and move them to the right buckets
+        # (deleted ones simply don't come back from the query)
+        with self.lock:
+            if self.built_at is None:
+                return
+        fresh = self._load(attendant_ids)
+        with self.lock:
+            for attendant_id in attendant_ids:
+                self._discard(attendant_id)
+            for attendant in fresh:
+                self._insert(attendant)
+            self.updates += 1
+
+    def members(self, plane_type):
+        # Ids of everyone currently indexed under a plane type
+        with self.lock:
+            return [i for ids, _ in self.by_plane.get(plane_type, {}).values() for i in ids]
+
+    def _insert(self, attendant):
+        self.attendants[attendant['id']] = attendant
+        for plane_type in attendant['allowed_vehicles']:
+            ids, rows = self.by_plane.setdefault(plane_type, {}).setdefault(attendant['attendant_type'], ([], []))
+            position = bisect_left(ids, attendant['id'])
+            ids.insert(position, attendant['id'])
+            rows.insert(position, attendant)
+
+    def _discard(self, attendant_id):
+        attendant = self.attendants.pop(attendant_id, None)
+        if attendant is None:
+            return
+        for plane_type in attendant['allowed_vehicles']:
+            ids, rows = self.by_plane[plane_type][attendant['attendant_type']]
+            position = bisect_left(ids, attendant_id)
+            del ids[position]
+            del rows[position]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "attendants": len(self.attendants),
+                "plane_types": len(self.by_plane),
+                "hits": self.hits,
+                "rebuilds": self.rebuilds,
+                "updates": self.updates,
+            }
+
+
+pilot_index = PilotIndex()
+attendant_index = AttendantIndex()
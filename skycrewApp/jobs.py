@@ -0,0 +1,172 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .coalesce import Saturated, coalesced_generate
+from .models import RosterJob
+
+logger = logging.getLogger(__name__)
+
+# Jobs allowed to run at once across every worker process
+CONCURRENCY = getattr(settings, 'SKYCREW_JOB_CONCURRENCY', 4)
+
+# A job RUNNING for longer than this belonged to a worker that died (seconds)
+TIMEOUT = getattr(settings, 'SKYCREW_JOB_TIMEOUT', 600)
+
+# Give up on a job after this many claims
+MAX_ATTEMPTS = 3
+
+# Window the latency metrics are computed over (seconds)
+METRICS_WINDOW = 3600
+
+
+def submit_job(flight_id):
+    # Queue a roster job, or return the one already pending for this flight.
+    # Returns (job, created).
+    pending = RosterJob.objects.filter(flight_id=flight_id, status=RosterJob.PENDING).first()
+    if pending is not None:
+        return pending, False
+    try:
+        with transaction.atomic():
+            return RosterJob.objects.create(flight_id=flight_id), True
+    except IntegrityError:
+        # Someone queued it between our check and the insert, and a worker
+        # may have claimed it since: that job is the one to follow
+        return RosterJob.objects.filter(flight_id=flight_id).order_by('-id').first(), False
+
+
+def claim_job(worker):
+    """
+    Take the oldest pending job for this worker, or None when the queue is
+    empty or CONCURRENCY jobs are already running. Claiming is a
+    conditional UPDATE (PENDING -> RUNNING), so two workers racing for the
+    same row can't both win, on any database. The running count and the
+    claim share one transaction (BEGIN IMMEDIATE under our SQLite
+    settings), so racing workers can't all pass the CONCURRENCY check.
+    Flights that already have a running job are skipped until it finishes.
+    """
+    requeue_stale_jobs()
+    with transaction.atomic():
+        running = RosterJob.objects.filter(status=RosterJob.RUNNING)
+        if running.count() >= CONCURRENCY:
+            return None
+
+        candidates = (
+            RosterJob.objects.filter(status=RosterJob.PENDING)
+            .exclude(flight_id__in=running.values('flight_id'))
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)[:CONCURRENCY * 2]
+        )
+        for job_id in candidates:
+            claimed = RosterJob.objects.filter(id=job_id, status=RosterJob.PENDING).update(
+                status=RosterJob.RUNNING, started_at=timezone.now(), worker=worker, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return RosterJob.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs():
+    # Put jobs of dead workers back in the queue (or fail them after MAX_ATTEMPTS)
+    cutoff = timezone.now() - timedelta(seconds=TIMEOUT)
+    for job in RosterJob.objects.filter(status=RosterJob.RUNNING, started_at__lt=cutoff):
+        _retry(job, "Worker timed out")
+
+
+def run_job(job):
+    # Generate and store the roster for a claimed job (under the flight's
+    # roster lock, like a GET), then record the outcome
+    try:
+        roster_data, _ = coalesced_generate(job.flight_id)
+    except (OperationalError, Saturated) as e:
+        # Locked/busy database, roster generation saturated and the like: worth another go
+        logger.warning("Roster job %s for %s hit %s, retrying", job.id, job.flight_id, e)
+        _retry(job, f"{type(e).__name__}: {e}")
+        return job
+    except Exception as e:
+        logger.exception("Roster job %s for %s crashed", job.id, job.flight_id)
+        _finish(job, RosterJob.FAILED, f"{type(e).__name__}: {e}")
+        return job
+
+    if "error" in roster_data:
+        error = roster_data["error"]
+        if "upstream" in roster_data:
+            error = f"{error}: {roster_data['upstream']} ({roster_data['reason']})"
+        _finish(job, RosterJob.FAILED, error)
+    else:
+        _finish(job, RosterJob.DONE)
+    return job
+
+
+def _retry(job, error):
+    # Back to PENDING for another worker, unless it has had MAX_ATTEMPTS already
+    if job.attempts >= MAX_ATTEMPTS:
+        _finish(job, RosterJob.FAILED, error)
+        return
+    try:
+        with transaction.atomic():
+            RosterJob.objects.filter(id=job.id, status=RosterJob.RUNNING).update(
+                status=RosterJob.PENDING, started_at=None, worker='', error=error,
+            )
+        job.status = RosterJob.PENDING
+        job.error = error
+    except IntegrityError:
+        # A newer job for the same flight is already pending and will do the work
+        _finish(job, RosterJob.FAILED, f"{error}, superseded by job for the same flight")
+
+
+def _finish(job, status, error=''):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def job_metrics():
+    now = timezone.now()
+    counts = dict(RosterJob.objects.values_list('status').annotate(Count('id')).order_by())
+    oldest = (
+        RosterJob.objects.filter(status=RosterJob.PENDING)
+        .order_by('created_at').values_list('created_at', flat=True).first()
+    )
+    recent = RosterJob.objects.filter(
+        status__in=[RosterJob.DONE, RosterJob.FAILED],
+        finished_at__gte=now - timedelta(seconds=METRICS_WINDOW),
+    ).values_list('created_at', 'started_at', 'finished_at')
+
+    waits = []
+    runs = []
+    for created_at, started_at, finished_at in recent.iterator():
+        if started_at is None:
+            continue
+        waits.append((started_at - created_at).total_seconds())
+        runs.append((finished_at - started_at).total_seconds())
+
+    return {
+        "depth": counts.get(RosterJob.PENDING, 0),
+        "running": counts.get(RosterJob.RUNNING, 0),
+        "done": counts.get(RosterJob.DONE, 0),
+        "failed": counts.get(RosterJob.FAILED, 0),
+        "concurrency": CONCURRENCY,
+        "oldest_pending_age": round((now - oldest).total_seconds(), 3) if oldest else None,
+        # Over the last METRICS_WINDOW seconds: time in the queue and time to generate
+        "finished_recently": len(runs),
+        "wait_seconds": _summary(waits),
+        "run_seconds": _summary(runs),
+    }
+
+
+def _summary(values):
+    if not values:
+        return None
+    values.sort()
+    return {
+        "avg": round(sum(values) / len(values), 3),
+        "p50": round(values[len(values) // 2], 3),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max": round(values[-1], 3),
+    }
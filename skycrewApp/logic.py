@@ -1,21 +1,106 @@
-import requests
+import hashlib
+import json
 import random
 
-# Helper to talk to your local APIs
-BASE_URL = "http://127.0.0.1:8000/api"
+from django.conf import settings
+from django.db.models import F, Func, OuterRef, Subquery
+from rest_framework.utils.encoders import JSONEncoder
 
-def fetch_api_data(endpoint):
-    try:
-        response = requests.get(f"{BASE_URL}/{endpoint}/")
-        if response.status_code == 200:
-            return response.json()
-    except Exception as e:
-        print(f"Error fetching {endpoint}: {e}")
-    return []
+from FlightInfoApi.models import Flight
+from PilotApi.models import Pilot
+from CabinCrewApi.models import Attendant
+from PassengerApi.models import Passenger
+from .availability import ATTENDANT, PILOT, DoubleBooked, availability_index, flight_window
+from .models import FlightRoster
+from .providers import get_provider
+from .rosters import load_roster, save_roster
+from .seating import SeatAllocator, get_seat_map, group_passengers
+from .upstream import UpstreamError
+
+# Bump when the assignment rules change, so every stored roster is rebuilt once
+ALGORITHM_VERSION = 1
+
+# Generations of one roster when the save finds its crew booked elsewhere meanwhile
+BOOKING_ATTEMPTS = 3
+
+def fingerprint_inputs(flight_info, pools):
+    # Stable hash of everything generate() looks at
+    payload = json.dumps(
+        {"version": ALGORITHM_VERSION, "flight": flight_info, "pools": pools},
+        cls=JSONEncoder, sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+# The stamp reads the pool tables, which only this database has in a monolith
+STAMPED = getattr(settings, 'SKYCREW_DATA_PROVIDER', 'orm') == 'orm'
+
+def _pool_stats(queryset):
+    # (row count, newest updated_at) of a pool, as scalar subqueries
+    queryset = queryset.order_by()
+    return (
+        Subquery(queryset.annotate(n=Func(F('id'), function='COUNT')).values('n')),
+        Subquery(queryset.annotate(at=Func(F('updated_at'), function='MAX')).values('at')),
+    )
+
+def inputs_stamp(flight_id):
+    """
+    A cheap stand-in for fingerprint_inputs: one indexed query over the rows
+    a flight's pools are read from (the flight, its plane type, the pilots
+    and attendants of that plane, its passengers). A save moves a pool's
+    newest updated_at (recipes and affiliations touch their owners, see
+    signals), and a row that left it (deleted, moved to another plane or
+    flight) lowers its count, so while the stamp is the same the pools
+    are too. None with the HTTP provider or for an unknown flight.
+    """
+    if not STAMPED:
+        return None
+    pilots = _pool_stats(Pilot.objects.filter(allowed_vehicle=OuterRef('plane_type')))
+    attendants = _pool_stats(Attendant.objects.filter(allowed_vehicles=OuterRef('plane_type')))
+    passengers = _pool_stats(Passenger.objects.filter(flight=OuterRef('id')))
+    row = (
+        Flight.objects.filter(flight_number=flight_id)
+        .annotate(
+            plane_at=F('plane_type__updated_at'),
+            pilots_n=pilots[0], pilots_at=pilots[1],
+            attendants_n=attendants[0], attendants_at=attendants[1],
+            passengers_n=passengers[0], passengers_at=passengers[1],
+        )
+        .values_list(
+            'updated_at', 'plane_at', 'pilots_n', 'pilots_at',
+            'attendants_n', 'attendants_at', 'passengers_n', 'passengers_at',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    payload = json.dumps([ALGORITHM_VERSION, *row], cls=JSONEncoder, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def current_roster(flight_id):
+    """
+    The stored FlightRoster if its inputs are known not to have changed
+    since (two small queries, no pools read), else None.
+    """
+    stored = FlightRoster.objects.filter(flight_id=flight_id).first()
+    if stored is None or not stored.fingerprint or not stored.inputs_stamp:
+        return None
+    return stored if inputs_stamp(flight_id) == stored.inputs_stamp else None
+
+def current_fingerprint(flight_id):
+    # current_roster()'s fingerprint, or None
+    stored = current_roster(flight_id)
+    return stored.fingerprint if stored is not None else None
 
 class RosterGenerator:
-    def __init__(self, flight_id):
+    def __init__(self, flight_id, provider=None, availability=None):
         self.flight_id = flight_id
+        # Where the data comes from (ORM in a monolith, HTTP when split)
+        self.provider = provider or get_provider()
+        # Who is already flying when, so nobody is put on two flights at once
+        # (the saves book the crew once the roster is stored, see rosters.save_roster)
+        self.availability = availability or availability_index
+        self.window = None
+        self.seating_inputs = None
         self.roster = {
             "flight_id": flight_id,
             "pilots": [],
@@ -23,98 +108,201 @@ class RosterGenerator:
             "passengers": [],
             "menu": []
         }
+        self.random = random.Random()
         # We will build a map of taken seats here (e.g., {'12A': 'Bob'})
         self.seat_map = {} 
+        # Filled in by generate(): the input fingerprint, and whether the
+        # previous roster was reused because the inputs hadn't changed
+        self.fingerprint = None
+        self.reused = False
 
-    def generate(self):
-        # 1. Find the Flight
-        flights = fetch_api_data("flight-info/flights")
-        flight_info = next((f for f in flights if f['flight_number'] == self.flight_id), None)
-        
-        if not flight_info:
-            return {"error": "Flight not found"}
+    def generate(self, previous=None, seat_passengers=True, crew=None):
+        # previous: the stored FlightRoster for this flight, if any (when it is
+        # reused, its roster_data is returned as stored, see rosters.load_roster)
+        # seat_passengers=False leaves seating to the caller (batch runs it in worker
+        # processes) and keeps what it needs in self.seating_inputs
+        # crew: {"pilots": [...], "cabin_crew": [...]} already picked for this flight
+        # (optimizer.optimize_crew), used instead of the greedy assignment
+        try:
+            # 1. Find the Flight
+            flight_info = self.provider.get_flight(self.flight_id)
+
+            if not flight_info:
+                return {"error": "Flight not found"}
+
+            # 2. Fetch the candidate pools (concurrently when they come over HTTP)
+            pools = self.provider.get_pools(flight_info)
+        except UpstreamError as e:
+            # Fail loudly: an outage must not look like "no pilots available"
+            return {"error": "Upstream service unavailable", "upstream": e.endpoint, "reason": e.reason}
+
+        # Nothing changed since the stored roster was built -> serve it as is
+        self.fingerprint = fingerprint_inputs(flight_info, pools)
+        if previous is not None and crew is None and previous.fingerprint == self.fingerprint:
+            self.reused = True
+            return previous.roster_data
 
-        # 2. Run the Algorithms
-        self.assign_pilots(flight_info)
-        self.assign_cabin_crew(flight_info)
-        self.assign_passengers(flight_info)
+        # Seeded by the inputs, so the same inputs always give the same roster
+        self.random = random.Random(self.fingerprint)
+
+        # 3. Run the Algorithms
+        self.window = flight_window(flight_info)
+        if crew is not None:
+            self.roster['pilots'].extend(crew['pilots'])
+            self.roster['cabin_crew'].extend(crew['cabin_crew'])
+            chef = next((c for c in crew['cabin_crew'] if c['attendant_type'] == 'CHEF'), None)
+            self.add_menu(chef)
+        else:
+            self.assign_pilots(flight_info, pools['pilots'])
+            self.assign_cabin_crew(flight_info, pools['attendants'])
+
+        if seat_passengers:
+            self.assign_passengers(flight_info, pools['passengers'], pools['plane_type'])
+        else:
+            self.seating_inputs = (flight_info, pools['passengers'], pools['plane_type'])
         
         return self.roster
 
-    def assign_pilots(self, flight_info):
+    def is_free(self, kind, person):
+        # Not rostered on another flight overlapping ours (rest gap included)
+        if self.window is None:
+            return True
+        return self.availability.is_free(kind, person['id'], *self.window, flight_id=self.flight_id)
+
+    def assign_pilots(self, flight_info, pilots):
         # Greedy Algorithm: Pick 1 Senior, 1 Junior who match the plane
-        all_pilots = fetch_api_data("pilots/pilots")
-        plane_name = flight_info['plane_type'] # e.g. "Boeing 737"
-        dist = flight_info['distance']
-        
-        candidates = [p for p in all_pilots if str(p['allowed_vehicle']) == str(plane_name) and p['allowed_range'] >= dist]
-        
-        seniors = [p for p in candidates if p['seniority'] == 'SENIOR']
-        juniors = [p for p in candidates if p['seniority'] == 'JUNIOR']
+        # pilots: {seniority: [...]} from the provider, already only those
+        # allowed on this plane this far, shortest range first
+        # First pilot of each seniority who is free for this flight's time window
+        senior = next((p for p in pilots.get('SENIOR', []) if self.is_free(PILOT, p)), None)
+        junior = next((p for p in pilots.get('JUNIOR', []) if self.is_free(PILOT, p)), None)
 
         # We need at least 1 Senior and 1 Junior
-        if seniors and juniors:
-            self.roster['pilots'].append(seniors[0])
-            self.roster['pilots'].append(juniors[0])
+        if senior and junior:
+            self.roster['pilots'].append(senior)
+            self.roster['pilots'].append(junior)
 
-    def assign_cabin_crew(self, flight_info):
+    def assign_cabin_crew(self, flight_info, all_crew):
         # Logic: 1 Chief, Regulars, 1 Chef
-        all_crew = fetch_api_data("cabin-crew/attendants")
         plane_name = flight_info['plane_type']
 
         # Filter by vehicle type
-        # Note: allowed_vehicles is a list, so we check if plane_name is IN that list
-        candidates = [c for c in all_crew if str(plane_name) in str(c['allowed_vehicles'])]
+        # Note: allowed_vehicles is a list of ids, so we check if plane_name is IN that list
+        # (a real membership test, "1" in "[11, 21]" used to match too)
+        # ...and not already flying somewhere else at the time
+        candidates = (c for c in all_crew if plane_name in c['allowed_vehicles'] and self.is_free(ATTENDANT, c))
 
-        chiefs = [c for c in candidates if c['attendant_type'] == 'CHIEF']
-        regulars = [c for c in candidates if c['attendant_type'] == 'REGULAR']
-        chefs = [c for c in candidates if c['attendant_type'] == 'CHEF']
+        chief = None
+        regulars = []
+        chef = None
+        for c in candidates:
+            if c['attendant_type'] == 'CHIEF' and chief is None:
+                chief = c
+            elif c['attendant_type'] == 'REGULAR' and len(regulars) < 4:
+                regulars.append(c)
+            elif c['attendant_type'] == 'CHEF' and chef is None:
+                chef = c
+            if chief and chef and len(regulars) == 4:
+                break
 
         # Add 1 Chief
-        if chiefs:
-            self.roster['cabin_crew'].append(chiefs[0])
+        if chief:
+            self.roster['cabin_crew'].append(chief)
         
         # Add Regulars (Let's say 4 for MVP)
-        self.roster['cabin_crew'].extend(regulars[:4])
+        self.roster['cabin_crew'].extend(regulars)
 
         # Add 1 Chef and their random recipe
-        if chefs:
-            chef = chefs[0]
+        if chef:
             self.roster['cabin_crew'].append(chef)
-            # Add a random recipe from this chef to the menu
-            if chef.get('recipes'):
-                self.roster['menu'].append(random.choice(chef['recipes']))
-
-    def assign_passengers(self, flight_info):
-        # ... (keep the first part where you get passengers and helper vars) ...
-        # (This part stays the same)
-        all_passengers = fetch_api_data("passengers/passengers")
-        flight_db_id = flight_info['id'] 
-        my_passengers = [p for p in all_passengers if p['flight'] == flight_db_id]
-
-        rows = 20
-        cols = "ABCDEF"
-        all_seats = [f"{r+1}{c}" for r in range(rows) for c in cols]
-        
-        assigned_seats = []
-        for p in my_passengers:
+        self.add_menu(chef)
+
+    def add_menu(self, chef):
+        # Add a random recipe from this chef to the menu
+        if chef and chef.get('recipes'):
+            self.roster['menu'].append(self.random.choice(chef['recipes']))
+
+    def assign_passengers(self, flight_info, all_passengers, plane_type=None):
+        passengers, seat_map = seat_passengers(flight_info, all_passengers, plane_type)
+        self.seat_map.update(seat_map)
+        self.roster['passengers'].extend(passengers)
+
+def generate_and_store(flight_id):
+    """
+    Generate one flight's roster and save it, reusing the stored one when
+    its inputs haven't changed. Returns (roster_data, generator); roster_data
+    holds "error" if the flight is unknown or an upstream service is down.
+    """
+    stored = FlightRoster.objects.filter(flight_id=flight_id).first()
+    # Before the pools are read: a change racing the generation makes the
+    # stamp stale (a full check next time), never the fingerprint
+    stamp = inputs_stamp(flight_id) or ''
+    for _ in range(BOOKING_ATTEMPTS):
+        generator = RosterGenerator(flight_id)
+        roster_data = generator.generate(previous=stored)
+
+        if "error" in roster_data:
+            return roster_data, generator
+
+        # Save to Database (document + assignment rows), only when something actually changed
+        if generator.reused:
+            roster_data = load_roster(stored)
+            if stored.inputs_stamp != stamp:
+                FlightRoster.objects.filter(id=stored.id).update(inputs_stamp=stamp)
+            return roster_data, generator
+        try:
+            save_roster(flight_id, roster_data, generator.fingerprint, generator.window, stamp)
+        except DoubleBooked:
+            # Another worker rostered some of this crew on an overlapping
+            # flight since our index last looked: catch up and pick again
+            availability_index.rebuild()
+            continue
+        return roster_data, generator
+    return {"error": "Crew availability keeps changing, try again", "conflict": True}, generator
+
+def seat_passengers(flight_info, all_passengers, plane_type=None):
+    """
+    Seat one flight's passengers. Returns (passengers with seat numbers,
+    {seat: name}). Plain data in and out, so batch generation can run it
+    in worker processes.
+    """
+    flight_db_id = flight_info['id'] 
+    # Copies, because we write seat numbers into them below
+    my_passengers = [dict(p) for p in all_passengers if p['flight'] == flight_db_id]
+    seat_map = {}
+
+    # The plane's real seat map (compiled once per layout and shared),
+    # with a bitmap of taken seats for this flight
+    seats = SeatAllocator(get_seat_map(plane_type))
+
+    for p in my_passengers:
+        if p.get('seat_number'):
+            seats.reserve(p['seat_number'])
+            seat_map[p['seat_number']] = p['name']
+
+    # Families and affiliated passengers sit together: seat the biggest groups
+    # first while the cabin still has long runs of free seats, singles last.
+    groups = group_passengers(my_passengers)
+    groups.sort(key=len, reverse=True)
+
+    for group in groups:
+        needs_seat = {}
+        for p in group:
             if p.get('seat_number'):
-                assigned_seats.append(p['seat_number'])
-                self.seat_map[p['seat_number']] = p['name']
-        
-        available_seats = [s for s in all_seats if s not in assigned_seats]
-
-        # --- THE FIX STARTS HERE ---
-        for p in my_passengers:
-            if not p.get('seat_number'):
-                # STRICTER CHECK: Must have a parent AND be a baby (age <= 2)
-                if p.get('parent') and p.get('age', 99) <= 2:
-                    p['seat_number'] = "LAP"
-                else:
-                    # It's an adult (or older child) who needs a seat
-                    if available_seats:
-                        new_seat = available_seats.pop(0)
-                        p['seat_number'] = new_seat
-                        self.seat_map[new_seat] = p['name']
-            
-            self.roster['passengers'].append(p)
\ No newline at end of file
+                continue
+            # STRICTER CHECK: Must have a parent AND be a baby (age <= 2)
+            if p.get('parent') and p.get('age', 99) <= 2:
+                p['seat_number'] = "LAP"
+            else:
+                # It's an adult (or older child) who needs a seat in their own cabin
+                needs_seat.setdefault(p.get('seat_type'), []).append(p)
+
+        for seat_type, members in needs_seat.items():
+            # None for anyone left over when the cabin is full (seat_capacity is enforced by the map)
+            labels = seats.allocate_together(seat_type, len(members))
+            for p, new_seat in zip(members, labels):
+                p['seat_number'] = new_seat
+                if new_seat:
+                    seat_map[new_seat] = p['name']
+
+    return my_passengers, seat_map
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from skycrewApp.batch import InvalidWindow, departure_window, generate_batch, parse_window
+from skycrewApp.coalesce import Saturated
+
+
+class Command(BaseCommand):
+    help = "Generate rosters for a list of flights or every flight departing in a time window."
+
+    def add_arguments(self, parser):
+        parser.add_argument('flight_ids', nargs='*', help="Flight numbers, e.g. SC1001 SC1002")
+        parser.add_argument('--hours', type=float, help="Every flight departing in the next N hours")
+        parser.add_argument('--start', help="Window start (ISO 8601)")
+        parser.add_argument('--end', help="Window end (ISO 8601)")
+        parser.add_argument('--workers', type=int, help="Worker processes (default: SKYCREW_BATCH_WORKERS or CPU count)")
+        parser.add_argument('--optimize', action='store_true', help="Assign the crew of all the flights jointly")
+        parser.add_argument('--time-limit', type=float, help="Optimizer budget in seconds (default: SKYCREW_OPTIMIZER_TIME_LIMIT)")
+
+    def handle(self, *args, **options):
+        flight_ids = options['flight_ids'] or None
+        start = end = None
+
+        if options['hours'] is not None:
+            try:
+                start, end = departure_window(options['hours'])
+            except ValueError as e:
+                raise CommandError(f"--{e}")
+        else:
+            try:
+                start, end = parse_window(options['start'], options['end'])
+            except InvalidWindow as e:
+                raise CommandError(f"--{e}")
+
+        if not flight_ids and start is None and end is None:
+            raise CommandError("Give flight numbers, --hours or a --start/--end window")
+
+        try:
+            report = generate_batch(
+                flight_ids=flight_ids, start=start, end=end, workers=options['workers'],
+                optimize=options['optimize'], time_limit=options['time_limit'],
+            )
+        except Saturated as e:
+            raise CommandError(str(e))
+
+        for result in report['results']:
+            if result['status'] != 'ok':
+                self.stderr.write(f"{result['flight_id']}: {result['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {report['generated']} of {report['requested']} rosters "
+            f"({report['unchanged']} unchanged, {report['failed']} failed)"
+        ))
+        if 'optimizer' in report:
+            optimizer = report['optimizer']
+            self.stdout.write(
+                f"Optimizer: {optimizer['covered']}/{optimizer['slots']} crew slots filled, "
+                f"objective {optimizer['objective']}, {optimizer['solve_time']}s "
+                f"({optimizer['greedy_windows']} of {optimizer['windows']} windows greedy)"
+            )
@@ -0,0 +1,56 @@
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from skycrewApp.jobs import CONCURRENCY, claim_job, run_job
+
+
+def _run(job):
+    # Worker threads each get their own DB connection; don't leave it open between jobs
+    try:
+        return run_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Drain the roster job queue (jobs queued by POST /main/generate/<flight_id>/)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=CONCURRENCY, help="Jobs this worker runs at once")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        threads = max(1, options['threads'])
+        self.stdout.write(f"Roster worker {worker} running {threads} job(s) at a time")
+
+        done = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                while True:
+                    job = claim_job(worker) if len(running) < threads else None
+                    if job is not None:
+                        running.add(pool.submit(_run, job))
+                        continue
+                    if running:
+                        finished, running = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            job = future.result()
+                            done += 1
+                            self.stdout.write(f"{job.flight_id}: {job.status} {job.error}".rstrip())
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+            except KeyboardInterrupt:
+                # Stop claiming, let the running jobs finish
+                self.stdout.write("Stopping, waiting for running jobs")
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} job(s)"))
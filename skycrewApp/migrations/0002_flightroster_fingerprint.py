@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skycrewApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightroster',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
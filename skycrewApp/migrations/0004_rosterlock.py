@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skycrewApp', '0003_rosterjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RosterLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flight_id', models.CharField(max_length=10, unique=True)),
+                ('owner', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skycrewApp', '0004_rosterlock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RosterAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PILOT', 'Pilot'), ('ATTENDANT', 'Attendant'), ('PASSENGER', 'Passenger')], max_length=10)),
+                ('person_id', models.IntegerField()),
+                ('role', models.CharField(blank=True, default='', max_length=10)),
+                ('seat', models.CharField(blank=True, max_length=5, null=True)),
+                ('position', models.IntegerField()),
+                ('roster', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='skycrewApp.flightroster')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'person_id'], name='skycrewApp__kind_2a8133_idx')],
+                'constraints': [models.UniqueConstraint(fields=('roster', 'kind', 'person_id'), name='unique_roster_person')],
+            },
+        ),
+    ]
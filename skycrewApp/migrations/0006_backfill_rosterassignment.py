@@ -0,0 +1,45 @@
+from django.db import migrations
+
+SECTIONS = [
+    ('pilots', 'PILOT', 'seniority'),
+    ('cabin_crew', 'ATTENDANT', 'attendant_type'),
+    ('passengers', 'PASSENGER', 'seat_type'),
+]
+
+
+def backfill(apps, schema_editor):
+    # Assignment rows for rosters stored before the table existed; their
+    # roster_data stays as it is (documents with a "pilots" key are served as is)
+    FlightRoster = apps.get_model('skycrewApp', 'FlightRoster')
+    RosterAssignment = apps.get_model('skycrewApp', 'RosterAssignment')
+    rows = []
+    for roster_id, roster_data in FlightRoster.objects.values_list('id', 'roster_data').iterator():
+        for section, kind, role_field in SECTIONS:
+            seen = set()
+            for position, person in enumerate(roster_data.get(section) or []):
+                if person.get('id') is None or person['id'] in seen:
+                    continue
+                seen.add(person['id'])
+                rows.append(RosterAssignment(
+                    roster_id=roster_id,
+                    kind=kind,
+                    person_id=person['id'],
+                    role=person.get(role_field) or '',
+                    seat=person.get('seat_number') if kind == 'PASSENGER' else None,
+                    position=position,
+                ))
+        if len(rows) >= 5000:
+            RosterAssignment.objects.bulk_create(rows)
+            rows = []
+    RosterAssignment.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skycrewApp', '0005_rosterassignment'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skycrewApp', '0007_tombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flightroster',
+            name='inputs_stamp',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
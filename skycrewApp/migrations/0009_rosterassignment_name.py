@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+PEOPLE = [
+    ('PILOT', 'PilotApi', 'Pilot'),
+    ('ATTENDANT', 'CabinCrewApi', 'Attendant'),
+    ('PASSENGER', 'PassengerApi', 'Passenger'),
+]
+
+
+def backfill(apps, schema_editor):
+    # Names of the people still there; rows of anyone deleted already stay ''
+    RosterAssignment = apps.get_model('skycrewApp', 'RosterAssignment')
+    for kind, app_label, model_name in PEOPLE:
+        Person = apps.get_model(app_label, model_name)
+        ids = list(RosterAssignment.objects.filter(kind=kind).values_list('person_id', flat=True).distinct())
+        for start in range(0, len(ids), 500):
+            names = dict(Person.objects.filter(id__in=ids[start:start + 500]).values_list('id', 'name'))
+            for person_id, name in names.items():
+                RosterAssignment.objects.filter(kind=kind, person_id=person_id).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skycrewApp', '0008_flightroster_inputs_stamp'),
+        ('PilotApi', '0003_pilot_updated_at'),
+        ('CabinCrewApi', '0003_attendant_updated_at_recipe_updated_at'),
+        ('PassengerApi', '0002_passenger_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rosterassignment',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
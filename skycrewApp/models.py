@@ -13,5 +13,127 @@ class FlightRoster(models.Model):
     # effectively as a document. This makes the "Export to JSON" requirement trivial.
     roster_data = models.JSONField()
 
+    # Hash of everything the roster was built from (flight, plane, candidate pools).
+    # Same inputs -> same fingerprint, so the stored roster can be served as is.
+    # Also used as the ETag of /main/generate/<flight_id>/.
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+
+    # logic.inputs_stamp() taken before the pools behind the fingerprint were
+    # read: while it still matches, so does the fingerprint, and a conditional
+    # GET is answered without reading the pools. Empty when unknown (batch, repair).
+    inputs_stamp = models.CharField(max_length=64, blank=True, default='')
+
+    def __str__(self):
+        return f"Roster for {self.flight_id}"
+
+
+class RosterAssignment(models.Model):
+    # One person on one roster, so "which flights is pilot 42 on" is an index
+    # lookup instead of parsing every roster_data document. The roster JSON is
+    # assembled from these rows (see skycrewApp.rosters).
+    PILOT = 'PILOT'
+    ATTENDANT = 'ATTENDANT'
+    PASSENGER = 'PASSENGER'
+    KIND_CHOICES = [
+        (PILOT, 'Pilot'),
+        (ATTENDANT, 'Attendant'),
+        (PASSENGER, 'Passenger'),
+    ]
+
+    roster = models.ForeignKey(FlightRoster, on_delete=models.CASCADE, related_name='assignments')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Pilot / Attendant / Passenger id (plain ints, like FlightRoster.flight_id
+    # these live in other services)
+    person_id = models.IntegerField()
+    # Seniority, attendant_type or seat_type
+    role = models.CharField(max_length=10, blank=True, default='')
+    # Taken when the roster is stored, so someone deleted since still shows
+    # up on it (see rosters.assemble)
+    name = models.CharField(max_length=100, blank=True, default='')
+    # Passengers only: the seat given on this flight ("LAP" for infants, null if none left)
+    seat = models.CharField(max_length=5, blank=True, null=True)
+    # Order within its section of the roster document
+    position = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'person_id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['roster', 'kind', 'person_id'], name='unique_roster_person'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.person_id} on {self.roster_id}"
+
+class RosterJob(models.Model):
+    # One queued roster generation, drained by `manage.py roster_worker`.
+    # The table is the queue: no broker, workers claim rows with a conditional UPDATE.
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    flight_id = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Which worker picked it up, and how many times (a crashed worker's job is retried)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Workers take the oldest pending job first
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            # At most one pending job per flight: submitting again joins the queued one
+            models.UniqueConstraint(
+                fields=['flight_id'],
+                condition=models.Q(status='PENDING'),
+                name='unique_pending_roster_job',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Roster job {self.id} for {self.flight_id} ({self.status})"
+
+
+class RosterLock(models.Model):
+    # "A worker is generating this flight's roster right now." Other workers wait
+    # for the row to go away instead of generating the same roster in parallel,
+    # and the number of owners is how many generations are running in total
+    # (skycrewApp.coalesce; a batch holds one row per flight under one owner).
+    flight_id = models.CharField(max_length=10, unique=True)
+    owner = models.CharField(max_length=100)
+    # A crashed worker never deletes its row; past this it no longer counts
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Roster lock for {self.flight_id} ({self.owner})"
+
+
+class Tombstone(models.Model):
+    # A deleted Flight/Airport/PlaneType/Pilot/Attendant/Recipe/Passenger, so
+    # ?since= sync clients (skycrew.sync) learn about deletes too. Kept for
+    # SKYCREW_SYNC_RETENTION; older tokens get a full snapshot instead.
+    resource = models.CharField(max_length=50)
+    object_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at']),
+        ]
+
     def __str__(self):
-        return f"Roster for {self.flight_id}"
\ No newline at end of file
+        return f"{self.resource} {self.object_id} deleted {self.deleted_at}"
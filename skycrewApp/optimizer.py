@@ -0,0 +1,314 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from .availability import ATTENDANT, MIN_REST, PILOT, Bookings, flight_window
+
+# Wall-clock budget for a whole solve, seconds; unfinished windows go greedy
+TIME_LIMIT = getattr(settings, 'SKYCREW_OPTIMIZER_TIME_LIMIT', 30)
+
+# A window holds at most this many flights, so each assignment stays small
+MAX_WINDOW_FLIGHTS = 40
+
+# Covering a slot is worth this much (times the flight's weight); the
+# secondary costs below are all in [0, 1] so coverage always wins
+COVER_REWARD = 10.0
+
+# Stand-in for "not allowed" in the cost matrix
+FORBIDDEN = 1e9
+
+# Regulars per flight when crew_limit leaves room (same as the greedy roster)
+MAX_REGULARS = 4
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def optimize_crew(flights, plane_types, pilots, attendants, busy=None, time_limit=None, workers=None):
+    """
+    Assign crew to a whole set of flights (e.g. an operating day) jointly.
+
+    Flights are swept in departure order in windows of flights that depart
+    while the first one is still flying. Within a window every free,
+    eligible crew member can take one slot, and the slots are filled by a
+    min-cost assignment (Hungarian method):
+      - covering a slot earns COVER_REWARD weighted by flight duration, so
+        scarce senior pilots and chefs go to the long flights,
+      - pilots pay for unused range (no long-haul pilot on a short hop),
+      - attendants pay for flexibility (keep multi-type crew for later).
+    A flight left with a single pilot flies with none, so the window is
+    solved again without it and that pilot can go elsewhere.
+    Pilots of different plane types never compete, so each plane type is
+    solved in its own process next to one process for the cabin crew.
+    A window that runs past the time limit is filled greedily instead.
+
+    flights/plane_types/pilots/attendants are API-shaped dicts, busy maps
+    (kind, id) -> [(start, end)] of duties outside this set. Returns
+    ({flight_number: {"pilots": [...], "cabin_crew": [...]}}, report).
+    """
+    started = time.monotonic()
+    deadline = started + (TIME_LIMIT if time_limit is None else time_limit)
+    busy = busy or {}
+
+    crew_limits = {p['id']: p['crew_limit'] for p in plane_types}
+    slim_flights = []
+    for f in flights:
+        start, end = flight_window(f)
+        slim_flights.append({
+            'flight_number': f['flight_number'], 'plane_type': f['plane_type'],
+            'distance': f['distance'], 'start': start, 'end': end,
+            'crew_limit': crew_limits.get(f['plane_type']),
+        })
+    slim_flights.sort(key=lambda f: (f['start'], f['flight_number']))
+
+    tasks = []
+    for plane_type in sorted({f['plane_type'] for f in slim_flights}):
+        group = [p for p in pilots if p['allowed_vehicle'] == plane_type]
+        tasks.append({
+            'kind': PILOT,
+            'flights': [f for f in slim_flights if f['plane_type'] == plane_type],
+            'crew': group,
+            'busy': {p['id']: busy.get((PILOT, p['id']), []) for p in group},
+            'deadline': deadline,
+        })
+    tasks.append({
+        'kind': ATTENDANT,
+        'flights': slim_flights,
+        'crew': attendants,
+        'busy': {a['id']: busy.get((ATTENDANT, a['id']), []) for a in attendants},
+        'deadline': deadline,
+    })
+
+    if workers is None:
+        workers = getattr(settings, 'SKYCREW_BATCH_WORKERS', None) or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        # spawn, not fork: the caller may be a web worker with threads running
+        # (same as the batch pool); the tasks are plain dicts so nothing needs Django
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            outcomes = list(pool.map(_solve_task, tasks))
+    else:
+        outcomes = [_solve_task(task) for task in tasks]
+
+    pilots_by_id = {p['id']: p for p in pilots}
+    attendants_by_id = {a['id']: a for a in attendants}
+    assignment = {f['flight_number']: {"pilots": [], "cabin_crew": []} for f in slim_flights}
+    report = {"objective": 0.0, "windows": 0, "greedy_windows": 0, "slots": 0, "covered": 0}
+    for task, (chosen, stats) in zip(tasks, outcomes):
+        people = pilots_by_id if task['kind'] == PILOT else attendants_by_id
+        key = "pilots" if task['kind'] == PILOT else "cabin_crew"
+        for flight_number, ids in chosen.items():
+            assignment[flight_number][key] = [people[i] for i in ids]
+        for name in report:
+            report[name] += stats[name]
+
+    report["objective"] = round(report["objective"], 4)
+    report["solve_time"] = round(time.monotonic() - started, 3)
+    return assignment, report
+
+
+def required_roles(kind, flight):
+    # The roles a flight needs, in the order they appear on the roster
+    if kind == PILOT:
+        return ['SENIOR', 'JUNIOR']
+    limit = flight['crew_limit']
+    if limit is None:
+        return ['CHIEF'] + ['REGULAR'] * MAX_REGULARS + ['CHEF']
+    # crew_limit caps the cabin crew: chief first, then the chef, then regulars
+    if limit < 2:
+        return ['CHIEF'] * max(0, limit)
+    return ['CHIEF'] + ['REGULAR'] * min(MAX_REGULARS, limit - 2) + ['CHEF']
+
+
+def _role(kind, person):
+    return person['seniority'] if kind == PILOT else person['attendant_type']
+
+
+def _eligible(kind, person, flight):
+    if kind == PILOT:
+        return person['allowed_vehicle'] == flight['plane_type'] and person['allowed_range'] >= flight['distance']
+    return flight['plane_type'] in person['allowed_vehicles']
+
+
+def _windows(flights):
+    # Flights departing while the window's first flight is still in the air
+    window = []
+    for flight in flights:
+        if window and (flight['start'] >= window[0]['end'] + MIN_REST or len(window) >= MAX_WINDOW_FLIGHTS):
+            yield window
+            window = []
+        window.append(flight)
+    if window:
+        yield window
+
+
+def _is_free(booked, start, end):
+    return booked is None or booked.is_clear(start, end, MIN_REST)
+
+
+def _solve_task(task):
+    kind = task['kind']
+    crew = task['crew']
+    busy = {i: Bookings(intervals) for i, intervals in task['busy'].items()}
+    longest = max((f['end'] - f['start'] for f in task['flights']), default=0) or 1
+    if kind == PILOT:
+        max_range = max((p['allowed_range'] for p in crew), default=0) or 1
+    else:
+        max_types = max((len(a['allowed_vehicles']) for a in crew), default=0) or 1
+
+    def cost(person, flight):
+        weight = 1 + (flight['end'] - flight['start']) / longest
+        if kind == PILOT:
+            waste = (person['allowed_range'] - flight['distance']) / max_range
+        else:
+            waste = (len(person['allowed_vehicles']) - 1) / max_types
+        return -COVER_REWARD * weight + waste
+
+    by_role = {}
+    for person in crew:
+        by_role.setdefault(_role(kind, person), []).append(person)
+
+    chosen = {}
+    stats = {"objective": 0.0, "windows": 0, "greedy_windows": 0, "slots": 0, "covered": 0}
+    for window in _windows(task['flights']):
+        stats["windows"] += 1
+        # Slots of flights dropped below still count as required
+        stats["slots"] += sum(len(required_roles(kind, flight)) for flight in window)
+        went_greedy = False
+        while True:
+            slots = [(flight, role) for flight in window for role in required_roles(kind, flight)]
+            # Candidate columns and costs per slot (eligible + free for that flight)
+            options = []
+            for flight, role in slots:
+                row = {}
+                for person in by_role.get(role, []):
+                    if _eligible(kind, person, flight) and _is_free(busy.get(person['id']), flight['start'], flight['end']):
+                        row[person['id']] = cost(person, flight)
+                options.append(row)
+
+            picks = None
+            if not went_greedy and time.monotonic() < task['deadline']:
+                try:
+                    picks = _assign_optimal(options, task['deadline'])
+                except _OutOfTime:
+                    picks = None
+            if picks is None:
+                went_greedy = True
+                picks = _assign_greedy(options)
+
+            window_choice = {}
+            candidates = {}  # flight -> candidates of its empty slot
+            for (flight, role), person_id, row in zip(slots, picks, options):
+                if person_id is None:
+                    candidates[flight['flight_number']] = len(row)
+                else:
+                    window_choice.setdefault(flight['flight_number'], []).append((role, person_id, row[person_id]))
+
+            # A flight needs both a senior and a junior pilot or nobody at all.
+            # Take out the half-crewed flights that can never be filled, or else
+            # the one hardest to fill, and solve again so the pilot can go elsewhere
+            half_crewed = [number for number, picked in window_choice.items() if kind == PILOT and len(picked) < 2]
+            if not half_crewed:
+                break
+            dropped = {number for number in half_crewed if not candidates[number]}
+            dropped = dropped or {min(half_crewed, key=candidates.get)}
+            window = [flight for flight in window if flight['flight_number'] not in dropped]
+
+        if went_greedy:
+            stats["greedy_windows"] += 1
+        for flight in window:
+            picked = window_choice.get(flight['flight_number'], [])
+            for role, person_id, value in picked:
+                busy.setdefault(person_id, Bookings()).add((flight['start'], flight['end']))
+                stats["covered"] += 1
+                stats["objective"] += value
+            if picked:
+                chosen[flight['flight_number']] = [person_id for _, person_id, _ in picked]
+
+    return chosen, stats
+
+
+def _assign_greedy(options):
+    # Fallback: slots in order, each takes its cheapest still unused candidate
+    used = set()
+    picks = []
+    for row in options:
+        best = min((i for i in row if i not in used), key=row.get, default=None)
+        if best is not None:
+            used.add(best)
+        picks.append(best)
+    return picks
+
+
+def _assign_optimal(options, deadline):
+    # Min-cost assignment of slots (rows) to crew (columns), leaving a slot empty costs 0.
+    # Only each slot's n cheapest candidates can appear in an optimal answer, so
+    # the other columns are dropped before solving.
+    n = len(options)
+    if not n:
+        return []
+    columns = {}
+    for row in options:
+        for person_id in sorted(row, key=row.get)[:n]:
+            columns.setdefault(person_id, len(columns))
+    ids = list(columns)
+    width = len(ids) + n  # one "leave empty" column per slot
+    matrix = []
+    for r, row in enumerate(options):
+        line = [FORBIDDEN] * width
+        for person_id, value in row.items():
+            if person_id in columns:
+                line[columns[person_id]] = value
+        line[len(ids) + r] = 0.0
+        matrix.append(line)
+
+    result = _hungarian(matrix, deadline)
+    return [ids[c] if c < len(ids) else None for c in result]
+
+
+def _hungarian(cost, deadline):
+    # Hungarian method with potentials (shortest augmenting paths), n rows <= m
+    # columns. Each step scans every column, so those scans run in NumPy
+    cost = np.asarray(cost, dtype=np.float64)
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.int64)  # column -> row, 1-based; 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        if time.monotonic() > deadline:
+            raise _OutOfTime
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            current = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (current < minv[1:])
+            minv[1:][better] = current[better]
+            way[1:][better] = j0
+            reachable = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(reachable)) + 1
+            delta = reachable[j1 - 1]
+            u[match[used]] += delta  # used columns hold distinct rows
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    result = [0] * n
+    for j in np.flatnonzero(match[1:]) + 1:
+        result[match[j] - 1] = int(j) - 1
+    return result
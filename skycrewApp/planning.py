@@ -0,0 +1,184 @@
+import time
+
+import numpy as np
+
+from FlightInfoApi.models import Flight
+from PilotApi.models import Pilot
+from CabinCrewApi.models import Attendant
+from .availability import ATTENDANT, PILOT
+from .optimizer import required_roles
+
+# Every role a roster slot can ask for; a crew member's role is an index into this
+ROLES = [choice for choice, _ in Pilot.SENIORITY_CHOICES] + [choice for choice, _ in Attendant.TYPE_CHOICES]
+
+
+def parse_languages(value):
+    # known_languages is free text: "English, French" -> {"english", "french"}
+    return {part.strip().lower() for part in (value or '').split(',') if part.strip()}
+
+
+class CrewMatrix:
+    """
+    The crew pool as columns (one row per pilot or attendant):
+
+      kinds      0 = pilot, 1 = attendant
+      roles      index into ROLES (seniority or attendant_type)
+      planes     bool M x P, plane types each person may work on
+                 (one-hot for pilots, any number for attendants)
+      ranges     allowed_range, +inf for attendants
+      languages  uint64 M x W bitmask over self.language_bits
+
+    so eligibility for a block of flights is a handful of broadcast
+    comparisons instead of a Python loop per flight and crew member.
+    """
+
+    def __init__(self, pilots, attendants):
+        # pilots: (id, plane type id, allowed_range, seniority, known_languages)
+        # attendants: (id, attendant_type, known_languages, [plane type ids])
+        people = [(PILOT, p[0], [p[1]], p[2], p[3], p[4]) for p in pilots]
+        people += [(ATTENDANT, a[0], a[3], np.inf, a[1], a[2]) for a in attendants]
+
+        self.plane_columns = {}
+        self.language_bits = {}
+        spoken = []
+        for _, _, planes, _, _, known_languages in people:
+            for plane_type in planes:
+                self.plane_columns.setdefault(plane_type, len(self.plane_columns))
+            languages = parse_languages(known_languages)
+            for language in sorted(languages):
+                self.language_bits.setdefault(language, len(self.language_bits))
+            spoken.append(languages)
+
+        size = len(people)
+        words = max(1, (len(self.language_bits) + 63) // 64)
+        self.kinds = np.array([kind == ATTENDANT for kind, *_ in people], dtype=np.int8)
+        self.ids = np.array([person[1] for person in people], dtype=np.int64)
+        self.roles = np.array([ROLES.index(person[4]) for person in people], dtype=np.int8)
+        self.ranges = np.array([person[3] for person in people], dtype=np.float64)
+        self.planes = np.zeros((size, max(1, len(self.plane_columns))), dtype=bool)
+        self.languages = np.zeros((size, words), dtype=np.uint64)
+        for row, person in enumerate(people):
+            for plane_type in person[2]:
+                self.planes[row, self.plane_columns[plane_type]] = True
+            for language in spoken[row]:
+                bit = self.language_bits[language]
+                self.languages[row, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    @classmethod
+    def load(cls):
+        # Straight from the tables: three flat queries, no serializers
+        pilots = Pilot.objects.values_list(
+            'id', 'allowed_vehicle_id', 'allowed_range', 'seniority', 'known_languages'
+        ).order_by('id')
+        planes = {}
+        for attendant_id, plane_type in Attendant.allowed_vehicles.through.objects.values_list('attendant_id', 'planetype_id'):
+            planes.setdefault(attendant_id, []).append(plane_type)
+        attendants = [
+            (attendant_id, attendant_type, known_languages, planes.get(attendant_id, []))
+            for attendant_id, attendant_type, known_languages in
+            Attendant.objects.values_list('id', 'attendant_type', 'known_languages').order_by('id')
+        ]
+        return cls(pilots, attendants)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def language_mask(self, languages):
+        # Bitmask of the languages every candidate must speak, None if nobody speaks one of them
+        mask = np.zeros(self.languages.shape[1], dtype=np.uint64)
+        for language in parse_languages(','.join(languages)):
+            bit = self.language_bits.get(language)
+            if bit is None:
+                return None
+            mask[bit // 64] |= np.uint64(1 << (bit % 64))
+        return mask
+
+    def eligibility(self, plane_types, distances, languages=()):
+        """
+        Bool matrix N flights x M crew: True where that person may work that
+        flight (plane type, allowed_range for pilots, and every language in
+        `languages`). plane_types/distances are per-flight sequences.
+        """
+        plane_types = np.asarray(plane_types)
+        distances = np.asarray(distances, dtype=np.float64)
+        # Plane types nobody is qualified for map to a column of all False
+        columns = np.array([self.plane_columns.get(int(p), -1) for p in plane_types], dtype=np.int64)
+        planes = np.concatenate([self.planes, np.zeros((len(self), 1), dtype=bool)], axis=1)
+        matrix = planes[:, columns].T & (self.ranges[None, :] >= distances[:, None])
+
+        if languages:
+            mask = self.language_mask(languages)
+            if mask is None:
+                return np.zeros_like(matrix)
+            speaks = ((self.languages & mask) == mask).all(axis=1)
+            matrix &= speaks[None, :]
+        return matrix
+
+    def candidate_counts(self, plane_types, distances, languages=()):
+        """
+        N flights x len(ROLES): how many eligible people of each role every
+        flight has. Same answer as summing eligibility() per role, but without
+        the N x M matrix: per (plane type, role) the ranges are sorted once
+        and each flight's count is a vectorized searchsorted.
+        """
+        plane_types = np.asarray(plane_types)
+        distances = np.asarray(distances, dtype=np.float64)
+        counts = np.zeros((len(plane_types), len(ROLES)), dtype=np.int64)
+
+        keep = np.ones(len(self), dtype=bool)
+        if languages:
+            mask = self.language_mask(languages)
+            if mask is None:
+                return counts
+            keep = ((self.languages & mask) == mask).all(axis=1)
+
+        columns = np.array([self.plane_columns.get(int(p), -1) for p in plane_types], dtype=np.int64)
+        for column in np.unique(columns[columns >= 0]):
+            flights = columns == column
+            on_plane = keep & self.planes[:, column]
+            for role in np.unique(self.roles[on_plane]):
+                ranges = np.sort(self.ranges[on_plane & (self.roles == role)])
+                counts[flights, role] = len(ranges) - np.searchsorted(ranges, distances[flights], side='left')
+        return counts
+
+
+def staffing_report(flights=None, languages=(), understaffed_only=False, crew=None):
+    """
+    Candidate counts per role for every flight in `flights` (a Flight
+    queryset, default all), plus the roles each flight can't fill. A role
+    is short when fewer people are eligible than the roster needs; being
+    eligible doesn't mean free, so this is an upper bound on staffing.
+    """
+    started = time.monotonic()
+    if crew is None:
+        crew = CrewMatrix.load()
+    flights = flights if flights is not None else Flight.objects.all()
+    rows = list(
+        flights.order_by('departure_time', 'id')
+        .values_list('flight_number', 'plane_type_id', 'distance', 'plane_type__crew_limit')
+    )
+    counts = crew.candidate_counts(
+        np.array([row[1] for row in rows], dtype=np.int64),
+        np.array([row[2] for row in rows], dtype=np.float64),
+        languages,
+    )
+
+    results = []
+    for (flight_number, _, _, crew_limit), row in zip(rows, counts.tolist()):
+        candidates = dict(zip(ROLES, row))
+        needed = {}
+        for kind in (PILOT, ATTENDANT):
+            for role in required_roles(kind, {'crew_limit': crew_limit}):
+                needed[role] = needed.get(role, 0) + 1
+        short = [role for role, number in needed.items() if candidates[role] < number]
+        if understaffed_only and not short:
+            continue
+        results.append({"flight_id": flight_number, "candidates": candidates, "short": short})
+
+    return {
+        "flights": len(rows),
+        "crew": len(crew),
+        "understaffed": sum(1 for r in results if r["short"]),
+        "elapsed": round(time.monotonic() - started, 4),
+        "results": results,
+    }
@@ -0,0 +1,211 @@
+from django.conf import settings
+
+from skycrew.refcache import reference_cache
+
+from FlightInfoApi.models import Flight, PlaneType
+from FlightInfoApi.serializers import FlightSerializer, PlaneTypeSerializer
+from PilotApi.models import Pilot
+from PilotApi.serializers import PilotSerializer
+from CabinCrewApi.models import Attendant
+from CabinCrewApi.serializers import AttendantSerializer
+from PassengerApi.models import Passenger
+from PassengerApi.serializers import PassengerSerializer
+from .eligibility import attendant_index, pilot_index
+from .upstream import fetch_api_data, fetch_api_object, run_concurrently
+
+
+def pilot_order(pilots):
+    # The order the eligibility index hands pilots out in: seniority, then
+    # shortest range first, then id. Every provider uses it, so the same data
+    # builds the same roster (and fingerprint) whichever one is configured.
+    seniorities = [choice for choice, _ in Pilot.SENIORITY_CHOICES]
+    return sorted(pilots, key=lambda p: (seniorities.index(p['seniority']), p['allowed_range'], p['id']))
+
+
+def pilot_buckets(pilots):
+    # {seniority: pilots in pilot_order}, every seniority present: the
+    # eligibility index's buckets, built from a flat list
+    buckets = {seniority: [] for seniority, _ in Pilot.SENIORITY_CHOICES}
+    for pilot in pilot_order(pilots):
+        buckets[pilot['seniority']].append(pilot)
+    return buckets
+
+
+def attendant_order(attendants):
+    # Likewise for attendants: attendant type, then id
+    types = [choice for choice, _ in Attendant.TYPE_CHOICES]
+    return sorted(attendants, key=lambda c: (types.index(c['attendant_type']), c['id']))
+
+class DataProvider:
+    """
+    Where the RosterGenerator gets its flights, crew and passengers from.
+    Every method returns plain dicts shaped exactly like the API JSON,
+    so the assign_* algorithms don't care which backend is in use.
+    """
+
+    def get_flight(self, flight_number):
+        raise NotImplementedError
+
+    def get_pilots(self, plane_type, min_range):
+        # {seniority: [pilot, ...]} of those allowed on the plane type this far, see pilot_buckets
+        raise NotImplementedError
+
+    def get_attendants(self, plane_type):
+        raise NotImplementedError
+
+    def get_passengers(self, flight):
+        raise NotImplementedError
+
+    def get_plane_type(self, plane_type):
+        raise NotImplementedError
+
+    def get_pools(self, flight_info):
+        # Everything the assigners need for one flight, keyed by pool name
+        return {
+            'plane_type': self.get_plane_type(flight_info['plane_type']),
+            'pilots': self.get_pilots(flight_info['plane_type'], flight_info['distance']),
+            'attendants': self.get_attendants(flight_info['plane_type']),
+            'passengers': self.get_passengers(flight_info['id']),
+        }
+
+
+class OrmDataProvider(DataProvider):
+    # Monolith mode: read straight from the models, no HTTP round trip.
+    # We still go through the API serializers so the dict shapes match.
+
+    def get_flight(self, flight_number):
+        flight = Flight.objects.filter(flight_number=flight_number).first()
+        if flight is None:
+            return None
+        return FlightSerializer(flight).data
+
+    def get_pilots(self, plane_type, min_range):
+        # Served from the eligibility index, no query per roster
+        return pilot_index.candidates(plane_type, min_range)
+
+    def get_attendants(self, plane_type):
+        # Served from the plane type -> attendants inverted index
+        return attendant_index.candidates(plane_type)
+
+    def get_passengers(self, flight):
+        passengers = (
+            Passenger.objects.filter(flight_id=flight)
+            .prefetch_related('affiliated_passengers')
+            .order_by('id')
+        )
+        return PassengerSerializer(passengers, many=True).data
+
+    def get_plane_type(self, plane_type):
+        # Reference data: one cached dict per plane type, so its parsed
+        # seating layout is shared by every roster (and get_seat_map's memo)
+        def fill():
+            plane = PlaneType.objects.filter(id=plane_type).first()
+            return PlaneTypeSerializer(plane).data if plane else None
+        data = reference_cache.load(PlaneType, ('object', plane_type), fill)
+        return dict(data) if data is not None else None
+
+
+class HttpDataProvider(DataProvider):
+    # Split-services mode: the apps live behind their own URLs.
+    # Filtering happens server side, so only the rows we need cross the wire.
+
+    def get_flight(self, flight_number):
+        flights = fetch_api_data("flight-info/flights", {'flight_number': flight_number})
+        return next((f for f in flights if f['flight_number'] == flight_number), None)
+
+    def get_pilots(self, plane_type, min_range):
+        # The service lists them by id
+        return pilot_buckets(fetch_api_data("pilots/pilots", {'allowed_vehicle': plane_type, 'min_range': min_range}))
+
+    def get_attendants(self, plane_type):
+        return attendant_order(fetch_api_data("cabin-crew/attendants", {'allowed_vehicle': plane_type}))
+
+    def get_passengers(self, flight):
+        return fetch_api_data("passengers/passengers", {'flight': flight})
+
+    def get_plane_type(self, plane_type):
+        return fetch_api_object("flight-info/planes", plane_type)
+
+    def get_pools(self, flight_info):
+        # The three lists don't depend on each other, so fetch them in parallel
+        return run_concurrently({
+            'plane_type': (self.get_plane_type, flight_info['plane_type']),
+            'pilots': (self.get_pilots, flight_info['plane_type'], flight_info['distance']),
+            'attendants': (self.get_attendants, flight_info['plane_type']),
+            'passengers': (self.get_passengers, flight_info['id']),
+        })
+
+
+class PreloadedDataProvider(DataProvider):
+    """
+    Serves everything from pools loaded up front (one query per resource).
+    Used by batch generation: the pools are loaded once for the whole batch
+    and the provider is shipped to worker processes, which never touch the DB.
+    """
+
+    def __init__(self, flights, plane_types, pilots, attendants, passengers):
+        self.flights = {f['flight_number']: f for f in flights}
+        self.plane_types = {p['id']: p for p in plane_types}
+        # So a batch builds exactly the roster (and fingerprint) a single request would
+        self.pilots = pilot_order(pilots)
+        self.attendants = attendant_order(attendants)
+        self.passengers = {}
+        for p in passengers:
+            self.passengers.setdefault(p['flight'], []).append(p)
+
+    @classmethod
+    def load(cls, flights):
+        # flights is a Flight queryset; pull only the crew/passengers those flights can use
+        flights = list(flights)
+        plane_types = {f.plane_type_id for f in flights}
+        pilots = Pilot.objects.filter(allowed_vehicle_id__in=plane_types).order_by('id')
+        crew = (
+            Attendant.objects.filter(allowed_vehicles__in=plane_types)
+            .distinct()
+            .prefetch_related('recipes', 'allowed_vehicles')
+            .order_by('id')
+        )
+        passengers = (
+            Passenger.objects.filter(flight__in=flights)
+            .prefetch_related('affiliated_passengers')
+            .order_by('id')
+        )
+        return cls(
+            FlightSerializer(flights, many=True).data,
+            PlaneTypeSerializer(PlaneType.objects.filter(id__in=plane_types), many=True).data,
+            PilotSerializer(pilots, many=True).data,
+            AttendantSerializer(crew, many=True).data,
+            PassengerSerializer(passengers, many=True).data,
+        )
+
+    def get_flight(self, flight_number):
+        return self.flights.get(flight_number)
+
+    def get_pilots(self, plane_type, min_range):
+        return pilot_buckets(
+            p for p in self.pilots if p['allowed_vehicle'] == plane_type and p['allowed_range'] >= min_range
+        )
+
+    def get_attendants(self, plane_type):
+        return [c for c in self.attendants if plane_type in c['allowed_vehicles']]
+
+    def get_passengers(self, flight):
+        return self.passengers.get(flight, [])
+
+    def get_plane_type(self, plane_type):
+        return self.plane_types.get(plane_type)
+
+
+PROVIDERS = {
+    'orm': OrmDataProvider,
+    'http': HttpDataProvider,
+}
+
+
+def get_provider(name=None):
+    # Monoliths default to the ORM backend, set SKYCREW_DATA_PROVIDER = 'http' when split
+    name = name or getattr(settings, 'SKYCREW_DATA_PROVIDER', 'orm')
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown data provider '{name}', expected one of {sorted(PROVIDERS)}")
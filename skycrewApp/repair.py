@@ -0,0 +1,390 @@
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+
+from FlightInfoApi.models import Flight
+from .availability import ATTENDANT, PILOT, DoubleBooked, availability_index, flight_window
+from .coalesce import Saturated, roster_lock
+from .logic import fingerprint_inputs
+from .models import FlightRoster, RosterAssignment
+from .providers import get_provider
+from .rosters import patch_roster
+from .seating import SeatAllocator, get_seat_map, group_passengers
+
+logger = logging.getLogger(__name__)
+
+PASSENGER = RosterAssignment.PASSENGER
+
+# Changes are collected for this long after the last one before rosters are
+# repaired (seconds), so a burst of edits costs one pass. 0 repairs on commit.
+DELAY = getattr(settings, 'SKYCREW_REPAIR_DELAY', 2)
+
+# ...but a steady trickle of edits never holds repairs back longer than this
+MAX_WAIT = 10 * DELAY
+
+CHUNK = 500
+
+# A batch that keeps hitting a locked database (or roster lock) is dropped after this many
+# retries in a row (those rosters regenerate on their next request instead)
+MAX_RETRIES = 5
+
+
+class RepairQueue:
+    """
+    Pending data changes, repaired in debounced batches by a background thread.
+
+    Signal handlers mark the people (kind, id) and flights that changed. The
+    RosterAssignment rows are the reverse index from a person to the rosters
+    they are on, so only those rosters are touched, and in each one only
+    the slots that no longer hold are refilled (see repair_roster). Repairs
+    live in this process only: if it exits with some still pending, those
+    rosters' fingerprints no longer match and the next request regenerates
+    them as before.
+    """
+
+    def __init__(self, delay=DELAY, max_wait=MAX_WAIT):
+        self.delay = delay
+        self.max_wait = max_wait
+        self.cond = threading.Condition()
+        self.thread = None
+        self.people = set()
+        self.flight_numbers = set()
+        self.flight_ids = set()
+        self.first_mark = self.last_mark = None
+        self.retries = 0
+        self.counts = {"runs": 0, "rosters": 0, "repaired": 0, "slots": 0, "removed": 0, "errors": 0}
+
+    def mark_people(self, kind, ids):
+        self._mark(people={(kind, person_id) for person_id in ids})
+
+    def mark_flights(self, flight_numbers=(), flight_ids=()):
+        # Flights by number (Flight saved/deleted) or db id (a passenger's flight)
+        self._mark(flight_numbers=set(flight_numbers), flight_ids=set(flight_ids))
+
+    def _mark(self, people=(), flight_numbers=(), flight_ids=()):
+        with self.cond:
+            self.people.update(people)
+            self.flight_numbers.update(flight_numbers)
+            self.flight_ids.update(flight_ids)
+            now = time.monotonic()
+            if self.first_mark is None:
+                self.first_mark = now
+            self.last_mark = now
+            if self.delay > 0:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._loop, name='roster-repair', daemon=True)
+                    self.thread.start()
+                self.cond.notify()
+                return
+        self.flush()
+
+    def _take(self):
+        batch = (self.people, self.flight_numbers, self.flight_ids)
+        self.people, self.flight_numbers, self.flight_ids = set(), set(), set()
+        self.first_mark = self.last_mark = None
+        return batch
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while self.first_mark is None:
+                    self.cond.wait()
+                # Quiet for `delay`, or waiting for `max_wait` already
+                while True:
+                    due = min(self.last_mark + self.delay, self.first_mark + self.max_wait)
+                    now = time.monotonic()
+                    if now >= due:
+                        break
+                    self.cond.wait(due - now)
+                batch = self._take()
+            self._run(batch)
+            close_old_connections()
+
+    def flush(self):
+        # Repair everything pending now, in this thread (management commands
+        # call it before exiting)
+        with self.cond:
+            if self.first_mark is None:
+                return
+            batch = self._take()
+        self._run(batch)
+
+    def _run(self, batch):
+        try:
+            result = repair(*batch)
+        except (OperationalError, Saturated) as e:
+            with self.cond:
+                self.counts["errors"] += 1
+                self.retries += 1
+                retry = self.delay > 0 and _transient(e) and self.retries <= MAX_RETRIES
+                if not retry:
+                    self.retries = 0
+            if not retry:
+                # Permanent (e.g. no such table), flush() (which would loop on
+                # it) or out of retries: give up on this batch
+                logger.error("Roster repair failed: %s", e)
+                return
+            # Database locked/busy, or the roster lock busy: put the batch back for the next pass
+            logger.warning("Roster repair hit %s, retrying", e)
+            self._mark(*batch)
+            return
+        except Exception:
+            logger.exception("Roster repair failed")
+            with self.cond:
+                self.counts["errors"] += 1
+            return
+        with self.cond:
+            self.retries = 0
+            self.counts["runs"] += 1
+            for key, value in result.items():
+                self.counts[key] += value
+
+    def stats(self):
+        with self.cond:
+            return {**self.counts, "pending": len(self.people) + len(self.flight_numbers) + len(self.flight_ids)}
+
+
+def _transient(error):
+    # SQLite's "database is locked" / "database table is locked" / SQLITE_BUSY,
+    # or a roster lock held past coalesce.WAIT
+    if isinstance(error, Saturated):
+        return True
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def affected_rosters(people=(), flight_numbers=(), flight_ids=()):
+    """
+    {flight_id (number): changes} for every stored roster these changes
+    touch. changes are the (kind, id) of the people on it who changed, plus
+    (PASSENGER, None) when its passengers as a whole did (one joined, an
+    affiliation moved); None when the flight itself changed, so every slot
+    is re-checked.
+    """
+    changes = {}
+
+    def add(number, change):
+        found = changes.setdefault(number, set())
+        if found is not None:
+            found.add(change)
+
+    by_kind = {}
+    for kind, person_id in people:
+        by_kind.setdefault(kind, []).append(person_id)
+    for kind, ids in by_kind.items():
+        for start in range(0, len(ids), CHUNK):
+            for number, person_id in (
+                RosterAssignment.objects.filter(kind=kind, person_id__in=ids[start:start + CHUNK])
+                .values_list('roster__flight_id', 'person_id')
+            ):
+                add(number, (kind, person_id))
+    flight_ids = list(flight_ids)
+    for start in range(0, len(flight_ids), CHUNK):
+        for number in Flight.objects.filter(id__in=flight_ids[start:start + CHUNK]).values_list('flight_number', flat=True):
+            add(number, (PASSENGER, None))
+    for number in flight_numbers:
+        changes[number] = None
+
+    found = set()
+    numbers = list(changes)
+    for start in range(0, len(numbers), CHUNK):
+        found.update(
+            FlightRoster.objects.filter(flight_id__in=numbers[start:start + CHUNK]).values_list('flight_id', flat=True)
+        )
+    return {number: changes[number] for number in sorted(found)}
+
+
+def repair(people=(), flight_numbers=(), flight_ids=(), provider=None):
+    """
+    Bring the rosters touched by these changes back in line with the data,
+    one slot at a time. people are (RosterAssignment kind, id) pairs,
+    flights are numbers or db ids. Returns counters for RepairQueue.
+    """
+    provider = provider or get_provider()
+    result = {"rosters": 0, "repaired": 0, "slots": 0, "removed": 0}
+    for flight_id, changes in affected_rosters(people, flight_numbers, flight_ids).items():
+        # Read, patched and saved under the roster's lock (coalesce), so a
+        # generation running meanwhile isn't overwritten with an older copy
+        with roster_lock(flight_id):
+            stored = FlightRoster.objects.filter(flight_id=flight_id).first()
+            if stored is None:
+                continue
+            result["rosters"] += 1
+            flight_info = provider.get_flight(flight_id)
+            if not flight_info:
+                # The flight is gone: so is its roster, and its crew's booking
+                stored.delete()
+                availability_index.release(flight_id)
+                result["removed"] += 1
+                continue
+            pools = provider.get_pools(flight_info)
+            slots = repair_roster(stored, flight_info, pools, changes)
+        if slots:
+            result["repaired"] += 1
+            result["slots"] += slots
+    return result
+
+
+def repair_roster(stored, flight_info, pools, changes=None):
+    """
+    Patch one stored roster where it no longer matches the data. Only the
+    slots of the people in changes (see affected_rosters; None: every slot)
+    are re-checked: a pilot or attendant who left, changed role or plane,
+    can't fly this far or is now double booked is replaced by the first
+    free eligible colleague of the same role. When passengers changed, one
+    who was added, moved cabin or lost their seat is seated around everyone
+    else. Only the assignment rows that changed are rewritten, under the
+    fingerprint of the current inputs, so the next request reuses the
+    roster instead of running the RosterGenerator again. Returns the
+    number of slots changed.
+    """
+    flight_id = stored.flight_id
+    window = flight_window(flight_info)
+    # The slots straight from the assignment rows: who, in what role, which seat
+    rows = list(stored.assignments.order_by('position').values_list('kind', 'person_id', 'role', 'seat'))
+    roster = {
+        "flight_id": flight_id,
+        "pilots": [],
+        "cabin_crew": [],
+        "passengers": [],
+        "menu": list(stored.roster_data.get("menu", [])),
+    }
+    fingerprint = fingerprint_inputs(flight_info, pools)
+    changed = 0
+
+    def affected(kind, person_id):
+        return changes is None or (kind, person_id) in changes
+
+    # Crew: same slots, same order; the role is the one the slot was filled for
+    pilots = [pilot for bucket in pools['pilots'].values() for pilot in bucket]
+    for section, kind, role_field, pool in (
+        ('pilots', PILOT, 'seniority', pilots),
+        ('cabin_crew', ATTENDANT, 'attendant_type', pools['attendants']),
+    ):
+        current = {person['id']: person for person in pool}
+        slots = [(person_id, role) for k, person_id, role, _ in rows if k == kind]
+        taken = {person_id for person_id, _ in slots}
+
+        def fits(person, role):
+            return (
+                person is not None and person[role_field] == role
+                and availability_index.is_free(kind, person['id'], *window, flight_id=flight_id)
+            )
+
+        for person_id, role in slots:
+            person = current.get(person_id)
+            if person is not None and not affected(kind, person_id):
+                # Untouched by these changes: stays without a check
+                roster[section].append(person)
+                continue
+            if fits(person, role):
+                roster[section].append(person)
+                continue
+            changed += 1
+            replacement = next((p for p in pool if p['id'] not in taken and fits(p, role)), None)
+            if replacement is not None:
+                taken.add(replacement['id'])
+                roster[section].append(replacement)
+
+    # A flight has both pilots or none (RosterGenerator.assign_pilots)
+    if len(roster['pilots']) < 2 and roster['pilots']:
+        roster['pilots'] = []
+
+    # Menu: still a dish of the rostered chef
+    chef = next((c for c in roster['cabin_crew'] if c['attendant_type'] == 'CHEF'), None)
+    recipes = chef.get('recipes', []) if chef else []
+    if any(dish not in recipes for dish in roster['menu']) or (recipes and not roster['menu']):
+        changed += 1
+        roster['menu'] = []
+        if recipes:
+            # Seeded by the inputs, like RosterGenerator.random
+            roster['menu'].append(random.Random(fingerprint).choice(recipes))
+
+    seated = {person_id: seat for kind, person_id, _, seat in rows if kind == PASSENGER}
+    if changes is None or any(kind == PASSENGER for kind, _ in changes):
+        seats, reseated = _reseat(seated, pools, flight_info)
+        roster['passengers'] = seats
+        changed += reseated
+    else:
+        current = {p['id']: p for p in pools['passengers'] if p['flight'] == flight_info['id']}
+        roster['passengers'] = [
+            dict(current[passenger_id], seat_number=seat)
+            for passenger_id, seat in seated.items() if passenger_id in current
+        ]
+
+    if changed:
+        try:
+            patch_roster(stored, roster, fingerprint, window)
+        except DoubleBooked:
+            # A replacement was just rostered elsewhere by another worker:
+            # leave the roster to be regenerated on its next request
+            availability_index.rebuild()
+            FlightRoster.objects.filter(id=stored.id).update(fingerprint='', inputs_stamp='')
+    else:
+        # Nothing to move, only the inputs it was checked against are newer
+        FlightRoster.objects.filter(id=stored.id).update(fingerprint=fingerprint, inputs_stamp='')
+    return changed
+
+
+def _reseat(was, pools, flight_info):
+    """
+    Passengers of the flight as they are now, keeping every seat in was
+    ({passenger id: seat}, roster order) that is still valid. Returns
+    (passengers in roster order, number of passengers moved/added/dropped).
+    """
+    current = {p['id']: dict(p) for p in pools['passengers'] if p['flight'] == flight_info['id']}
+    allocator = SeatAllocator(get_seat_map(pools['plane_type']))
+    seat_map = allocator.seat_map
+    # Passengers already on the roster keep their place, new ones go last
+    order = [passenger_id for passenger_id in was if passenger_id in current]
+    order += [passenger_id for passenger_id in current if passenger_id not in was]
+    changed = len(was) - sum(1 for passenger_id in was if passenger_id in current)
+
+    # 1. Pre-assigned seats win, as in seat_passengers
+    needs = []
+    for passenger_id in order:
+        p = current[passenger_id]
+        if p.get('seat_number'):
+            allocator.reserve(p['seat_number'])
+    # 2. Keep the seat each passenger already had if it still holds
+    for passenger_id in order:
+        p = current[passenger_id]
+        if p.get('seat_number'):
+            continue
+        seat = was.get(passenger_id)
+        infant = p.get('parent') and p.get('age', 99) <= 2
+        if seat == "LAP" and infant:
+            p['seat_number'] = seat
+            continue
+        i = seat_map.index.get(seat) if seat else None
+        if not infant and i is not None and seat_map.classes[i] == seat_map.cabin_for(p.get('seat_type')) \
+                and allocator.is_free(i):
+            allocator.occupy(i)
+            p['seat_number'] = seat
+            continue
+        needs.append(p)
+
+    # 3. Everyone else, families together
+    groups = group_passengers(needs)
+    groups.sort(key=len, reverse=True)
+    for group in groups:
+        by_type = {}
+        for p in group:
+            if p.get('parent') and p.get('age', 99) <= 2:
+                p['seat_number'] = "LAP"
+            else:
+                by_type.setdefault(p.get('seat_type'), []).append(p)
+        for seat_type, members in by_type.items():
+            for p, label in zip(members, allocator.allocate_together(seat_type, len(members))):
+                p['seat_number'] = label
+
+    passengers = [current[passenger_id] for passenger_id in order]
+    changed += sum(1 for p in passengers if was.get(p['id'], False) != p['seat_number'])
+    return passengers, changed
+
+
+repair_queue = RepairQueue()
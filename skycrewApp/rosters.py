@@ -0,0 +1,227 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from PilotApi.models import Pilot
+from PilotApi.serializers import PilotSerializer
+from CabinCrewApi.models import Attendant
+from CabinCrewApi.serializers import AttendantSerializer
+from PassengerApi.models import Passenger
+from PassengerApi.serializers import PassengerSerializer
+from .availability import DoubleBooked, availability_index, stored_conflicts
+from .models import FlightRoster, RosterAssignment
+
+# How long an assembled roster document stays cached (seconds). The key
+# includes the fingerprint, so a regenerated roster is never served stale.
+CACHE_TIMEOUT = getattr(settings, 'SKYCREW_ROSTER_CACHE_TIMEOUT', 300)
+
+# Assembling reads the Pilot/Attendant/Passenger tables, which only this
+# database has in a monolith. With the HTTP provider the full document is
+# still stored (the assignment rows are written either way).
+COMPACT = getattr(settings, 'SKYCREW_DATA_PROVIDER', 'orm') == 'orm'
+
+# roster section -> (assignment kind, field the role comes from)
+SECTIONS = {
+    'pilots': (RosterAssignment.PILOT, 'seniority'),
+    'cabin_crew': (RosterAssignment.ATTENDANT, 'attendant_type'),
+    'passengers': (RosterAssignment.PASSENGER, 'seat_type'),
+}
+
+
+def assignments_for(roster):
+    # Unsaved RosterAssignment rows (roster not set) for a roster document
+    rows = []
+    for section, (kind, role_field) in SECTIONS.items():
+        for position, person in enumerate(roster.get(section, [])):
+            rows.append(RosterAssignment(
+                kind=kind,
+                person_id=person['id'],
+                role=person.get(role_field) or '',
+                name=person.get('name') or '',
+                seat=person.get('seat_number') if kind == RosterAssignment.PASSENGER else None,
+                position=position,
+            ))
+    return rows
+
+
+def stored_document(roster):
+    # What goes into roster_data: only what the assignment rows can't rebuild
+    if not COMPACT:
+        return roster
+    return {"flight_id": roster["flight_id"], "menu": roster.get("menu", [])}
+
+
+def save_roster(flight_id, roster, fingerprint, window, stamp=''):
+    # window: the flight's (start, end), availability.flight_window().
+    # stamp: logic.inputs_stamp() from before the inputs were read, if known.
+    # Raises DoubleBooked, saving nothing, if another worker has stored some
+    # of the crew on an overlapping flight; the crew is booked in
+    # availability_index once the roster is committed.
+    with transaction.atomic():
+        conflicts = stored_conflicts(flight_id, *window, roster)
+        if conflicts:
+            raise DoubleBooked(conflicts)
+        stored, _ = FlightRoster.objects.update_or_create(
+            flight_id=flight_id,
+            defaults={'roster_data': stored_document(roster), 'fingerprint': fingerprint, 'inputs_stamp': stamp},
+        )
+        _replace_assignments({stored.id: roster})
+        transaction.on_commit(lambda: availability_index.record(flight_id, *window, roster))
+    cache.set(_cache_key(flight_id, fingerprint), roster, CACHE_TIMEOUT)
+    return stored
+
+
+def patch_roster(stored, roster, fingerprint, window):
+    # save_roster() for a repaired roster: only the assignment rows that differ
+    # from the stored ones are rewritten, and only crew new to the roster is
+    # checked for clashes. Raises DoubleBooked like save_roster.
+    flight_id = stored.flight_id
+    rows = {(row.kind, row.person_id): row for row in assignments_for(roster)}
+    with transaction.atomic():
+        before = {(row.kind, row.person_id): row for row in stored.assignments.all()}
+        newcomers = {
+            section: [person for person in roster.get(section, []) if (kind, person['id']) not in before]
+            for section, (kind, _) in SECTIONS.items() if kind != RosterAssignment.PASSENGER
+        }
+        conflicts = stored_conflicts(flight_id, *window, newcomers)
+        if conflicts:
+            raise DoubleBooked(conflicts)
+        changed = {key for key, row in rows.items() if key not in before or _slot(before[key]) != _slot(row)}
+        stale = [row.id for key, row in before.items() if key not in rows or key in changed]
+        RosterAssignment.objects.filter(id__in=stale).delete()
+        fresh = [rows[key] for key in changed]
+        for row in fresh:
+            row.roster_id = stored.id
+        RosterAssignment.objects.bulk_create(fresh)
+        FlightRoster.objects.filter(id=stored.id).update(
+            roster_data=stored_document(roster), fingerprint=fingerprint, inputs_stamp='',
+        )
+        transaction.on_commit(lambda: availability_index.record(flight_id, *window, roster))
+    cache.set(_cache_key(flight_id, fingerprint), roster, CACHE_TIMEOUT)
+
+
+def _slot(row):
+    return row.role, row.name, row.seat, row.position
+
+
+def save_rosters(items):
+    # Many rosters at once: items are (flight_id, roster, fingerprint, window).
+    # Rosters whose crew another worker has stored on an overlapping flight
+    # meanwhile are left out; returns {flight_id: conflicts} for those.
+    if not items:
+        return {}
+    flight_ids = [flight_id for flight_id, _, _, _ in items]
+    with transaction.atomic():
+        rejected = {}
+        for flight_id, roster, _, window in items:
+            conflicts = stored_conflicts(flight_id, *window, roster, exclude=flight_ids)
+            if conflicts:
+                rejected[flight_id] = conflicts
+        items = [item for item in items if item[0] not in rejected]
+        FlightRoster.objects.bulk_create(
+            [
+                FlightRoster(flight_id=flight_id, roster_data=stored_document(roster), fingerprint=fingerprint)
+                for flight_id, roster, fingerprint, _ in items
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['flight_id'],
+            # inputs_stamp goes back to '' (unknown): no stamp is taken in a batch
+            update_fields=['roster_data', 'fingerprint', 'inputs_stamp', 'generated_at'],
+        )
+        ids = dict(
+            FlightRoster.objects.filter(flight_id__in=[flight_id for flight_id, _, _, _ in items])
+            .values_list('flight_id', 'id')
+        )
+        _replace_assignments({ids[flight_id]: roster for flight_id, roster, _, _ in items})
+
+        def book():
+            for flight_id, roster, _, window in items:
+                availability_index.record(flight_id, *window, roster)
+        transaction.on_commit(book)
+    cache.set_many(
+        {_cache_key(flight_id, fingerprint): roster for flight_id, roster, fingerprint, _ in items},
+        CACHE_TIMEOUT,
+    )
+    return rejected
+
+
+def _replace_assignments(rosters):
+    # rosters: FlightRoster id -> roster document
+    roster_ids = list(rosters)
+    for start in range(0, len(roster_ids), 500):
+        RosterAssignment.objects.filter(roster_id__in=roster_ids[start:start + 500]).delete()
+    rows = []
+    for roster_id, roster in rosters.items():
+        for row in assignments_for(roster):
+            row.roster_id = roster_id
+            rows.append(row)
+    RosterAssignment.objects.bulk_create(rows, batch_size=1000)
+
+
+def load_roster(stored):
+    """
+    The full roster document of a stored FlightRoster: from the cache, or
+    assembled from its assignment rows (four queries). Documents stored
+    in full (HTTP provider, or written before assignments existed) are
+    returned as they are.
+    """
+    if 'pilots' in stored.roster_data:
+        return stored.roster_data
+    key = _cache_key(stored.flight_id, stored.fingerprint)
+    roster = cache.get(key)
+    if roster is None:
+        roster = assemble(stored)
+        cache.set(key, roster, CACHE_TIMEOUT)
+    return roster
+
+
+def assemble(stored):
+    """
+    A compact roster's document, each person as they are now. Someone
+    deleted since the roster was stored keeps their slot, from the snapshot
+    in their assignment row (id, name, role, seat) marked "removed": True,
+    until the roster is repaired or regenerated.
+    """
+    rows = list(stored.assignments.order_by('position').values_list('kind', 'person_id', 'role', 'name', 'seat'))
+    ids = {kind: [row[1] for row in rows if row[0] == kind] for kind, _ in SECTIONS.values()}
+
+    people = {
+        RosterAssignment.PILOT: PilotSerializer(
+            Pilot.objects.filter(id__in=ids[RosterAssignment.PILOT]), many=True,
+        ).data,
+        RosterAssignment.ATTENDANT: AttendantSerializer(
+            Attendant.objects.filter(id__in=ids[RosterAssignment.ATTENDANT]).prefetch_related('recipes', 'allowed_vehicles'),
+            many=True,
+        ).data,
+        RosterAssignment.PASSENGER: PassengerSerializer(
+            Passenger.objects.filter(id__in=ids[RosterAssignment.PASSENGER]).prefetch_related('affiliated_passengers'),
+            many=True,
+        ).data,
+    }
+    by_id = {kind: {person['id']: person for person in found} for kind, found in people.items()}
+
+    # Same keys in the same order as RosterGenerator.roster
+    roster = {
+        "flight_id": stored.flight_id,
+        "pilots": [],
+        "cabin_crew": [],
+        "passengers": [],
+        "menu": stored.roster_data.get("menu", []),
+    }
+    for section, (kind, role_field) in SECTIONS.items():
+        for k, person_id, role, name, seat in rows:
+            if k != kind:
+                continue
+            person = by_id[k].get(person_id)
+            if person is None:
+                person = {"id": person_id, "name": name, role_field: role, "removed": True}
+            if kind == RosterAssignment.PASSENGER:
+                person = dict(person)
+                person['seat_number'] = seat
+            roster[section].append(person)
+    return roster
+
+
+def _cache_key(flight_id, fingerprint):
+    return f"skycrew:roster:{flight_id}:{fingerprint}"
@@ -0,0 +1,296 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from string import ascii_uppercase
+
+# Used when a plane type has no usable layout (the old hard-coded 20x6 grid)
+DEFAULT_LAYOUT = {"rows": 20, "cols": 6}
+
+ANY_CLASS = None
+
+
+class SeatMap:
+    """
+    A PlaneType.seating_plan_layout compiled once into flat arrays.
+
+    Seat i has a label ("12A"), a cabin class (BUSINESS/ECONOMY, or None
+    when the layout doesn't split cabins), a row, a column and a block: the
+    run of seats between two aisles in a row. Seats in the same block with
+    neighbouring columns are adjacent. Only the first seat_capacity seats
+    (front to back) are sold.
+
+    Supported layouts:
+      {"rows": 20, "cols": 6}                              plain grid, aisle in the middle
+      {"rows": 20, "cols": "ABC DEF", "business_rows": 3}  spaces are aisles
+      {"cabins": [{"class": "BUSINESS", "rows": [1, 3], "cols": "AC DF"},
+                  {"class": "ECONOMY", "rows": [4, 30], "cols": "ABC DEF"}]}
+    """
+
+    def __init__(self, layout, capacity=None):
+        self.labels = []
+        self.classes = []
+        self.rows = []
+        self.columns = []
+        self.blocks = []
+        for cabin in _cabins(layout):
+            self._add_cabin(cabin)
+
+        if capacity is not None and capacity < len(self.labels):
+            for name in ('labels', 'classes', 'rows', 'columns', 'blocks'):
+                del getattr(self, name)[capacity:]
+
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        # Seat indexes per cabin class, front to back
+        self.by_class = {}
+        for i, cabin_class in enumerate(self.classes):
+            self.by_class.setdefault(cabin_class, []).append(i)
+        # Per class, the blocks as lists of seat indexes (side by side seats)
+        self.class_blocks = {}
+        for cabin_class, seats in self.by_class.items():
+            blocks = self.class_blocks[cabin_class] = []
+            for i in seats:
+                if blocks and self.blocks[blocks[-1][-1]] == self.blocks[i]:
+                    blocks[-1].append(i)
+                else:
+                    blocks.append([i])
+
+    def _add_cabin(self, cabin):
+        cabin_class = cabin.get('class')
+        cabin_class = cabin_class.upper() if cabin_class else ANY_CLASS
+        first, last = cabin['rows']
+        groups = _column_groups(cabin['cols'])
+        for row in range(first, last + 1):
+            for group in groups:
+                block = (row, group[0])
+                for column in group:
+                    self.labels.append(f"{row}{column}")
+                    self.classes.append(cabin_class)
+                    self.rows.append(row)
+                    self.columns.append(column)
+                    self.blocks.append(block)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def cabin_for(self, seat_type):
+        # The cabin a passenger of this seat_type sits in
+        if ANY_CLASS in self.by_class and len(self.by_class) == 1:
+            return ANY_CLASS
+        return seat_type
+
+    def seats_for(self, seat_type):
+        # The seats a passenger of this seat_type may use
+        return self.by_class.get(self.cabin_for(seat_type), [])
+
+    def blocks_for(self, seat_type):
+        return self.class_blocks.get(self.cabin_for(seat_type), [])
+
+    def adjacent(self, a, b):
+        return self.blocks[a] == self.blocks[b] and abs(a - b) == 1
+
+
+class SeatAllocator:
+    """
+    Occupancy for one flight on top of a shared SeatMap.
+
+    Taken seats live in a bitmap, and each cabin class keeps a cursor that
+    only moves forward, so handing out the next free seat is amortised O(1).
+    """
+
+    def __init__(self, seat_map):
+        self.seat_map = seat_map
+        self.bitmap = bytearray((len(seat_map) + 7) // 8)
+        self.cursors = {}
+        # (cabin, size) -> first block that might still hold `size` free seats in a row.
+        # Runs only ever shrink, so these cursors only move forward too.
+        self.block_cursors = {}
+        self.taken = 0
+
+    def is_free(self, i):
+        return not self.bitmap[i >> 3] & (1 << (i & 7))
+
+    def occupy(self, i):
+        self.bitmap[i >> 3] |= 1 << (i & 7)
+        self.taken += 1
+
+    def reserve(self, label):
+        # Mark a pre-assigned seat as taken; False if it isn't a free seat on this plane
+        i = self.seat_map.index.get(label)
+        if i is None or not self.is_free(i):
+            return False
+        self.occupy(i)
+        return True
+
+    def allocate(self, seat_type):
+        # Next free seat of this class (front to back), or None when the cabin is full
+        seats = self.seat_map.seats_for(seat_type)
+        cursor = self.cursors.get(seat_type, 0)
+        while cursor < len(seats) and not self.is_free(seats[cursor]):
+            cursor += 1
+        self.cursors[seat_type] = cursor
+        if cursor == len(seats):
+            return None
+        i = seats[cursor]
+        self.occupy(i)
+        return self.seat_map.labels[i]
+
+    def allocate_together(self, seat_type, size):
+        """
+        Seats for a group travelling together: one run of side by side
+        seats if any block has room, otherwise split into the widest runs
+        available, each placed as close as possible after the previous one,
+        and finally single seats. Returns labels (None for anyone left over).
+        """
+        labels = []
+        near = None
+        while size:
+            found = self._find_run(seat_type, size, near)
+            if found is None:
+                found = self._widest_run(seat_type, near)
+            if found is None:
+                # No two free seats together anywhere, seat them one by one
+                labels.extend(self.allocate(seat_type) for _ in range(size))
+                break
+            near, run = found
+            for i in run:
+                self.occupy(i)
+            labels.extend(self.seat_map.labels[i] for i in run)
+            size -= len(run)
+        return labels
+
+    def _free_run(self, block, size):
+        # First `size` consecutive free seats inside one block, or None
+        start = 0
+        for position, i in enumerate(block):
+            if not self.is_free(i):
+                start = position + 1
+            elif position - start + 1 == size:
+                return block[start:position + 1]
+        return None
+
+    def _find_run(self, seat_type, size, near=None):
+        blocks = self.seat_map.blocks_for(seat_type)
+        key = (self.seat_map.cabin_for(seat_type), size)
+        cursor = self.block_cursors.get(key, 0)
+        if near is not None:
+            # Next to the rest of the group first
+            for b in range(max(near, cursor), len(blocks)):
+                run = self._free_run(blocks[b], size)
+                if run:
+                    return b, run
+        while cursor < len(blocks):
+            run = self._free_run(blocks[cursor], size)
+            if run:
+                self.block_cursors[key] = cursor
+                return cursor, run
+            cursor += 1
+        self.block_cursors[key] = cursor
+        return None
+
+    def _widest_run(self, seat_type, near=None):
+        # Largest group of side by side free seats (at least 2), nearest `near` first
+        widest = max((len(b) for b in self.seat_map.blocks_for(seat_type)), default=0)
+        for size in range(widest, 1, -1):
+            found = self._find_run(seat_type, size, near)
+            if found:
+                return found
+        return None
+
+
+# id(layout) -> (layout, capacity, SeatMap) for the layout objects seen last.
+# Plane type dicts from the reference cache share one layout object, which
+# then isn't re-encoded to find its compiled map. Holding the layout keeps
+# its id from being reused.
+_by_layout = OrderedDict()
+_by_layout_lock = threading.Lock()
+LAYOUT_ENTRIES = 64
+
+
+def get_seat_map(plane_type):
+    # plane_type is the PlaneType dict; compiled maps are shared between rosters
+    layout = plane_type.get('seating_plan_layout') if plane_type else None
+    capacity = plane_type.get('seat_capacity') if plane_type else None
+    if not layout:
+        return _compile(None, capacity)
+    with _by_layout_lock:
+        hit = _by_layout.get(id(layout))
+        if hit is not None and hit[0] is layout and hit[1] == capacity:
+            _by_layout.move_to_end(id(layout))
+            return hit[2]
+    seat_map = _compile(json.dumps(layout, sort_keys=True), capacity)
+    with _by_layout_lock:
+        _by_layout[id(layout)] = (layout, capacity, seat_map)
+        while len(_by_layout) > LAYOUT_ENTRIES:
+            _by_layout.popitem(last=False)
+    return seat_map
+
+
+@lru_cache(maxsize=64)
+def _compile(layout_key, capacity):
+    layout = json.loads(layout_key) if layout_key else DEFAULT_LAYOUT
+    try:
+        seat_map = SeatMap(layout, capacity)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        seat_map = SeatMap(DEFAULT_LAYOUT, capacity)
+    if not len(seat_map) and layout is not DEFAULT_LAYOUT:
+        seat_map = SeatMap(DEFAULT_LAYOUT, capacity)
+    return seat_map
+
+
+def _cabins(layout):
+    if isinstance(layout, str):
+        layout = json.loads(layout)
+    if 'cabins' in layout:
+        return layout['cabins']
+    rows = int(layout['rows'])
+    business_rows = int(layout.get('business_rows', 0))
+    if not business_rows:
+        return [{'rows': [1, rows], 'cols': layout['cols']}]
+    return [
+        {'class': 'BUSINESS', 'rows': [1, business_rows], 'cols': layout['cols']},
+        {'class': 'ECONOMY', 'rows': [business_rows + 1, rows], 'cols': layout['cols']},
+    ]
+
+
+def _column_groups(cols):
+    # "ABC DEF" -> [['A','B','C'], ['D','E','F']]; 6 -> same, aisle in the middle
+    if isinstance(cols, int):
+        letters = ascii_uppercase[:cols]
+        if cols < 4:
+            return [list(letters)]
+        half = cols // 2
+        return [list(letters[:half]), list(letters[half:])]
+    return [list(group) for group in cols.split()]
+
+
+def group_passengers(passengers):
+    """
+    Connected components over the affiliated_passengers / parent graph,
+    via union-find (near-linear). Returns lists of passenger dicts, only
+    linking passengers that are on this flight.
+    """
+    parent = {p['id']: p['id'] for p in passengers}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        if b in parent:
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[rb] = ra
+
+    for p in passengers:
+        if p.get('parent') is not None:
+            union(p['id'], p['parent'])
+        for other in p.get('affiliated_passengers') or []:
+            union(p['id'], other)
+
+    groups = {}
+    for p in passengers:
+        groups.setdefault(find(p['id']), []).append(p)
+    return list(groups.values())
@@ -0,0 +1,210 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from FlightInfoApi.models import Airport, Flight, PlaneType
+from PilotApi.models import Pilot
+from PilotApi.serializers import PilotSerializer
+from CabinCrewApi.models import Attendant, Recipe
+from PassengerApi.models import Passenger
+from skycrew.refcache import reference_cache
+from .availability import ATTENDANT, PILOT
+from .eligibility import attendant_index, pilot_index
+from .models import Tombstone
+from .repair import PASSENGER, repair_queue
+
+
+# Keep the in-memory indexes in step with the tables. on_commit, so a
+# rolled back save never leaks into the index. The stored rosters the
+# change touches are queued for repair after the index is updated.
+
+@receiver(post_save, sender=Pilot)
+def pilot_saved(sender, instance, **kwargs):
+    data = PilotSerializer(instance).data
+    transaction.on_commit(lambda: pilot_index.upsert(data))
+    _repair_people(PILOT, [instance.id])
+
+
+@receiver(post_delete, sender=Pilot)
+def pilot_deleted(sender, instance, **kwargs):
+    pilot_id = instance.id
+    transaction.on_commit(lambda: pilot_index.remove(pilot_id))
+    _repair_people(PILOT, [pilot_id])
+
+
+def _refresh_attendants(ids):
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: attendant_index.refresh(ids))
+        _repair_people(ATTENDANT, ids)
+
+
+def _repair_people(kind, ids):
+    transaction.on_commit(lambda: repair_queue.mark_people(kind, ids))
+
+
+def _repair_flights(flight_numbers=(), flight_ids=()):
+    transaction.on_commit(lambda: repair_queue.mark_flights(flight_numbers, flight_ids))
+
+
+@receiver(post_save, sender=Attendant)
+@receiver(post_delete, sender=Attendant)
+def attendant_changed(sender, instance, **kwargs):
+    _refresh_attendants([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    # Recipes are nested in the attendant dicts, so refresh the chef
+    _refresh_attendants([instance.chef_id])
+
+
+@receiver(m2m_changed, sender=Attendant.allowed_vehicles.through)
+def attendant_vehicles_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # attendant.allowed_vehicles.add(...)
+        _refresh_attendants([instance.id])
+    elif pk_set:
+        # plane_type.attendant_set.add(...): pk_set are attendant ids
+        _refresh_attendants(pk_set)
+    else:
+        # plane_type.attendant_set.clear(): everyone indexed under it
+        _refresh_attendants(attendant_index.members(instance.id))
+
+
+@receiver(post_delete, sender=PlaneType)
+def plane_type_deleted(sender, instance, **kwargs):
+    # The through rows go with it without an m2m_changed signal
+    _refresh_attendants(attendant_index.members(instance.id))
+
+
+@receiver(post_save, sender=Passenger)
+def passenger_saved(sender, instance, **kwargs):
+    # Seated on their (current) flight's roster; a move also frees the old seat
+    _repair_people(PASSENGER, [instance.id])
+    _repair_flights(flight_ids=[instance.flight_id])
+
+
+@receiver(post_delete, sender=Passenger)
+def passenger_deleted(sender, instance, **kwargs):
+    _repair_people(PASSENGER, [instance.id])
+
+
+@receiver(m2m_changed, sender=Passenger.affiliated_passengers.through)
+def passenger_affiliations_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _repair_flights(flight_ids=[instance.flight_id])
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def flight_changed(sender, instance, **kwargs):
+    # New time, plane or distance: every slot of its roster is re-checked
+    _repair_flights(flight_numbers=[instance.flight_number])
+
+
+# ?since= sync bookkeeping (skycrew.sync): a tombstone per deleted row, and
+# updated_at bumped on rows whose serialized form changes without a save
+# (m2m ids, nested recipes, a parent set to null).
+
+SYNCED = [Airport, PlaneType, Flight, Pilot, Attendant, Recipe, Passenger]
+
+
+# The tombstones of the current transaction (or savepoint) on this thread:
+# (savepoint ids, on_commit callback, [Tombstone])
+_pending = threading.local()
+
+
+def _tombstone(sender, instance, **kwargs):
+    # post_delete fires once per row, so rows are collected and written with
+    # one bulk INSERT once the transaction commits. A new batch starts when
+    # the savepoint changes or the last batch's callback is gone (committed,
+    # or dropped by a rollback along with its rows).
+    connection = transaction.get_connection()
+    savepoints = tuple(connection.savepoint_ids)
+    batch = getattr(_pending, 'batch', None)
+    fresh = (
+        batch is None or batch[0] != savepoints
+        or not any(callback is batch[1] for _, callback, _ in connection.run_on_commit)
+    )
+    if fresh:
+        rows = []
+        batch = _pending.batch = (savepoints, lambda: Tombstone.objects.bulk_create(rows), rows)
+    batch[2].append(Tombstone(resource=sender._meta.label_lower, object_id=instance.pk))
+    if fresh:
+        # Outside a transaction this runs at once
+        transaction.on_commit(batch[1])
+
+
+for model in SYNCED:
+    post_delete.connect(_tombstone, sender=model, dispatch_uid=f'tombstone-{model._meta.label_lower}')
+
+
+def _touch(model, ids):
+    ids = [i for i in ids if i is not None]
+    if ids:
+        _touch_rows(model.objects.filter(id__in=ids))
+
+
+def _touch_rows(queryset):
+    # One UPDATE, whatever the filter joins
+    queryset.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_touched(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Attendant) and origin.pk == instance.chef_id:
+        # Deleted along with its chef, who is gone next
+        return
+    _touch(Attendant, [instance.chef_id])
+
+
+@receiver(m2m_changed, sender=Attendant.allowed_vehicles.through)
+def attendant_vehicles_touched(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _touch(Attendant, [instance.id])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _touch(Attendant, pk_set)
+    elif action == 'pre_clear':
+        _touch_rows(Attendant.objects.filter(allowed_vehicles=instance))
+
+
+@receiver(pre_delete, sender=PlaneType)
+def plane_type_touched(sender, instance, **kwargs):
+    # Its through rows go without an m2m_changed signal
+    _touch_rows(Attendant.objects.filter(allowed_vehicles=instance))
+
+
+@receiver(m2m_changed, sender=Passenger.affiliated_passengers.through)
+def passenger_affiliations_touched(sender, instance, action, pk_set, **kwargs):
+    # Symmetrical: both ends list each other
+    if action in ('post_add', 'post_remove'):
+        _touch(Passenger, [instance.id, *(pk_set or ())])
+    elif action == 'pre_clear':
+        _touch_rows(Passenger.objects.filter(Q(id=instance.id) | Q(affiliated_passengers=instance)))
+
+
+@receiver(pre_delete, sender=Passenger)
+def passenger_touched(sender, instance, **kwargs):
+    # Infants lose their parent (SET_NULL) and affiliates lose the link, both without a save
+    _touch_rows(Passenger.objects.filter(Q(parent=instance) | Q(affiliated_passengers=instance)))
+
+
+# Reference data cache (skycrew.refcache): a saved or deleted airport or plane
+# type drops what is cached for its model once the change is committed
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+@receiver(post_save, sender=PlaneType)
+@receiver(post_delete, sender=PlaneType)
+def reference_data_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: reference_cache.invalidate(sender))
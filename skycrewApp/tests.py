@@ -1,3 +1,1131 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from skycrew.sync import ChangesPagination
+from skycrew.tests.support import (
+    DEPARTURE, QueryBudgetTestCase, as_json, make_airport, make_attendant, make_flight, make_passenger, make_pilot,
+    make_plane_type,
+)
+from PilotApi.models import Pilot
+from . import coalesce, jobs, repair, upstream
+from .availability import MIN_REST, availability_index, stored_conflicts
+from .coalesce import Saturated, coalesced_generate
+from .batch import generate_batch
+from .eligibility import PilotIndex, attendant_index, pilot_index
+from .jobs import claim_job, run_job, submit_job
+from .logic import fingerprint_inputs, generate_and_store
+from .models import FlightRoster, RosterAssignment, RosterJob, RosterLock
+from .optimizer import optimize_crew, required_roles
+from .providers import HttpDataProvider, OrmDataProvider
+from .rosters import assemble
+from .seating import SeatAllocator, SeatMap, get_seat_map, group_passengers
+from .upstream import UpstreamClientError, UpstreamError, fetch_api_data, fetch_api_object
+
+SPLIT = {"rows": 3, "cols": "AB CD", "business_rows": 1}
+CABINS = {"cabins": [
+    {"class": "BUSINESS", "rows": [1, 1], "cols": "A D"},
+    {"class": "ECONOMY", "rows": [2, 3], "cols": "ABC DEF"},
+]}
+
+
+def blocks(seat_map, row):
+    # The side by side runs of one row, e.g. ['ABC', 'DEF']
+    runs = {}
+    for i, seat_row in enumerate(seat_map.rows):
+        if seat_row == row:
+            runs.setdefault(seat_map.blocks[i], []).append(seat_map.columns[i])
+    return [''.join(columns) for columns in runs.values()]
+
+
+class SeatMapTests(SimpleTestCase):
+
+    def test_layouts(self):
+        # layout, capacity -> seats, first seat, last seat, row 1 blocks, seats per class
+        cases = [
+            ({"rows": 2, "cols": 6}, None, 12, '1A', '2F', ['ABC', 'DEF'], {None: 12}),
+            ({"rows": 2, "cols": 3}, None, 6, '1A', '2C', ['ABC'], {None: 6}),
+            ({"rows": 2, "cols": 5}, None, 10, '1A', '2E', ['AB', 'CDE'], {None: 10}),
+            ({"rows": 2, "cols": "AB CD EF"}, None, 12, '1A', '2F', ['AB', 'CD', 'EF'], {None: 12}),
+            ({"rows": 2, "cols": "A  BC"}, None, 6, '1A', '2C', ['A', 'BC'], {None: 6}),
+            ('{"rows": 1, "cols": "ABC DEF"}', None, 6, '1A', '1F', ['ABC', 'DEF'], {None: 6}),
+            (SPLIT, None, 12, '1A', '3D', ['AB', 'CD'], {'BUSINESS': 4, 'ECONOMY': 8}),
+            (CABINS, None, 14, '1A', '3F', ['A', 'D'], {'BUSINESS': 2, 'ECONOMY': 12}),
+            # Only the first seat_capacity seats, front to back, are sold
+            ({"rows": 4, "cols": 6}, 10, 10, '1A', '2D', ['ABC', 'DEF'], {None: 10}),
+            (SPLIT, 3, 3, '1A', '1C', ['AB', 'C'], {'BUSINESS': 3}),
+            (CABINS, 20, 14, '1A', '3F', ['A', 'D'], {'BUSINESS': 2, 'ECONOMY': 12}),
+        ]
+        for layout, capacity, size, first, last, row_blocks, per_class in cases:
+            with self.subTest(layout=layout, capacity=capacity):
+                seat_map = SeatMap(layout, capacity)
+                self.assertEqual(len(seat_map), size)
+                self.assertEqual((seat_map.labels[0], seat_map.labels[-1]), (first, last))
+                self.assertEqual(blocks(seat_map, 1), row_blocks)
+                self.assertEqual({c: len(seats) for c, seats in seat_map.by_class.items()}, per_class)
+                self.assertEqual(seat_map.index, {label: i for i, label in enumerate(seat_map.labels)})
+
+    def test_cabin_for(self):
+        # seat_type -> the seats it may use: any seat on a single-class plane
+        cases = [
+            ({"rows": 2, "cols": 2}, 'BUSINESS', 4),
+            ({"rows": 2, "cols": 2}, 'ECONOMY', 4),
+            (SPLIT, 'BUSINESS', 4),
+            (SPLIT, 'ECONOMY', 8),
+            (CABINS, 'BUSINESS', 2),
+            (CABINS, 'FIRST', 0),
+        ]
+        for layout, seat_type, seats in cases:
+            with self.subTest(layout=layout, seat_type=seat_type):
+                self.assertEqual(len(SeatMap(layout).seats_for(seat_type)), seats)
+
+    def test_adjacent(self):
+        seat_map = SeatMap({"rows": 2, "cols": "ABC DEF"})
+        cases = [('1A', '1B', True), ('1B', '1C', True), ('1C', '1D', False), ('1F', '2A', False), ('1A', '1C', False)]
+        for a, b, adjacent in cases:
+            with self.subTest(a=a, b=b):
+                self.assertIs(seat_map.adjacent(seat_map.index[a], seat_map.index[b]), adjacent)
+
+    def test_get_seat_map_falls_back_to_the_default_grid(self):
+        # Missing, malformed or empty layouts -> 20 rows of 6, still cut to capacity
+        cases = [
+            (None, None, 120),
+            ({"bogus": 1}, None, 120),
+            ({"rows": "x", "cols": 6}, 50, 50),
+            ({"rows": 0, "cols": 6}, None, 120),
+            ({"cabins": []}, 7, 7),
+        ]
+        for layout, capacity, size in cases:
+            with self.subTest(layout=layout, capacity=capacity):
+                seat_map = get_seat_map({'seating_plan_layout': layout, 'seat_capacity': capacity})
+                self.assertEqual(len(seat_map), size)
+                self.assertEqual(blocks(seat_map, 1), ['ABC', 'DEF'])
+
+    def test_get_seat_map_is_shared(self):
+        plane_type = {'seating_plan_layout': {"rows": 3, "cols": 4}, 'seat_capacity': 10}
+        self.assertIs(get_seat_map(plane_type), get_seat_map(dict(plane_type)))
+        self.assertIs(get_seat_map(plane_type), get_seat_map({**plane_type, 'seating_plan_layout': {"cols": 4, "rows": 3}}))
+        self.assertIsNot(get_seat_map(plane_type), get_seat_map({**plane_type, 'seat_capacity': 9}))
+
+
+class SeatAllocatorTests(SimpleTestCase):
+
+    def test_allocate(self):
+        # layout, seats already taken, seat_type, allocations -> labels handed out
+        cases = [
+            ({"rows": 1, "cols": 3}, [], 'ECONOMY', 4, ['1A', '1B', '1C', None]),
+            ({"rows": 1, "cols": 3}, ['1A', '1C'], 'ECONOMY', 2, ['1B', None]),
+            (SPLIT, [], 'BUSINESS', 5, ['1A', '1B', '1C', '1D', None]),
+            (SPLIT, ['2A'], 'ECONOMY', 2, ['2B', '2C']),
+            (CABINS, [], 'FIRST', 1, [None]),
+        ]
+        for layout, taken, seat_type, count, labels in cases:
+            with self.subTest(layout=layout, taken=taken, seat_type=seat_type):
+                seats = SeatAllocator(SeatMap(layout))
+                for label in taken:
+                    self.assertTrue(seats.reserve(label))
+                self.assertEqual([seats.allocate(seat_type) for _ in range(count)], labels)
+                self.assertEqual(seats.taken, len(taken) + sum(label is not None for label in labels))
+
+    def test_reserve(self):
+        seats = SeatAllocator(SeatMap({"rows": 2, "cols": 6}, capacity=8))
+        cases = [('1A', True), ('1A', False), ('2B', True), ('2C', False), ('9Z', False), (None, False)]
+        for label, reserved in cases:
+            with self.subTest(label=label):
+                self.assertIs(seats.reserve(label), reserved)
+
+    def test_allocate_together(self):
+        # layout, seats already taken, group sizes in turn -> labels per group
+        row = {"rows": 1, "cols": "ABC DEF"}
+        two_rows = {"rows": 2, "cols": "ABC DEF"}
+        cases = [
+            (row, [], [3], [['1A', '1B', '1C']]),
+            (row, [], [2, 2], [['1A', '1B'], ['1D', '1E']]),
+            # A run that fits beats filling the first gap
+            (row, ['1B'], [2], [['1D', '1E']]),
+            # Too big for any block: the widest runs, the rest right after
+            (row, [], [4], [['1A', '1B', '1C', '1D']]),
+            (two_rows, ['1D'], [5], [['1A', '1B', '1C', '1E', '1F']]),
+            (row, ['1B', '1F'], [3], [['1D', '1E', '1A']]),
+            # No two free seats side by side: one by one
+            ({"rows": 1, "cols": "AB CD"}, ['1A', '1D'], [2], [['1B', '1C']]),
+            # More people than seats: None for the rest
+            ({"rows": 1, "cols": "AB"}, [], [3], [['1A', '1B', None]]),
+            (row, [], [3, 3, 1], [['1A', '1B', '1C'], ['1D', '1E', '1F'], [None]]),
+            # Earlier groups don't stop later ones from finding a run
+            (two_rows, [], [2, 2, 3], [['1A', '1B'], ['1D', '1E'], ['2A', '2B', '2C']]),
+            (two_rows, [], [2, 1, 2], [['1A', '1B'], ['1C'], ['1D', '1E']]),
+        ]
+        for layout, taken, sizes, groups in cases:
+            with self.subTest(layout=layout, taken=taken, sizes=sizes):
+                seats = SeatAllocator(SeatMap(layout))
+                for label in taken:
+                    seats.reserve(label)
+                self.assertEqual([seats.allocate_together('ECONOMY', size) for size in sizes], groups)
+
+    def test_allocate_together_stays_in_class(self):
+        seats = SeatAllocator(SeatMap(SPLIT))
+        self.assertEqual(seats.allocate_together('BUSINESS', 3), ['1A', '1B', '1C'])
+        self.assertEqual(seats.allocate_together('ECONOMY', 2), ['2A', '2B'])
+        self.assertEqual(seats.allocate_together('BUSINESS', 2), ['1D', None])
+
+
+class GroupPassengersTests(SimpleTestCase):
+
+    def test_groups(self):
+        # passengers as (id, parent, affiliated ids) -> groups of ids
+        cases = [
+            ([], []),
+            ([(1, None, []), (2, None, [])], [[1], [2]]),
+            ([(1, None, [2]), (2, None, [1])], [[1, 2]]),
+            # Affiliations are followed through: 1-2 and 2-3 is one group
+            ([(1, None, [2]), (2, None, [3]), (3, None, []), (4, None, [])], [[1, 2, 3], [4]]),
+            # An infant sits with its parent
+            ([(1, None, []), (2, 1, []), (3, None, [])], [[1, 2], [3]]),
+            ([(1, None, [3]), (2, 1, []), (3, None, []), (4, 3, [])], [[1, 2, 3, 4]]),
+            # Links to passengers on other flights are ignored
+            ([(1, 99, [98]), (2, None, [97, 1])], [[1, 2]]),
+            ([(1, None, None), (2, None, [])], [[1], [2]]),
+        ]
+        for passengers, groups in cases:
+            with self.subTest(passengers=passengers):
+                found = group_passengers([
+                    {'id': id, 'parent': parent, 'affiliated_passengers': affiliated}
+                    for id, parent, affiliated in passengers
+                ])
+                self.assertEqual(sorted(sorted(p['id'] for p in group) for group in found), groups)
+
+    def test_long_chain(self):
+        # Union-find, so a long chain doesn't recurse or go quadratic
+        passengers = [{'id': i, 'parent': None, 'affiliated_passengers': [i + 1]} for i in range(20000)]
+        groups = group_passengers(passengers)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(len(groups[0]), 20000)
+
+
+def flight_dict(number, plane_type, departure, hours, distance=1000):
+    return {
+        "flight_number": number, "plane_type": plane_type, "distance": distance,
+        "departure_time": departure.isoformat(), "duration": f"{hours:02d}:00:00",
+    }
+
+
+class OptimizerTests(SimpleTestCase):
+
+    def test_required_roles(self):
+        cases = [
+            (None, ['CHIEF', 'REGULAR', 'REGULAR', 'REGULAR', 'REGULAR', 'CHEF']),
+            (9, ['CHIEF', 'REGULAR', 'REGULAR', 'REGULAR', 'REGULAR', 'CHEF']),
+            (3, ['CHIEF', 'REGULAR', 'CHEF']),
+            (2, ['CHIEF', 'CHEF']),
+            (1, ['CHIEF']),
+            (0, []),
+        ]
+        for crew_limit, roles in cases:
+            with self.subTest(crew_limit=crew_limit):
+                self.assertEqual(required_roles('ATTENDANT', {'crew_limit': crew_limit}), roles)
+        self.assertEqual(required_roles('PILOT', {'crew_limit': 0}), ['SENIOR', 'JUNIOR'])
+
+    def chiefs_case(self, time_limit):
+        # Taking the cheapest chief for A (fewer plane types) leaves B without
+        # one; the joint assignment gives A the other chief instead
+        flights = [flight_dict("A", 1, DEPARTURE, 3), flight_dict("B", 2, DEPARTURE + timedelta(hours=1), 3)]
+        plane_types = [{"id": 1, "crew_limit": 2}, {"id": 2, "crew_limit": 2}]
+        attendants = [
+            {"id": 1, "attendant_type": "CHIEF", "allowed_vehicles": [1, 2]},
+            {"id": 2, "attendant_type": "CHIEF", "allowed_vehicles": [1, 3, 4]},
+            {"id": 3, "attendant_type": "CHEF", "allowed_vehicles": [1]},
+            {"id": 4, "attendant_type": "CHEF", "allowed_vehicles": [2]},
+        ]
+        return optimize_crew(flights, plane_types, [], attendants, time_limit=time_limit, workers=1)
+
+    def cabin_ids(self, assignment):
+        return {number: [a['id'] for a in crew['cabin_crew']] for number, crew in assignment.items()}
+
+    def test_covers_more_than_greedy(self):
+        assignment, report = self.chiefs_case(time_limit=30)
+        self.assertEqual(self.cabin_ids(assignment), {"A": [2, 3], "B": [1, 4]})
+        self.assertEqual(report["greedy_windows"], 0)
+        # 4 cabin slots plus the 4 pilot slots nobody can fill
+        self.assertEqual((report["covered"], report["slots"]), (4, 8))
+
+    def test_out_of_time_goes_greedy(self):
+        assignment, report = self.chiefs_case(time_limit=0)
+        self.assertEqual(self.cabin_ids(assignment), {"A": [1, 3], "B": [4]})
+        self.assertEqual(report["greedy_windows"], report["windows"])
+        self.assertEqual(report["covered"], 3)
+
+    def test_half_crewed_flight_frees_its_pilot(self):
+        # A pays more (longer) but has no junior pilot; B gets the senior back
+        flights = [
+            flight_dict("A", 1, DEPARTURE, 5, distance=3000),
+            flight_dict("B", 1, DEPARTURE + timedelta(hours=1), 2, distance=1000),
+        ]
+        pilots = [
+            {"id": 1, "seniority": "SENIOR", "allowed_vehicle": 1, "allowed_range": 5000},
+            {"id": 2, "seniority": "JUNIOR", "allowed_vehicle": 1, "allowed_range": 2000},
+        ]
+        assignment, report = optimize_crew(flights, [{"id": 1, "crew_limit": 0}], pilots, [], workers=1)
+        self.assertEqual([p['id'] for p in assignment["A"]["pilots"]], [])
+        self.assertEqual([p['id'] for p in assignment["B"]["pilots"]], [1, 2])
+        self.assertEqual((report["covered"], report["slots"]), (2, 4))
+
+    def test_pilot_pairs_compete(self):
+        # Two juniors for three flights: the window is solved again until
+        # every flight with pilots has both, and nobody flies twice at once
+        flights = [flight_dict(n, 1, DEPARTURE + timedelta(minutes=10 * i), 3) for i, n in enumerate("ABC")]
+        pilots = [{"id": i, "seniority": "SENIOR", "allowed_vehicle": 1, "allowed_range": 5000} for i in (1, 2, 3)]
+        pilots += [{"id": i, "seniority": "JUNIOR", "allowed_vehicle": 1, "allowed_range": 5000} for i in (4, 5)]
+        assignment, report = optimize_crew(flights, [{"id": 1, "crew_limit": 0}], pilots, [], workers=1)
+        crews = [[p['id'] for p in crew["pilots"]] for crew in assignment.values()]
+        self.assertEqual(sorted(len(c) for c in crews), [0, 2, 2])
+        flown = [i for c in crews for i in c]
+        self.assertEqual(len(flown), len(set(flown)))
+        self.assertEqual(report["covered"], 4)
+
+
+class RosterApiTests(QueryBudgetTestCase):
+    # The roster endpoints against a small airline: two flights, one crew
+
+    @classmethod
+    def setUpTestData(cls):
+        ist = make_airport('IST')
+        lhr = make_airport('LHR', country='United Kingdom')
+        cls.plane = make_plane_type('Boeing 737')
+        cls.flight = make_flight('SC1001', ist, lhr, cls.plane)
+        make_flight('SC1002', lhr, ist, cls.plane, departure_time=DEPARTURE + timedelta(hours=12))
+
+        cls.senior = make_pilot(cls.plane, 'Ayse Kaya', seniority='SENIOR')
+        cls.junior = make_pilot(cls.plane, 'Mehmet Oz', seniority='JUNIOR')
+        make_pilot(cls.plane, 'Short Range', seniority='JUNIOR', allowed_range=100.0)
+        make_attendant([cls.plane], 'Elif Demir', attendant_type='CHIEF', known_languages='Turkish, French')
+        for i in range(4):
+            make_attendant([cls.plane], f'Regular {i}')
+        cls.chef = make_attendant([cls.plane], 'Ali Can', attendant_type='CHEF', recipes=['Moussaka', 'Baklava'])
+
+        parent = make_passenger(cls.flight, 'Can Yilmaz')
+        friend = make_passenger(cls.flight, 'Ece Yilmaz', affiliated=[parent])
+        cls.infant = make_passenger(cls.flight, 'Bebek Yilmaz', age=1, parent=parent)
+        make_passenger(cls.flight, 'Oya Sen', seat_type='BUSINESS', affiliated=[friend])
+
+    def setUp(self):
+        super().setUp()
+        # Process-wide indexes, which the rollback between tests leaves behind
+        pilot_index.rebuild()
+        attendant_index.rebuild()
+        availability_index.rebuild()
+
+    def generate(self, flight_id='SC1001', **headers):
+        return self.client.get(f'/main/generate/{flight_id}/', **headers)
+
+    def test_generate(self):
+        response = self.generate()
+        self.assertEqual(response.status_code, 200)
+        roster = response.data
+        self.assertEqual([p['id'] for p in roster['pilots']], [self.senior.id, self.junior.id])
+        self.assertEqual(
+            [c['attendant_type'] for c in roster['cabin_crew']], ['CHIEF'] + ['REGULAR'] * 4 + ['CHEF'],
+        )
+        self.assertIn(roster['menu'][0], [{'dish_name': 'Moussaka'}, {'dish_name': 'Baklava'}])
+        seats = [p['seat_number'] for p in roster['passengers'] if p['id'] != self.infant.id]
+        self.assertEqual(len(seats), 3)
+        self.assertEqual(len(set(seats)), 3)
+        self.assertTrue(response['ETag'])
+
+        # Stored, and the same roster again while nothing changes
+        stored = FlightRoster.objects.get(flight_id='SC1001')
+        self.assertEqual(stored.assignments.count(), 2 + 6 + 4)
+        again = self.generate()
+        self.assertEqual(as_json(again.data), as_json(roster))
+        self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_conditional_get(self):
+        etag = self.generate()['ETag']
+        # Answered from the stored fingerprint, without reading the pools
+        with self.assertNumQueries(2):
+            response = self.generate(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(self.generate(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+        # A passenger's change reaches the roster, and the ETag moves on
+        self.client.patch(f'/api/passengers/passengers/{self.infant.id}/', {'name': 'Bebek Kaya'}, format='json')
+        response = self.generate(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Bebek Kaya', [p['name'] for p in response.data['passengers']])
+
+    def test_removed_people_keep_their_slot(self):
+        self.generate()
+        stored = FlightRoster.objects.get(flight_id='SC1001')
+        self.assertEqual(
+            list(stored.assignments.filter(kind='PILOT').order_by('position').values_list('name', flat=True)),
+            ['Ayse Kaya', 'Mehmet Oz'],
+        )
+
+        senior_id = self.senior.id
+        self.senior.delete()
+        roster = assemble(stored)
+        self.assertEqual(
+            roster['pilots'][0], {"id": senior_id, "name": 'Ayse Kaya', "seniority": 'SENIOR', "removed": True},
+        )
+        self.assertEqual(roster['pilots'][1]['id'], self.junior.id)
+        self.assertNotIn('removed', roster['pilots'][1])
+
+    def test_unknown_flight(self):
+        response = self.generate('SC9999')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['error'], 'Flight not found')
+
+    def test_jobs(self):
+        response = self.client.post('/main/generate/SC1001/')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(response.data['deduplicated'])
+        job_id = response.data['job_id']
+
+        # Still waiting: the same job
+        response = self.client.post('/main/generate/SC1001/')
+        self.assertEqual((response.data['job_id'], response.data['deduplicated']), (job_id, True))
+
+        response = self.client.get(f'/main/jobs/{job_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], RosterJob.PENDING)
+        self.assertEqual(self.client.get('/main/jobs/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/main/jobs/metrics/').status_code, 200)
+
+    def test_worker_claims_and_runs(self):
+        first, _ = submit_job('SC1001')
+        second, _ = submit_job('SC1002')
+        unknown, _ = submit_job('SC9999')
+
+        job = claim_job('w1')
+        self.assertEqual((job.id, job.status, job.worker, job.attempts), (first.id, RosterJob.RUNNING, 'w1', 1))
+        # A new job for a flight that is being generated waits for the running one
+        again, created = submit_job('SC1001')
+        self.assertTrue(created)
+        RosterJob.objects.filter(id=again.id).update(created_at=first.created_at)
+        self.assertEqual(claim_job('w2').id, second.id)
+        with mock.patch.object(jobs, 'CONCURRENCY', 2):
+            self.assertIsNone(claim_job('w3'))
+
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (RosterJob.DONE, ''))
+        self.assertTrue(FlightRoster.objects.filter(flight_id='SC1001').exists())
+
+        # Free again, and the older of the two left
+        self.assertEqual(claim_job('w1').id, again.id)
+        job = claim_job('w1')
+        self.assertEqual(job.id, unknown.id)
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (RosterJob.FAILED, 'Flight not found'))
+
+    def test_worker_retries(self):
+        submit_job('SC1001')
+        job = claim_job('w1')
+        with mock.patch.object(jobs, 'coalesced_generate', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('skycrewApp.jobs', 'WARNING'):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (RosterJob.PENDING, ''))
+        self.assertIn('database is locked', job.error)
+
+        # A worker that dies leaves the job RUNNING: it is requeued once stale,
+        # and failed after MAX_ATTEMPTS claims
+        for attempt in range(2, jobs.MAX_ATTEMPTS + 1):
+            job = claim_job('w1')
+            self.assertEqual(job.attempts, attempt)
+            RosterJob.objects.filter(id=job.id).update(
+                started_at=timezone.now() - timedelta(seconds=jobs.TIMEOUT + 1),
+            )
+        self.assertIsNone(claim_job('w2'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (RosterJob.FAILED, 'Worker timed out'))
+
+    def lock(self, flight_id, owner='elsewhere', seconds=60):
+        return RosterLock.objects.create(
+            flight_id=flight_id, owner=owner, expires_at=timezone.now() + timedelta(seconds=seconds),
+        )
+
+    def test_current_roster_skips_the_lock(self):
+        self.generate()
+        with mock.patch.object(coalesce, '_acquire', wraps=coalesce._acquire) as acquire:
+            self.assertEqual(self.generate().status_code, 200)
+        acquire.assert_not_called()
+        self.assertFalse(RosterLock.objects.exists())
+
+    def test_saturated(self):
+        self.lock('SC1002')
+        with mock.patch.object(coalesce, 'MAX_ACTIVE', 1):
+            response = self.generate()
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], str(coalesce.RETRY_AFTER))
+            response = self.client.post('/main/generate-batch/', {'flight_ids': ['SC1001']}, format='json')
+            self.assertEqual(response.status_code, 503)
+        self.assertFalse(FlightRoster.objects.exists())
+
+    def test_waits_for_the_lock_holder(self):
+        # Another worker is generating SC1001: wait, then serve what it stored
+        self.lock('SC1001')
+
+        def holder_finishes(seconds):
+            generate_and_store('SC1001')
+            RosterLock.objects.filter(owner='elsewhere').delete()
+
+        with mock.patch.object(coalesce.time, 'sleep', side_effect=holder_finishes) as sleep, \
+                mock.patch.object(coalesce, 'generate_and_store', wraps=generate_and_store) as generate:
+            response = self.generate()
+        self.assertEqual(response.status_code, 200)
+        sleep.assert_called_once()
+        generate.assert_not_called()
+
+        # A holder that never finishes: 503 once WAIT is up
+        self.lock('SC1002')
+        with mock.patch.object(coalesce, 'WAIT', 0), mock.patch.object(coalesce.time, 'sleep'):
+            self.assertEqual(self.generate('SC1002').status_code, 503)
+
+    def test_expired_lock_is_taken_over(self):
+        # Left behind by a worker that died mid-generation
+        self.lock('SC1001', owner='dead', seconds=-1)
+        self.assertEqual(self.generate().status_code, 200)
+        self.assertFalse(RosterLock.objects.exists())
+
+    def test_requests_share_one_generation(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def generate_once(flight_id):
+            calls.append(flight_id)
+            started.set()
+            release.wait(5)
+            return {"flight_id": flight_id}, 'fingerprint'
+
+        results = []
+        with mock.patch.object(coalesce, '_generate_once', side_effect=generate_once):
+            leader = threading.Thread(target=lambda: results.append(coalesced_generate('SC1001')))
+            leader.start()
+            started.wait(5)
+            threading.Timer(0.1, release.set).start()
+            results.append(coalesced_generate('SC1001'))
+            leader.join(5)
+        self.assertEqual(calls, ['SC1001'])
+        self.assertEqual(results, [({"flight_id": 'SC1001'}, 'fingerprint')] * 2)
+
+    def test_batch_leaves_out_locked_flights(self):
+        self.lock('SC1002')
+        response = self.client.post('/main/generate-batch/', {'flight_ids': ['SC1001', 'SC1002']}, format='json')
+        self.assertEqual((response.data['generated'], response.data['failed']), (1, 1))
+        self.assertEqual(
+            response.data['results'][0],
+            {"flight_id": 'SC1002', "status": "failed", "error": "Being generated by another request, try again"},
+        )
+        self.assertEqual(list(FlightRoster.objects.values_list('flight_id', flat=True)), ['SC1001'])
+        self.assertEqual(list(RosterLock.objects.values_list('owner', flat=True)), ['elsewhere'])
+
+    def slot_rows(self, flight_id='SC1001'):
+        # {(kind, person_id): (row id, seat)} of a stored roster
+        return {
+            (kind, person_id): (row_id, seat)
+            for row_id, kind, person_id, seat in RosterAssignment.objects.filter(roster__flight_id=flight_id)
+            .values_list('id', 'kind', 'person_id', 'seat')
+        }
+
+    def test_repair_replaces_a_departed_pilot(self):
+        self.generate()
+        spare = make_pilot(self.plane, 'Zeynep Ak', seniority='SENIOR')
+        before = self.slot_rows()
+        senior_id = self.senior.id
+        self.senior.delete()
+        pilot_index.rebuild()
+
+        result = repair.repair(people=[('PILOT', senior_id)])
+        self.assertEqual(result, {"rosters": 1, "repaired": 1, "slots": 1, "removed": 0})
+        after = self.slot_rows()
+        # Only the departed pilot's row was rewritten, everyone else's stayed
+        del before[('PILOT', senior_id)]
+        self.assertEqual({key: after.pop(key) for key in before}, before)
+        self.assertEqual(list(after), [('PILOT', spare.id)])
+
+        # Stored under the current inputs: served as repaired, not regenerated
+        response = self.generate()
+        self.assertEqual([p['id'] for p in response.data['pilots']], [spare.id, self.junior.id])
+
+    def test_repair_keeps_valid_seats(self):
+        self.generate()
+        before = self.slot_rows()
+        late = make_passenger(self.flight, 'Deniz Ay')
+
+        result = repair.repair(flight_ids=[self.flight.id])
+        self.assertEqual((result["repaired"], result["slots"]), (1, 1))
+        after = self.slot_rows()
+        self.assertEqual({key: after.pop(key) for key in before}, before)
+        seat = after.pop(('PASSENGER', late.id))[1]
+        self.assertEqual(after, {})
+        self.assertNotIn(seat, {seat for _, seat in before.values()} | {None})
+
+    def test_repair_removes_the_roster_of_a_deleted_flight(self):
+        self.generate()
+        self.flight.delete()
+        result = repair.repair(flight_numbers=['SC1001'])
+        self.assertEqual(result["removed"], 1)
+        self.assertFalse(FlightRoster.objects.filter(flight_id='SC1001').exists())
+        self.assertFalse(RosterAssignment.objects.filter(roster__flight_id='SC1001').exists())
+
+    def test_repair_retries_then_gives_up(self):
+        queue = repair.RepairQueue(delay=1)
+        batch = ({('PILOT', 1)}, set(), set())
+        locked = OperationalError('database is locked')
+        with mock.patch.object(repair, 'repair', side_effect=locked), \
+                mock.patch.object(queue, '_mark') as mark, self.assertLogs('skycrewApp.repair') as logs:
+            for _ in range(repair.MAX_RETRIES):
+                queue._run(batch)
+            self.assertEqual(mark.call_count, repair.MAX_RETRIES)
+            queue._run(batch)
+            self.assertEqual(mark.call_count, repair.MAX_RETRIES)
+        self.assertIn('ERROR:skycrewApp.repair:Roster repair failed: database is locked', logs.output)
+        self.assertEqual((queue.retries, queue.stats()["errors"]), (0, repair.MAX_RETRIES + 1))
+
+        # A roster lock held past WAIT is retried the same way
+        with mock.patch.object(repair, 'repair', side_effect=Saturated()), \
+                mock.patch.object(queue, '_mark') as mark, self.assertLogs('skycrewApp.repair', 'WARNING'):
+            queue._run(batch)
+        mark.assert_called_once_with(*batch)
+
+    def test_batch(self):
+        response = self.client.post(
+            '/main/generate-batch/', {'flight_ids': ['SC1001', 'SC1002', 'SC9999']}, format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['requested'], response.data['generated'], response.data['failed']), (3, 2, 1))
+        self.assertEqual(FlightRoster.objects.count(), 2)
+
+        # Same inputs: nothing to rebuild
+        response = self.client.post(
+            '/main/generate-batch/',
+            {'start': DEPARTURE.isoformat(), 'end': (DEPARTURE + timedelta(days=1)).isoformat()}, format='json',
+        )
+        self.assertEqual((response.data['generated'], response.data['unchanged']), (0, 2))
+
+    def test_batch_rejects_bad_requests(self):
+        cases = [
+            {},
+            {'flight_ids': 'SC1001'},
+            {'hours': 'soon'},
+            # Past the datetime range, and not a window at all
+            {'hours': 1e308},
+            {'hours': 'inf'},
+            {'hours': -1},
+            {'start': 'yesterday'},
+            {'start': DEPARTURE.isoformat(), 'end': '2025-13-01T00:00:00'},
+            {'flight_ids': ['SC1001'], 'time_limit': 'long'},
+            {'flight_ids': ['SC1001'], 'time_limit': 'nan'},
+        ]
+        for payload in cases:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.client.post('/main/generate-batch/', payload, format='json').status_code, 400)
+
+        for hours in ('inf', '1e308'):
+            with self.subTest(hours=hours), self.assertRaises(CommandError):
+                call_command('generate_rosters', '--hours', hours)
+
+    def test_batch_seats_in_spawned_processes(self):
+        with mock.patch('skycrewApp.batch.MIN_FLIGHTS_FOR_POOL', 1):
+            report = generate_batch(['SC1001', 'SC1002'], workers=2)
+        self.assertEqual(report['generated'], 2)
+        # Everyone seated by the worker processes, the infant on a parent's lap
+        seats = dict(
+            FlightRoster.objects.get(flight_id='SC1001').assignments.filter(kind='PASSENGER')
+            .values_list('person_id', 'seat')
+        )
+        self.assertEqual(seats.pop(self.infant.id), 'LAP')
+        self.assertEqual(len(set(seats.values()) - {None, 'LAP'}), 3)
+
+    def test_staffing(self):
+        response = self.client.get('/main/staffing/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['flight_id'] for r in response.data['results']], ['SC1001', 'SC1002'])
+        self.assertEqual(response.data['results'][0]['short'], [])
+
+        # Only the chief speaks French: everyone else is short
+        response = self.client.get('/main/staffing/', {'language': 'French', 'understaffed': '1'})
+        self.assertEqual(response.data['understaffed'], 2)
+        self.assertIn('SENIOR', response.data['results'][0]['short'])
+
+        window = {'start': (DEPARTURE + timedelta(hours=1)).isoformat()}
+        response = self.client.get('/main/staffing/', window)
+        self.assertEqual([r['flight_id'] for r in response.data['results']], ['SC1002'])
+
+        bad = ['soon', '1e400', 'inf', 'nan', '-1', '1e308']
+        for params in [{'hours': h} for h in bad] + [{'start': 'yesterday'}, {'end': '2025-02-30T00:00:00'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/main/staffing/', params).status_code, 400)
+
+    def test_assignments(self):
+        self.generate('SC1001')
+        self.generate('SC1002')
+        # The flights are 12 hours apart: the same crew flies both, in departure order
+        response = self.client.get('/main/assignments/', {'kind': 'pilot', 'person_id': self.senior.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['flight_id'], r['role']) for r in response.data['results']],
+            [('SC1001', 'SENIOR'), ('SC1002', 'SENIOR')],
+        )
+
+        response = self.client.get('/main/assignments/', {'kind': 'PASSENGER', 'person_id': self.infant.id})
+        self.assertEqual([r['flight_id'] for r in response.data['results']], ['SC1001'])
+
+        window = {'start': (DEPARTURE + timedelta(hours=1)).isoformat()}
+        response = self.client.get('/main/assignments/', {'kind': 'ATTENDANT', 'person_id': self.chef.id, **window})
+        self.assertEqual([(r['flight_id'], r['role']) for r in response.data['results']], [('SC1002', 'CHEF')])
+
+        cases = [
+            {'kind': 'CAPTAIN', 'person_id': 1},
+            {'kind': 'PILOT', 'person_id': 'me'},
+            {'kind': 'PILOT', 'person_id': 1, 'start': 'yesterday'},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/main/assignments/', params).status_code, 400)
+
+    def test_index_stats(self):
+        response = self.client.get('/main/index-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data), {'pilots', 'attendants', 'availability', 'repairs', 'reference_data'},
+        )
+
+
+class PilotIndexTests(TestCase):
+    # The eligibility buckets, and the signals that keep them current
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boeing = make_plane_type('Boeing 737')
+        cls.airbus = make_plane_type('Airbus A320')
+        cls.near = make_pilot(cls.boeing, 'Near', allowed_range=1000.0)
+        cls.far = make_pilot(cls.boeing, 'Far', allowed_range=8000.0)
+        cls.mid = make_pilot(cls.boeing, 'Mid', allowed_range=3000.0)
+        cls.junior = make_pilot(cls.boeing, 'Junior', seniority='JUNIOR', allowed_range=3000.0)
+        make_pilot(cls.airbus, 'Airbus', allowed_range=9000.0)
+
+    def setUp(self):
+        pilot_index.rebuild()
+
+    def names(self, pilots):
+        return [p['name'] for p in pilots]
+
+    def test_eligible(self):
+        cases = [
+            # plane, seniority, min range, expected (shortest range first)
+            (self.boeing.id, 'SENIOR', 0, ['Near', 'Mid', 'Far']),
+            (self.boeing.id, 'SENIOR', 3000.0, ['Mid', 'Far']),
+            (self.boeing.id, 'SENIOR', 3000.5, ['Far']),
+            (self.boeing.id, 'SENIOR', 9000.0, []),
+            (self.boeing.id, 'JUNIOR', 0, ['Junior']),
+            (self.boeing.id, 'TRAINEE', 0, []),
+            (self.airbus.id, 'SENIOR', 0, ['Airbus']),
+            (999, 'SENIOR', 0, []),
+        ]
+        for plane_type, seniority, min_range, expected in cases:
+            with self.subTest(plane_type=plane_type, seniority=seniority, min_range=min_range):
+                self.assertEqual(self.names(pilot_index.eligible(plane_type, seniority, min_range)), expected)
+
+        buckets = pilot_index.candidates(self.boeing.id, 2000.0)
+        self.assertEqual({s: self.names(b) for s, b in buckets.items()},
+                         {'TRAINEE': [], 'JUNIOR': ['Junior'], 'SENIOR': ['Mid', 'Far']})
+
+    def test_hands_out_copies(self):
+        pilot = pilot_index.eligible(self.boeing.id, 'SENIOR', 0)[0]
+        pilot['name'] = 'Changed'
+        self.assertEqual(self.names(pilot_index.eligible(self.boeing.id, 'SENIOR', 0)), ['Near', 'Mid', 'Far'])
+
+    def test_signals_patch_the_index(self):
+        # Saves and deletes move pilots between buckets without a rebuild,
+        # ending where a rebuild from the table would
+        rebuilds = pilot_index.rebuilds
+        with self.captureOnCommitCallbacks(execute=True):
+            make_pilot(self.boeing, 'New', allowed_range=2000.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.far.allowed_range = 500.0
+            self.far.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mid.seniority = 'JUNIOR'
+            self.mid.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.near.allowed_vehicle = self.airbus
+            self.near.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.junior.delete()
+
+        self.assertEqual(pilot_index.rebuilds, rebuilds)
+        self.assertEqual(self.names(pilot_index.eligible(self.boeing.id, 'SENIOR', 0)), ['Far', 'New'])
+        self.assertEqual(self.names(pilot_index.eligible(self.boeing.id, 'JUNIOR', 0)), ['Mid'])
+        self.assertEqual(self.names(pilot_index.eligible(self.airbus.id, 'SENIOR', 0)), ['Near', 'Airbus'])
+
+        fresh = PilotIndex()
+        fresh.rebuild()
+        self.assertEqual(pilot_index.buckets, fresh.buckets)
+        self.assertEqual(pilot_index.locations, fresh.locations)
+
+    def test_rolled_back_saves_leave_it_alone(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            make_pilot(self.boeing, 'Rolled back')
+        self.assertNotIn('Rolled back', self.names(pilot_index.eligible(self.boeing.id, 'SENIOR', 0)))
+
+
+class AttendantIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.plane = make_plane_type()
+        make_attendant([cls.plane], 'Chef', attendant_type='CHEF', recipes=['Moussaka'])
+
+    def setUp(self):
+        attendant_index.rebuild()
+
+    def test_hands_out_copies(self):
+        # A roster's menu holds the chef's recipe: changing it leaves the index alone
+        chef = attendant_index.crew(self.plane.id, 'CHEF')[0]
+        chef['recipes'][0]['dish_name'] = 'Changed'
+        chef['allowed_vehicles'].clear()
+        chef = attendant_index.crew(self.plane.id, 'CHEF')[0]
+        self.assertEqual((chef['recipes'][0]['dish_name'], chef['allowed_vehicles']), ('Moussaka', [self.plane.id]))
+
+
+class DoubleBookingTests(TestCase):
+    # Overlapping flights never share a pilot or attendant, even when this
+    # worker's availability index hasn't seen what another worker stored
+
+    @classmethod
+    def setUpTestData(cls):
+        plane = make_plane_type()
+        ist = make_airport('IST')
+        lhr = make_airport('LHR', country='United Kingdom')
+        make_flight('SC1001', ist, lhr, plane)
+        # An hour after SC1001 leaves, while it is still in the air
+        make_flight('SC1003', ist, lhr, plane, departure_time=DEPARTURE + timedelta(hours=1))
+        make_flight('SC1002', lhr, ist, plane, departure_time=DEPARTURE + timedelta(hours=12))
+        for i in range(2):
+            make_pilot(plane, f'Senior {i}', seniority='SENIOR')
+            make_pilot(plane, f'Junior {i}', seniority='JUNIOR')
+            make_attendant([plane], f'Chief {i}', attendant_type='CHIEF')
+            make_attendant([plane], f'Chef {i}', attendant_type='CHEF', recipes=['Pilaf'])
+        for i in range(8):
+            make_attendant([plane], f'Regular {i}')
+
+    def setUp(self):
+        pilot_index.rebuild()
+        attendant_index.rebuild()
+        availability_index.rebuild()
+
+    def crew(self, flight_id):
+        return set(
+            RosterAssignment.objects.filter(roster__flight_id=flight_id)
+            .exclude(kind=RosterAssignment.PASSENGER).values_list('kind', 'person_id')
+        )
+
+    def store_elsewhere(self, flight_id):
+        # As another worker would: stored, but never booked in our index
+        with self.captureOnCommitCallbacks(execute=False):
+            generate_and_store(flight_id)
+
+    def test_stale_index_is_caught_on_save(self):
+        self.store_elsewhere('SC1001')
+        rebuilds = availability_index.rebuilds
+        with self.captureOnCommitCallbacks(execute=True):
+            roster, _ = generate_and_store('SC1003')
+
+        self.assertNotIn('error', roster)
+        self.assertEqual(len(self.crew('SC1003')), 2 + 6)
+        self.assertEqual(self.crew('SC1001') & self.crew('SC1003'), set())
+        self.assertEqual(availability_index.rebuilds, rebuilds + 1)
+
+    def test_failed_save_books_nobody(self):
+        with mock.patch('skycrewApp.rosters._replace_assignments', side_effect=OperationalError('disk I/O error')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(OperationalError):
+                generate_and_store('SC1001')
+        self.assertEqual(availability_index.stats()['flights'], 0)
+        self.assertFalse(FlightRoster.objects.exists())
+
+        # Nobody is held back by the roster that was never stored
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_and_store('SC1001')
+        self.assertEqual(len(self.crew('SC1001')), 2 + 6)
+
+    def test_batch_leaves_out_clashing_rosters(self):
+        self.store_elsewhere('SC1001')
+        with self.captureOnCommitCallbacks(execute=True):
+            report = generate_batch(['SC1003', 'SC1002'], workers=1)
+        results = {r['flight_id']: r['status'] for r in report['results']}
+        self.assertEqual(results, {'SC1003': 'failed', 'SC1002': 'ok'})
+        self.assertEqual((report['generated'], report['failed']), (1, 1))
+        self.assertFalse(FlightRoster.objects.filter(flight_id='SC1003').exists())
+
+        # Caught up: the retry picks the other crew
+        with self.captureOnCommitCallbacks(execute=True):
+            report = generate_batch(['SC1003'], workers=1)
+        self.assertEqual(report['generated'], 1)
+        self.assertEqual(self.crew('SC1001') & self.crew('SC1003'), set())
+
+    def test_rest_gap(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_and_store('SC1001')
+        roster = {'pilots': [{'id': person_id} for kind, person_id in self.crew('SC1001') if kind == 'PILOT']}
+        landed = (DEPARTURE + timedelta(hours=3, minutes=45)).timestamp()
+        cases = [
+            # start of the other duty, clashes
+            (landed + MIN_REST, False),
+            (landed + MIN_REST - 60, True),
+            (DEPARTURE.timestamp() - 3600 - MIN_REST, False),
+            (DEPARTURE.timestamp() - 3600 - MIN_REST + 60, True),
+        ]
+        for start, clashes in cases:
+            with self.subTest(start=start):
+                found = stored_conflicts('SC9999', start, start + 3600, roster)
+                self.assertEqual(bool(found), clashes)
+                if clashes:
+                    self.assertEqual({flight_id for _, _, flight_id in found}, {'SC1001'})
+
+
+class FakeResponse:
+    # The parts of a requests.Response that upstream reads
+
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_lines(self):
+        return iter(self.content.splitlines())
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RoutedSession:
+    """
+    Stands in for upstream's pooled requests.Session. Every GET is logged in
+    calls as a path and answered by answer(path, params), which returns a
+    FakeResponse or an exception to raise; by default the test's own API.
+    """
+
+    def __init__(self, client, answer=None):
+        self.client = client
+        self.answer = answer or self.forward
+        self.calls = []
+
+    def forward(self, path, params):
+        response = self.client.get(path, params)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return FakeResponse(response.status_code, content)
+
+    def get(self, url, params=None, stream=False, timeout=None):
+        parts = urlsplit(url)
+        path = f'{parts.path}?{parts.query}' if parts.query else parts.path
+        self.calls.append(path)
+        result = self.answer(path, params)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def run_in_turn(calls):
+    # upstream.run_concurrently without the threads, which would each open
+    # a connection that can't see the test's uncommitted rows
+    return {name: function(*args) for name, (function, *args) in calls.items()}
+
+
+class UpstreamTestMixin:
+    # Upstream calls go to a RoutedSession, with no breakers, stale copies,
+    # replicas or retry sleeps left over from other tests
+
+    def setUp(self):
+        super().setUp()
+        self.session = RoutedSession(self.client)
+        for patcher in (
+            mock.patch.object(upstream, '_session', self.session),
+            mock.patch.object(upstream, 'run_concurrently', run_in_turn),
+            mock.patch('skycrewApp.providers.run_concurrently', run_in_turn),
+            mock.patch.object(upstream, 'RETRY_BACKOFF', 0),
+            mock.patch.dict(upstream._breakers, clear=True),
+            mock.patch.dict(upstream._stale_cache, clear=True),
+            mock.patch.dict(upstream._replicas, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class HttpProviderTests(UpstreamTestMixin, QueryBudgetTestCase):
+    # Split-services mode reads the same data as the monolith
+
+    @classmethod
+    def setUpTestData(cls):
+        plane = make_plane_type()
+        make_flight('SC1001', plane_type=plane)
+        # Created out of roster order, and more than a page of them
+        Pilot.objects.bulk_create(
+            Pilot(
+                name=f'Pilot {i}', age=40, gender='Female', nationality='Turkish', known_languages='English',
+                allowed_vehicle=plane, allowed_range=9000.0 - (i % 7) * 1000,
+                seniority=('SENIOR', 'JUNIOR', 'TRAINEE')[i % 3],
+            )
+            for i in range(130)
+        )
+        for attendant_type in ('CHEF', 'REGULAR', 'CHIEF', 'REGULAR'):
+            make_attendant([plane], f'{attendant_type.title()} crew', attendant_type=attendant_type)
+
+    def setUp(self):
+        super().setUp()
+        pilot_index.rebuild()
+        attendant_index.rebuild()
+
+    def test_same_pools_as_the_orm(self):
+        flight_info = OrmDataProvider().get_flight('SC1001')
+        self.assertEqual(as_json(HttpDataProvider().get_flight('SC1001')), as_json(flight_info))
+
+        orm = OrmDataProvider().get_pools(flight_info)
+        http = HttpDataProvider().get_pools(flight_info)
+        self.assertEqual(
+            sum(len(bucket) for bucket in http['pilots'].values()),
+            Pilot.objects.filter(allowed_range__gte=flight_info['distance']).count(),
+        )
+        self.assertEqual(as_json(http), as_json(orm))
+        self.assertEqual(fingerprint_inputs(flight_info, http), fingerprint_inputs(flight_info, orm))
+        # The pilots took two pages
+        self.assertEqual(sum(call.startswith('/api/pilots/pilots/') for call in self.session.calls), 2)
+
+    def test_outage_fails_the_roster_loudly(self):
+        # An upstream down is a 503 naming it, never an empty crew
+        self.session.answer = lambda path, params: upstream.requests.Timeout('read timed out')
+        with mock.patch('skycrewApp.logic.get_provider', HttpDataProvider):
+            response = self.client.get('/main/generate/SC1001/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['upstream'], 'flight-info/flights')
+
+    def test_replica_follows_the_pages(self):
+        replica = upstream.Replica('pilots/pilots', interval=0)
+        with mock.patch.object(ChangesPagination, 'page_size', 50):
+            self.assertEqual(len(replica.select()), 130)
+            self.assertEqual(len(self.session.calls), 3)
+
+            # A sync that fails after the first page keeps the copy and the token
+            token, start = replica.token, len(self.session.calls)
+            self.session.answer = lambda path, params: (
+                self.session.forward(path, params) if len(self.session.calls) == start + 1
+                else upstream.requests.ConnectionError('reset')
+            )
+            with self.assertLogs('skycrewApp.upstream', 'WARNING'):
+                self.assertEqual(len(replica.select()), 130)
+            self.assertEqual(replica.token, token)
+
+            self.session.answer = self.session.forward
+            gone = Pilot.objects.first()
+            with self.captureOnCommitCallbacks(execute=True):
+                gone.delete()
+            rows = replica.select()
+        self.assertEqual(len(rows), 129)
+        self.assertEqual([row['id'] for row in rows], sorted(Pilot.objects.values_list('id', flat=True)))
+
+
+class UpstreamGuardTests(UpstreamTestMixin, SimpleTestCase):
+    # Timeouts, retries, the circuit breaker and stale-if-error, against scripted answers
+
+    ENDPOINT = 'pilots/pilots'
+    PAGE = FakeResponse(200, b'{"next": null, "results": [{"id": 1}]}')
+
+    def script(self, *answers):
+        # Answer successive GETs with these, then keep repeating the last one
+        answers = list(answers)
+        self.session.answer = lambda path, params: answers.pop(0) if len(answers) > 1 else answers[0]
+
+    def test_retries_network_errors_and_5xx(self):
+        self.script(upstream.requests.ConnectionError('reset'), FakeResponse(503), self.PAGE)
+        self.assertEqual(fetch_api_data(self.ENDPOINT), [{'id': 1}])
+        self.assertEqual(len(self.session.calls), 3)
+
+    def test_gives_up_after_the_retries(self):
+        self.script(FakeResponse(502))
+        with self.assertRaises(UpstreamError) as raised:
+            fetch_api_data(self.ENDPOINT)
+        self.assertEqual(raised.exception.reason, 'HTTP 502')
+        self.assertEqual(len(self.session.calls), upstream.RETRIES + 1)
+
+    def test_client_errors_are_answers(self):
+        # Not retried, not a breaker failure, not covered up with stale data
+        self.script(self.PAGE, FakeResponse(400))
+        fetch_api_data(self.ENDPOINT)
+        for _ in range(upstream.BREAKER_FAILURES + 1):
+            with self.assertRaises(UpstreamClientError):
+                fetch_api_data(self.ENDPOINT)
+        self.assertEqual(len(self.session.calls), upstream.BREAKER_FAILURES + 2)
+        self.assertIsNone(upstream.get_breaker(self.ENDPOINT).opened_at)
+
+        self.script(FakeResponse(404))
+        self.assertIsNone(fetch_api_object('flight-info/planes', 7))
+
+    def test_throttling_is_a_failure(self):
+        # An overloaded service's 429: not retried at once, but stale data
+        # covers it and it counts towards the breaker
+        self.script(self.PAGE, FakeResponse(429))
+        fetch_api_data(self.ENDPOINT)
+        with self.assertLogs('skycrewApp.upstream', 'WARNING'):
+            self.assertEqual(fetch_api_data(self.ENDPOINT), [{'id': 1}])
+        self.assertEqual(len(self.session.calls), 2)
+        self.assertEqual(upstream.get_breaker(self.ENDPOINT).failures, 1)
+
+    def test_breaker_opens_and_probes(self):
+        self.script(FakeResponse(500))
+        for _ in range(upstream.BREAKER_FAILURES):
+            with self.assertRaises(UpstreamError):
+                fetch_api_data(self.ENDPOINT)
+        calls = len(self.session.calls)
+
+        # Open: fails at once, without a request
+        with self.assertRaises(UpstreamError) as raised:
+            fetch_api_data(self.ENDPOINT)
+        self.assertEqual(raised.exception.reason, 'circuit open')
+        self.assertEqual(len(self.session.calls), calls)
+
+        # After the reset time one probe goes through, and closes it again
+        breaker = upstream.get_breaker(self.ENDPOINT)
+        breaker.opened_at -= breaker.reset_after
+        self.script(self.PAGE)
+        self.assertEqual(fetch_api_data(self.ENDPOINT), [{'id': 1}])
+        self.assertIsNone(breaker.opened_at)
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = upstream.CircuitBreaker(failures=1, reset_after=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def test_serves_stale_data_while_fresh_enough(self):
+        self.script(self.PAGE, FakeResponse(503))
+        self.assertEqual(fetch_api_data(self.ENDPOINT, {'seniority': 'SENIOR'}), [{'id': 1}])
+        with self.assertLogs('skycrewApp.upstream', 'WARNING'):
+            self.assertEqual(fetch_api_data(self.ENDPOINT, {'seniority': 'SENIOR'}), [{'id': 1}])
+
+        # Only for the same request, and only for STALE_FOR seconds
+        with self.assertRaises(UpstreamError):
+            fetch_api_data(self.ENDPOINT, {'seniority': 'JUNIOR'})
+        with mock.patch.object(upstream, 'STALE_FOR', -1), self.assertRaises(UpstreamError):
+            fetch_api_data(self.ENDPOINT, {'seniority': 'SENIOR'})
@@ -0,0 +1,408 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Where the HTTP backend finds the other services
+BASE_URL = getattr(settings, 'SKYCREW_API_BASE_URL', "http://127.0.0.1:8000/api")
+
+# True -> ask list endpoints for NDJSON instead of walking the cursor pages
+STREAM_LISTS = getattr(settings, 'SKYCREW_HTTP_STREAM', False)
+
+# Keep-alive connections kept open per upstream host, and how many hosts we pool for
+POOL_SIZE = getattr(settings, 'SKYCREW_HTTP_POOL_SIZE', 10)
+POOL_HOSTS = getattr(settings, 'SKYCREW_HTTP_POOL_HOSTS', 4)
+
+# (connect, read) timeouts in seconds, per endpoint with a 'default' fallback
+TIMEOUTS = getattr(settings, 'SKYCREW_HTTP_TIMEOUTS', {'default': (3.05, 10)})
+
+# Extra attempts after a connection error / timeout / 5xx, with jittered backoff
+RETRIES = getattr(settings, 'SKYCREW_HTTP_RETRIES', 2)
+RETRY_BACKOFF = getattr(settings, 'SKYCREW_HTTP_RETRY_BACKOFF', 0.2)
+
+# Open the circuit after this many failures in a row, try again after reset seconds
+BREAKER_FAILURES = getattr(settings, 'SKYCREW_HTTP_BREAKER_FAILURES', 5)
+BREAKER_RESET = getattr(settings, 'SKYCREW_HTTP_BREAKER_RESET', 30)
+
+# How old a last-good response may be and still be served when the upstream fails
+STALE_FOR = getattr(settings, 'SKYCREW_HTTP_STALE_FOR', 300)
+STALE_ENTRIES = 256
+
+RETRY_STATUSES = {502, 503, 504}
+
+# 4xx the service may send while overloaded: failures, not answers
+THROTTLE_STATUSES = {408, 429}
+
+# Keep a local copy of whole resources in sync through their /changes/ endpoint
+# (skycrew.sync) and answer list/object fetches from it; re-sync at most this often
+REPLICA = getattr(settings, 'SKYCREW_HTTP_REPLICA', False)
+REPLICA_INTERVAL = getattr(settings, 'SKYCREW_HTTP_REPLICA_INTERVAL', 2)
+
+# Replicated endpoints, and how each list filter the providers use applies to a
+# row (the same test the ViewSet's get_queryset makes). A fetch with any other
+# parameter goes to the service as before.
+REPLICA_FILTERS = {
+    'flight-info/flights': {
+        'flight_number': lambda row, value: row['flight_number'] == value,
+    },
+    'flight-info/planes': {},
+    'flight-info/airports': {},
+    'pilots/pilots': {
+        'allowed_vehicle': lambda row, value: row['allowed_vehicle'] == int(value),
+        'seniority': lambda row, value: row['seniority'] == str(value).upper(),
+        'min_range': lambda row, value: row['allowed_range'] >= float(value),
+    },
+    'cabin-crew/attendants': {
+        'allowed_vehicle': lambda row, value: int(value) in row['allowed_vehicles'],
+        'attendant_type': lambda row, value: row['attendant_type'] == str(value).upper(),
+    },
+    'passengers/passengers': {
+        'flight': lambda row, value: row['flight'] == int(value),
+    },
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+# Shared by every request, so we don't spin up threads per roster
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='upstream')
+
+
+class UpstreamError(Exception):
+    # An upstream service failed and we had nothing fresh enough to fall back on
+    def __init__(self, endpoint, reason):
+        self.endpoint = endpoint
+        self.reason = reason
+        super().__init__(f"{endpoint}: {reason}")
+
+
+class UpstreamClientError(UpstreamError):
+    # The service answered with a 4xx (e.g. 404 for a deleted object): it is
+    # up, so this neither trips the breaker nor falls back on stale data
+    def __init__(self, endpoint, status):
+        self.status = status
+        super().__init__(endpoint, f"HTTP {status}")
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint breaker. After BREAKER_FAILURES failures in a row it opens
+    and calls fail immediately (no worker waits on a dead service). After
+    BREAKER_RESET seconds one trial call is let through; success closes it.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_after or self.trial_running:
+                return False
+            # Half-open: let exactly one call probe the upstream
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.failures >= self.max_failures:
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# (endpoint, params) -> (fetched_at, data), least recently used first
+_stale_cache = OrderedDict()
+_stale_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker()
+        return _breakers[endpoint]
+
+
+def get_session():
+    # One pooled Session per process: connections are reused between calls
+    # and at most POOL_SIZE are kept open to each host.
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE, pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+class Replica:
+    """
+    A local copy of one resource, kept current by asking its /changes/
+    endpoint for what changed since the last token, so steady-state traffic
+    follows the change rate rather than the table size. Rows are kept by
+    id in id order, like the list endpoints return them.
+    """
+
+    def __init__(self, endpoint, interval=REPLICA_INTERVAL):
+        self.endpoint = endpoint
+        self.interval = interval
+        self.rows = {}
+        self.token = None
+        self.synced_at = None
+        self.lock = threading.Lock()
+        self.syncs = 0
+
+    def refresh(self):
+        # Sync unless done in the last `interval` seconds; if the service is
+        # down, keep serving the copy for up to STALE_FOR
+        with self.lock:
+            if self.synced_at is not None and time.monotonic() - self.synced_at < self.interval:
+                return
+            breaker = get_breaker(self.endpoint)
+            if breaker.allow():
+                try:
+                    self._sync()
+                except UpstreamClientError:
+                    # The service is up but refused the request: nothing to fall back on
+                    breaker.record_success()
+                    raise
+                except Exception as e:
+                    breaker.record_failure()
+                    error = e if isinstance(e, UpstreamError) else UpstreamError(self.endpoint, f"{type(e).__name__}: {e}")
+                else:
+                    breaker.record_success()
+                    return
+            else:
+                error = UpstreamError(self.endpoint, "circuit open")
+            if self.synced_at is None or time.monotonic() - self.synced_at > STALE_FOR:
+                raise error
+            logger.warning("Serving stale %s replica after upstream failure (%s)", self.endpoint, error.reason)
+
+    def _sync(self):
+        # Follow the pages of changed rows, and apply them once all have
+        # arrived: a sync that fails halfway leaves the copy and token as they were
+        params = {'since': self.token} if self.token else None
+        url = f"{BASE_URL}/{self.endpoint}/changes/"
+        first = None
+        changed = []
+        while url:
+            data = _decode(self.endpoint, _get(self.endpoint, url, params))
+            first = first or data
+            changed.extend(data['changed'])
+            # The next link already carries the token and the cursor
+            url, params = data.get('next'), None
+        if first['reset'] or changed or first['deleted']:
+            # Copy on write: select() may be iterating the current dict
+            rows = {} if first['reset'] else dict(self.rows)
+            for row in changed:
+                rows[row['id']] = row
+            for pk in first['deleted']:
+                rows.pop(pk, None)
+            # New rows were appended, put them back in id order
+            self.rows = dict(sorted(rows.items()))
+        # The first page's: rows changed while we paged are newer than it
+        self.token = first['token']
+        self.synced_at = time.monotonic()
+        self.syncs += 1
+
+    def select(self, params=None):
+        self.refresh()
+        filters = REPLICA_FILTERS[self.endpoint]
+        tests = [(filters[name], value) for name, value in (params or {}).items()]
+        rows = self.rows
+        return [row for row in rows.values() if all(test(row, value) for test, value in tests)]
+
+    def get(self, pk):
+        self.refresh()
+        return self.rows.get(int(pk))
+
+
+_replicas = {}
+_replicas_lock = threading.Lock()
+
+
+def get_replica(endpoint, params=None):
+    # The endpoint's replica if replication is on and every filter can be applied locally
+    if not REPLICA or endpoint not in REPLICA_FILTERS:
+        return None
+    if any(name not in REPLICA_FILTERS[endpoint] for name in (params or {})):
+        return None
+    with _replicas_lock:
+        if endpoint not in _replicas:
+            _replicas[endpoint] = Replica(endpoint)
+        return _replicas[endpoint]
+
+
+def run_concurrently(calls):
+    """
+    Run independent fetches at the same time.
+    calls is {name: (function, args...)}, the result is {name: return value},
+    so the total time is the slowest call instead of the sum.
+    """
+    futures = {name: _executor.submit(*call) for name, call in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def fetch_api_data(endpoint, params=None, stream=None):
+    """
+    GET a list endpoint and return every row.
+
+    With SKYCREW_HTTP_REPLICA on, rows come from the endpoint's local
+    replica (see Replica) when every param can be applied locally.
+    Otherwise the request is guarded by a timeout, bounded retries and the endpoint's circuit breaker.
+    If the upstream can't answer, the last good response is served as long
+    as it is younger than SKYCREW_HTTP_STALE_FOR; otherwise UpstreamError
+    is raised (never a silent empty list).
+    """
+    replica = get_replica(endpoint, params)
+    if replica is not None:
+        return replica.select(params)
+    if stream is None:
+        stream = STREAM_LISTS
+    cache_key = (endpoint, tuple(sorted((params or {}).items())))
+    if stream:
+        return _guarded(endpoint, cache_key, _fetch_stream, endpoint, params)
+    return _guarded(endpoint, cache_key, _fetch_pages, endpoint, params)
+
+
+def fetch_api_object(endpoint, pk):
+    # GET a single object (e.g. flight-info/planes/3/), same protections as the
+    # lists; None if the service says it doesn't exist
+    replica = get_replica(endpoint)
+    if replica is not None:
+        row = replica.get(pk)
+        if row is not None:
+            return row
+    url = f"{BASE_URL}/{endpoint}/{pk}/"
+    try:
+        return _guarded(endpoint, (endpoint, pk), lambda: _decode(endpoint, _get(endpoint, url)))
+    except UpstreamClientError as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+def _guarded(endpoint, cache_key, fetch, *args):
+    breaker = get_breaker(endpoint)
+
+    if breaker.allow():
+        try:
+            data = fetch(*args)
+        except UpstreamClientError:
+            breaker.record_success()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            error = e if isinstance(e, UpstreamError) else UpstreamError(endpoint, f"{type(e).__name__}: {e}")
+        else:
+            breaker.record_success()
+            _remember(cache_key, data)
+            return data
+    else:
+        error = UpstreamError(endpoint, "circuit open")
+
+    stale = _recall(cache_key)
+    if stale is not None:
+        logger.warning("Serving stale %s after upstream failure (%s)", endpoint, error.reason)
+        return stale
+    raise error
+
+
+def _remember(key, data):
+    with _stale_lock:
+        _stale_cache[key] = (time.monotonic(), data)
+        _stale_cache.move_to_end(key)
+        while len(_stale_cache) > STALE_ENTRIES:
+            _stale_cache.popitem(last=False)
+
+
+def _recall(key):
+    with _stale_lock:
+        entry = _stale_cache.get(key)
+    if entry is None or time.monotonic() - entry[0] > STALE_FOR:
+        return None
+    return entry[1]
+
+
+def _timeout_for(endpoint):
+    return TIMEOUTS.get(endpoint, TIMEOUTS.get('default'))
+
+
+def _get(endpoint, url, params=None, stream=False):
+    # One logical GET: retried on network errors and 5xx, with full jitter
+    last_reason = None
+    for attempt in range(RETRIES + 1):
+        if attempt:
+            time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** (attempt - 1)))
+        try:
+            response = get_session().get(url, params=params, stream=stream, timeout=_timeout_for(endpoint))
+        except requests.RequestException as e:
+            last_reason = f"{type(e).__name__}: {e}"
+            continue
+        if response.status_code == 200:
+            return response
+        last_reason = f"HTTP {response.status_code}"
+        response.close()
+        if 400 <= response.status_code < 500 and response.status_code not in THROTTLE_STATUSES:
+            raise UpstreamClientError(endpoint, response.status_code)
+        if response.status_code not in RETRY_STATUSES:
+            break
+    raise UpstreamError(endpoint, last_reason)
+
+
+def _fetch_pages(endpoint, params):
+    # Follow the cursor "next" links until the list is exhausted
+    results = []
+    url = f"{BASE_URL}/{endpoint}/"
+    while url:
+        data = _decode(endpoint, _get(endpoint, url, params))
+        if isinstance(data, list):
+            # Unpaginated service, we already have everything
+            return data
+        results.extend(data['results'])
+        # The next link already carries the filters and the cursor
+        url, params = data.get('next'), None
+    return results
+
+
+def _fetch_stream(endpoint, params):
+    params = dict(params or {}, stream='ndjson')
+    with _get(endpoint, f"{BASE_URL}/{endpoint}/", params, stream=True) as response:
+        try:
+            return [json.loads(line) for line in response.iter_lines() if line]
+        except (requests.RequestException, ValueError) as e:
+            raise UpstreamError(endpoint, f"broken stream: {e}")
+
+
+def _decode(endpoint, response):
+    try:
+        return response.json()
+    except ValueError as e:
+        raise UpstreamError(endpoint, f"invalid JSON: {e}")
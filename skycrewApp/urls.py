@@ -1,7 +1,19 @@
 from django.urls import path
-from .views import GenerateRosterView
+from .views import (
+    AssignmentsView, BatchRosterView, GenerateRosterView, IndexStatsView, JobMetricsView, JobStatusView, StaffingView,
+)
 
 urlpatterns = [
     # URL will look like: /main/generate/SC1001/
+    # GET builds the roster now, POST queues it and returns a job to poll
     path('generate/<str:flight_id>/', GenerateRosterView.as_view()),
-]
\ No newline at end of file
+    path('jobs/metrics/', JobMetricsView.as_view()),
+    path('jobs/<int:job_id>/', JobStatusView.as_view()),
+    # POST a flight list or a departure window: /main/generate-batch/
+    path('generate-batch/', BatchRosterView.as_view()),
+    # Candidate counts per flight and role: /main/staffing/?hours=720&understaffed=1
+    path('staffing/', StaffingView.as_view()),
+    # Reverse lookup: /main/assignments/?kind=PILOT&person_id=42
+    path('assignments/', AssignmentsView.as_view()),
+    path('index-stats/', IndexStatsView.as_view()),
+]
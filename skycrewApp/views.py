@@ -1,24 +1,226 @@
+from django.utils.http import parse_etags, quote_etag
 from rest_framework.views import APIView
+from FlightInfoApi.models import Flight
 from rest_framework.response import Response
-from .logic import RosterGenerator
-from .models import FlightRoster
+from skycrew.querybudget import QueryBudgetMixin
+from skycrew.refcache import reference_cache
+from .availability import availability_index
+from skycrew.params import parse_number
+from .batch import MAX_WINDOW_HOURS, InvalidWindow, departure_window, generate_batch, parse_window, select_flights
+from .eligibility import attendant_index, pilot_index
+from .coalesce import Saturated, coalesced_generate
+from .jobs import job_metrics, submit_job
+from .logic import current_fingerprint
+from .models import RosterAssignment, RosterJob
+from .planning import staffing_report
+from .repair import repair_queue
+
+class GenerateRosterView(QueryBudgetMixin, APIView):
+    # GET isn't budgeted: a generation's queries depend on index rebuilds and lock waits
+    query_budget = {'post': 4}
 
-class GenerateRosterView(APIView):
     def get(self, request, flight_id):
-        # 1. Run the Logic
-        generator = RosterGenerator(flight_id)
-        roster_data = generator.generate()
+        # 1. The client's copy is still current: 304 without reading the pools
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if client_etags:
+            fingerprint = current_fingerprint(flight_id)
+            if fingerprint:
+                etag = quote_etag(fingerprint)
+                if etag in client_etags or '*' in client_etags:
+                    return Response(status=304, headers={'ETag': etag})
+
+        # 2. Run the Logic and save the result
+        # (reuses the stored roster if its inputs haven't changed; concurrent
+        # requests for the same flight share one generation)
+        try:
+            roster_data, fingerprint = coalesced_generate(flight_id)
+        except Saturated as e:
+            return Response(
+                {"error": "Too many rosters being generated, try again shortly"},
+                status=503,
+                headers={'Retry-After': str(e.retry_after)},
+            )
 
         if "error" in roster_data:
-            return Response(roster_data, status=404)
-
-        # 2. Save to Database (THE FIX)
-        # update_or_create looks for a match on flight_id.
-        # If found, it updates the 'defaults'. If not found, it creates a new one.
-        obj, created = FlightRoster.objects.update_or_create(
-            flight_id=flight_id,
-            defaults={'roster_data': roster_data}
+            # Unknown flight -> 404, an upstream service down -> 503, crew
+            # booked by other workers faster than we could save -> 409
+            if "upstream" in roster_data:
+                return Response(roster_data, status=503)
+            return Response(roster_data, status=409 if "conflict" in roster_data else 404)
+
+        # 3. Return JSON, or 304 if the client already has this version
+        etag = quote_etag(fingerprint)
+        if etag in client_etags or '*' in client_etags:
+            return Response(status=304, headers={'ETag': etag})
+        return Response(roster_data, headers={'ETag': etag})
+
+    def post(self, request, flight_id):
+        # Async mode: queue the roster for `manage.py roster_worker` and answer at once.
+        # A job already waiting for this flight is reused instead of queueing another.
+        job, created = submit_job(flight_id)
+        status_url = f"/main/jobs/{job.id}/"
+        return Response(
+            {"job_id": job.id, "flight_id": flight_id, "status": job.status,
+             "deduplicated": not created, "status_url": status_url},
+            status=202,
+            headers={'Location': status_url},
         )
 
-        # 3. Return JSON
-        return Response(roster_data)
\ No newline at end of file
+class JobStatusView(QueryBudgetMixin, APIView):
+    query_budget = 1
+    # Poll a roster job; once DONE the roster is at /main/generate/<flight_id>/
+    def get(self, request, job_id):
+        job = RosterJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=404)
+        data = {
+            "job_id": job.id,
+            "flight_id": job.flight_id,
+            "status": job.status,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "attempts": job.attempts,
+        }
+        if job.status == RosterJob.FAILED:
+            data["error"] = job.error
+        if job.status == RosterJob.DONE:
+            data["roster_url"] = f"/main/generate/{job.flight_id}/"
+        return Response(data)
+
+class JobMetricsView(QueryBudgetMixin, APIView):
+    query_budget = 3
+    # Queue depth, running jobs and recent wait/run latencies
+    def get(self, request):
+        return Response(job_metrics())
+
+class BatchRosterView(APIView):
+    """
+    POST one of:
+      {"flight_ids": ["SC1001", "SC1002"]}
+      {"start": "2025-11-01T00:00:00Z", "end": "2025-11-02T00:00:00Z"}
+      {"hours": 72}
+    and get back a per-flight success/failure report. Add
+    "optimize": true (and optionally "time_limit": seconds) to assign the
+    crew of all the flights jointly.
+    """
+    def post(self, request):
+        flight_ids = request.data.get('flight_ids')
+        start = request.data.get('start')
+        end = request.data.get('end')
+        hours = request.data.get('hours')
+
+        if flight_ids is not None and not isinstance(flight_ids, list):
+            return Response({"flight_ids": "Must be a list of flight numbers."}, status=400)
+
+        if hours is not None:
+            try:
+                start, end = departure_window(hours)
+            except (TypeError, ValueError):
+                return Response({"hours": f"Must be a number from 0 to {MAX_WINDOW_HOURS}."}, status=400)
+        else:
+            try:
+                start, end = parse_window(start, end)
+            except InvalidWindow:
+                return Response({"error": "start/end must be ISO 8601 datetimes."}, status=400)
+
+        if not flight_ids and start is None and end is None:
+            return Response({"error": "Give flight_ids, a start/end window or hours."}, status=400)
+
+        time_limit = request.data.get('time_limit')
+        if time_limit is not None:
+            time_limit = parse_number(time_limit)
+            if time_limit is None or time_limit <= 0:
+                return Response({"time_limit": "Must be a number of seconds."}, status=400)
+
+        try:
+            report = generate_batch(
+                flight_ids=flight_ids, start=start, end=end,
+                optimize=bool(request.data.get('optimize')), time_limit=time_limit,
+            )
+        except Saturated as e:
+            return Response(
+                {"error": "Too many rosters being generated, try again shortly"},
+                status=503,
+                headers={'Retry-After': str(e.retry_after)},
+            )
+        return Response(report)
+
+class StaffingView(QueryBudgetMixin, APIView):
+    """
+    GET how many eligible candidates of each role every flight has, and
+    which roles it can't fill:
+      ?hours=720 or ?start=...&end=...   flights departing in that window (default: all)
+      ?language=French                   candidates must speak it (repeatable)
+      ?understaffed=1                    only list flights that are short
+    """
+    query_budget = 4
+
+    def get(self, request):
+        start = end = None
+        if request.query_params.get('hours'):
+            try:
+                start, end = departure_window(request.query_params['hours'])
+            except ValueError:
+                return Response({"hours": f"Must be a number from 0 to {MAX_WINDOW_HOURS}."}, status=400)
+        else:
+            try:
+                start, end = parse_window(request.query_params.get('start'), request.query_params.get('end'))
+            except InvalidWindow:
+                return Response({"error": "start/end must be ISO 8601 datetimes."}, status=400)
+
+        report = staffing_report(
+            select_flights(start=start, end=end),
+            languages=request.query_params.getlist('language'),
+            understaffed_only=request.query_params.get('understaffed') in ('1', 'true'),
+        )
+        return Response(report)
+
+class AssignmentsView(QueryBudgetMixin, APIView):
+    """
+    GET the flights a person is rostered on, from the assignment table:
+      ?kind=PILOT|ATTENDANT|PASSENGER&person_id=42
+      optionally ?start=...&end=... (departure window, ISO 8601)
+    """
+    query_budget = 2
+
+    def get(self, request):
+        kind = request.query_params.get('kind', '').upper()
+        if kind not in dict(RosterAssignment.KIND_CHOICES):
+            return Response({"kind": "Must be PILOT, ATTENDANT or PASSENGER."}, status=400)
+        try:
+            person_id = int(request.query_params.get('person_id', ''))
+        except ValueError:
+            return Response({"person_id": "Must be an id."}, status=400)
+        try:
+            start, end = parse_window(request.query_params.get('start'), request.query_params.get('end'))
+        except InvalidWindow:
+            return Response({"error": "start/end must be ISO 8601 datetimes."}, status=400)
+
+        rows = RosterAssignment.objects.filter(kind=kind, person_id=person_id)
+        if start is not None or end is not None:
+            rows = rows.filter(roster__flight_id__in=select_flights(start=start, end=end).values('flight_number'))
+        rows = list(rows.values_list('roster__flight_id', 'role', 'seat'))
+        departures = dict(
+            Flight.objects.filter(flight_number__in=[flight_id for flight_id, _, _ in rows])
+            .values_list('flight_number', 'departure_time')
+        )
+        results = [
+            {"flight_id": flight_id, "departure_time": departures.get(flight_id), "role": role, "seat": seat}
+            for flight_id, role, seat in rows
+        ]
+        results.sort(key=lambda r: (r["departure_time"] is None, r["departure_time"] or 0, r["flight_id"]))
+        return Response({"kind": kind, "person_id": person_id, "results": results})
+
+class IndexStatsView(QueryBudgetMixin, APIView):
+    # Hit/rebuild counters of the in-memory indexes (this worker only)
+    query_budget = 0
+
+    def get(self, request):
+        return Response({
+            "pilots": pilot_index.stats(),
+            "attendants": attendant_index.stats(),
+            "availability": availability_index.stats(),
+            "repairs": repair_queue.stats(),
+            "reference_data": reference_cache.stats(),
+        })